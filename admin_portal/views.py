@@ -5,6 +5,7 @@ from django.contrib import messages
 from django.utils import timezone
 from datetime import timedelta
 from shops.models import Shop, ShopImage
+from shops.search import search_shops
 from core.views import propagate_user_details
 
 def is_admin(user):
@@ -103,7 +104,7 @@ def manage_shops(request):
     shops = Shop.objects.all().order_by('-created_at')
     
     if query:
-        shops = shops.filter(name__icontains=query) | shops.filter(owner__email__icontains=query)
+        shops = search_shops(shops, query, fields=('name', 'owner__email'))
         
     return render(request, 'admin_portal/manage_shops.html', {'shops': shops, 'search_query': query})
 
@@ -399,7 +400,11 @@ def resolve_dispute(request, dispute_id):
         dispute.save()
         return redirect('admin_portal:disputes')
         
-    return render(request, 'admin_portal/resolve_dispute.html', {'dispute': dispute})
+    context = {
+        'dispute': dispute,
+        'files': dispute.order.files.select_related('blob'),  # Previews read the blob
+    }
+    return render(request, 'admin_portal/resolve_dispute.html', context)
 
 @user_passes_test(is_admin)
 def refunds_list(request):
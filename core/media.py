@@ -0,0 +1,171 @@
+"""
+Protected media serving
+Every MEDIA_URL request is authorized here against the record that owns
+the file, then the bytes are handed to the front proxy:
+
+    MEDIA_SENDFILE = 'nginx'   X-Accel-Redirect to MEDIA_ACCEL_PREFIX + path;
+                               nginx needs an `internal` location there
+                               aliased to MEDIA_ROOT
+    MEDIA_SENDFILE = 'apache'  X-Sendfile with the absolute path (mod_xsendfile)
+    MEDIA_SENDFILE = ''        Django streams the file itself (development)
+
+The proxy answers Range requests itself; the fallback supports single
+byte ranges and If-Range. Conditional GETs are answered here before any
+handoff, from the file's size and mtime. Cold-tier uploads are rehydrated
+on first access (orders/lifecycle.py).
+"""
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db.models import Q
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+
+from orders.models import FileBlob, Order
+from shops.models import ShopImage
+
+SENDFILE = getattr(settings, 'MEDIA_SENDFILE', '')
+ACCEL_PREFIX = getattr(settings, 'MEDIA_ACCEL_PREFIX', '/protected-media/')
+PUBLIC_MAX_AGE = 24 * 60 * 60
+READ_SIZE = 64 * 1024
+
+_BYTE_RANGE = re.compile(r'bytes=(\d*)-(\d*)$')
+
+
+def _order_access(request):
+    """Orders the visitor may see files of: as customer, shop owner or guest (session, see _remember_order)"""
+    session = request.session
+    access = Q(id__in=session.get('guest_order_ids', []) + session.get('draft_order_ids', []))
+    if session.get('guest_phones'):
+        access |= Q(customer_phone__in=session['guest_phones'])
+    if request.user.is_authenticated:
+        access |= Q(customer_id=request.user.id) | Q(shop__owner_id=request.user.id)
+    return access
+
+
+def authorize(request, name):
+    """
+    Whether the visitor may read the media file `name`
+
+    Returns:
+        None if not, else 'public' or 'private' (for Cache-Control)
+    """
+    user = request.user
+    if name.startswith('shop_images/'):
+        image = ShopImage.objects.select_related('shop').filter(image=name).first()
+        if image is None:
+            return None
+        if image.is_approved and image.shop.is_approved:
+            return 'public'
+        owner = user.is_authenticated and (user.is_staff or image.shop.owner_id == user.id)
+        return 'private' if owner else None
+
+    if name.startswith(('uploads/blobs/', 'uploads/orders/')):
+        orders = Order.objects.filter(files__file=name)
+    elif name.startswith('uploads/thumbs/'):
+        sha256 = os.path.basename(name).rsplit('-', 1)[0]
+        orders = Order.objects.filter(files__sha256=sha256)
+    elif name.startswith('order_proofs/'):
+        orders = Order.objects.filter(shop_proof_image=name)
+    elif name.startswith('disputes/'):
+        orders = Order.objects.filter(Q(disputes__proof_image=name) | Q(disputes__shop_proof_image=name))
+    else:
+        return 'private' if user.is_authenticated and user.is_staff else None
+
+    if not (user.is_authenticated and user.is_staff):
+        orders = orders.filter(_order_access(request))
+    return 'private' if orders.exists() else None
+
+
+def serve(request, name, cache='private'):
+    """Response for media file `name` (already authorized); None if it does not exist"""
+    path = default_storage.path(name)
+    try:
+        stat = os.stat(path)
+    except (FileNotFoundError, NotADirectoryError):
+        # Settled orders' files may have gone to the cold tier
+        blob = FileBlob.objects.filter(file=name, tier=FileBlob.COLD).first()
+        if blob is None:
+            return None
+        blob.ensure_hot()
+        stat = os.stat(path)
+
+    etag = f'"{stat.st_size:x}-{int(stat.st_mtime):x}"'
+    mtime = int(stat.st_mtime)
+    response = get_conditional_response(request, etag=etag, last_modified=mtime)
+    if response is None:
+        content_type, encoding = mimetypes.guess_type(path)
+        content_type = content_type or 'application/octet-stream'
+        if SENDFILE == 'nginx':
+            response = HttpResponse(content_type=content_type)
+            response['X-Accel-Redirect'] = ACCEL_PREFIX.rstrip('/') + '/' + quote(name)
+        elif SENDFILE == 'apache':
+            response = HttpResponse(content_type=content_type)
+            response['X-Sendfile'] = path
+        else:
+            response = _ranged_response(request, path, stat.st_size, etag, mtime, content_type)
+        response['Accept-Ranges'] = 'bytes'
+
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(mtime)
+    response['Cache-Control'] = f'public, max-age={PUBLIC_MAX_AGE}' if cache == 'public' else 'private, no-cache'
+    return response
+
+
+def _byte_range(request, size, etag, mtime):
+    """
+    The single byte range asked for, as (start, end) inclusive
+
+    Returns:
+        None to send the whole file (no Range, stale If-Range, or several
+        ranges), or False when the range cannot be satisfied
+    """
+    header = request.META.get('HTTP_RANGE', '')
+    match = _BYTE_RANGE.match(header.replace(' ', ''))
+    if not match or not any(match.groups()):
+        return None
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if if_range and if_range != etag and parse_http_date_safe(if_range) != mtime:
+        return None
+
+    first, last = match.groups()
+    if not first:
+        # Suffix range: the final `last` bytes
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        start, end = int(first), min(int(last), size - 1) if last else size - 1
+    if start > end or start >= size:
+        return False
+    return start, end
+
+
+def _read_window(path, start, length):
+    with open(path, 'rb') as fh:
+        fh.seek(start)
+        while length > 0:
+            piece = fh.read(min(READ_SIZE, length))
+            if not piece:
+                break
+            length -= len(piece)
+            yield piece
+
+
+def _ranged_response(request, path, size, etag, mtime, content_type):
+    byte_range = _byte_range(request, size, etag, mtime)
+    if byte_range is None:
+        return FileResponse(open(path, 'rb'), content_type=content_type)
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+
+    start, end = byte_range
+    response = StreamingHttpResponse(_read_window(path, start, end - start + 1), status=206, content_type=content_type)
+    response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    response['Content-Length'] = str(end - start + 1)
+    return response
@@ -3,8 +3,9 @@ from django.contrib.auth import login, logout, authenticate
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
 from django.contrib import messages
-from django.http import JsonResponse
-from django.views.decorators.http import require_POST
+from django.http import Http404, JsonResponse
+from django.views.decorators.http import require_POST, require_safe
+from . import media
 from .models import UserProfile, Notification
 from shops.models import Shop
 
@@ -326,3 +327,13 @@ def mark_all_notifications_read(request):
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
         return JsonResponse({'status': 'ok', 'unread_count': 0})
     return redirect('core:my_dashboard')
+
+
+@require_safe
+def protected_media(request, name):
+    """Uploaded media, only for those allowed to see it (see core/media.py)"""
+    cache = media.authorize(request, name)
+    response = media.serve(request, name, cache) if cache else None
+    if response is None:
+        raise Http404
+    return response
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Order, Dispute, Refund, AuditLog
+from .models import Order, Dispute, Refund, AuditLog, FileBlob
 
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
@@ -22,3 +22,11 @@ class AuditLogAdmin(admin.ModelAdmin):
     list_display = ['user', 'action', 'model_name', 'timestamp']
     list_filter = ['action', 'timestamp']
     search_fields = ['user__username', 'action']
+
+@admin.register(FileBlob)
+class FileBlobAdmin(admin.ModelAdmin):
+    list_display = ['sha256', 'size', 'optimized_size', 'ref_count', 'pages_count', 'tier', 'created_at']
+    list_filter = ['tier']
+    search_fields = ['sha256']
+    readonly_fields = ['sha256', 'file', 'size', 'ref_count', 'thumbnail_pages', 'tier', 'tier_changed_at', 'cold_size',
+                       'optimized_for', 'optimized_size']
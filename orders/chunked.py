@@ -0,0 +1,283 @@
+"""
+Resumable chunked uploads for order files
+Protocol (JSON over the order's upload endpoints):
+
+    POST   uploads/<order>/                     {file_name, size} -> upload id, chunk size
+    GET    uploads/<order>/<upload>/            chunks received so far (resume)
+    PUT    uploads/<order>/<upload>/            one chunk; Content-Range: bytes a-b/size,
+                                                optional X-Chunk-SHA256
+    POST   uploads/<order>/<upload>/finalize/   assemble, verify, store as an OrderFile
+    DELETE uploads/<order>/<upload>/            abandon
+
+State lives on disk under ORDER_CHUNKED_UPLOAD_DIR/<upload>/: state.json,
+the preallocated data file (chunks are written in place at their offset,
+so they may arrive in any order and in parallel), and one marker file per
+received chunk.
+"""
+import hashlib
+import json
+import os
+import re
+import shutil
+import time
+import uuid
+
+from django.conf import settings
+from django.core.files import File
+
+from .uploads import EXTENSIONS, MAX_FILE_BYTES, MAX_ORDER_BYTES, MB, SNIFF_BYTES, sniff
+
+CHUNK_SIZE = getattr(settings, 'ORDER_CHUNK_SIZE', 4 * MB)
+UPLOAD_DIR = str(getattr(settings, 'ORDER_CHUNKED_UPLOAD_DIR', settings.BASE_DIR / 'var' / 'chunked-uploads'))
+READ_SIZE = 64 * 1024
+
+_CONTENT_RANGE = re.compile(r'bytes (\d+)-(\d+)/(\d+)$')
+_HEX_SHA256 = re.compile(r'[0-9a-f]{64}$')
+
+
+class ChunkedUploadError(ValueError):
+    """Bad request against an upload; `status` is the HTTP status to answer with"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+class AssembledUpload(File):
+    """
+    A finished chunked upload, shaped like the files OrderUploadHandler
+    produces (.sha256, .kind); storages move it into place instead of copying
+    """
+
+    def __init__(self, path, name, sha256, kind):
+        super().__init__(open(path, 'rb'), name=name)
+        self.path = path
+        self.sha256 = sha256
+        self.kind = kind
+
+    def temporary_file_path(self):
+        return self.path
+
+
+def _directory(upload_id):
+    return os.path.join(UPLOAD_DIR, uuid.UUID(str(upload_id)).hex)
+
+
+def _chunk_count(size):
+    return max(1, -(-size // CHUNK_SIZE))
+
+
+def create(order_id, file_name, size, used_bytes=0):
+    """Start an upload; returns its status (used_bytes: the order's stored and reserved bytes)"""
+    if '.' not in file_name or file_name.rsplit('.', 1)[-1].lower() not in EXTENSIONS:
+        raise ChunkedUploadError('Only PDF, JPG and PNG files are accepted')
+    if not isinstance(size, int) or size <= 0:
+        raise ChunkedUploadError('size must be a positive number of bytes')
+    if size > MAX_FILE_BYTES:
+        raise ChunkedUploadError(f'Files are limited to {MAX_FILE_BYTES // MB} MB', status=413)
+    check_order_cap(used_bytes, size)
+
+    upload_id = str(uuid.uuid4())
+    directory = _directory(upload_id)
+    os.makedirs(os.path.join(directory, 'chunks'))
+    with open(os.path.join(directory, 'data'), 'wb') as fh:
+        fh.truncate(size)  # Sparse; chunks fill it in place
+    state = {
+        'id': upload_id,
+        'order_id': order_id,
+        'file_name': os.path.basename(file_name)[:255],
+        'size': size,
+        'chunk_size': CHUNK_SIZE,
+        'chunks': _chunk_count(size),
+        'created': time.time(),
+    }
+    _save(state)
+    return status(state)
+
+
+def check_order_cap(used_bytes, size):
+    if used_bytes + size > MAX_ORDER_BYTES:
+        raise ChunkedUploadError(f'Uploads are limited to {MAX_ORDER_BYTES // MB} MB per order', status=413)
+
+
+def _save(state):
+    path = os.path.join(_directory(state['id']), 'state.json')
+    with open(path + '.tmp', 'w') as fh:
+        json.dump(state, fh)
+    os.replace(path + '.tmp', path)
+
+
+def load(order_id, upload_id):
+    try:
+        with open(os.path.join(_directory(upload_id), 'state.json')) as fh:
+            state = json.load(fh)
+    except (OSError, ValueError):
+        raise ChunkedUploadError('Upload not found', status=404)
+    if state['order_id'] != order_id:
+        raise ChunkedUploadError('Upload not found', status=404)
+    return state
+
+
+def status(state):
+    """Public view of an upload (what the client needs to resume)"""
+    current = {
+        'upload_id': state['id'],
+        'file_name': state['file_name'],
+        'size': state['size'],
+        'chunk_size': state['chunk_size'],
+        'chunks': state['chunks'],
+    }
+    if 'result' in state:
+        # Finalized: the chunks are gone, nothing is left to send
+        return {**current, 'received': list(range(state['chunks'])), 'result': state['result']}
+    chunks = os.path.join(_directory(state['id']), 'chunks')
+    current['received'] = sorted(int(name) for name in os.listdir(chunks)) if os.path.isdir(chunks) else []
+    return current
+
+
+def reserved_bytes(order_id):
+    """Bytes of the order's uploads still in progress (they count towards its cap)"""
+    if not os.path.isdir(UPLOAD_DIR):
+        return 0
+    reserved = 0
+    for name in os.listdir(UPLOAD_DIR):
+        try:
+            with open(os.path.join(UPLOAD_DIR, name, 'state.json')) as fh:
+                state = json.load(fh)
+        except (OSError, ValueError):
+            continue
+        if state.get('order_id') == order_id and 'result' not in state:
+            reserved += state['size']
+    return reserved
+
+
+def write_chunk(state, content_range, stream, checksum=None):
+    """
+    Write one chunk from a request body stream at its offset
+
+    Args:
+        content_range: the Content-Range header ("bytes start-end/size");
+                       chunks must start on a chunk boundary
+        checksum: hex SHA-256 of the chunk, verified when given
+    """
+    if 'result' in state:
+        raise ChunkedUploadError('Upload is already finalized', status=409)
+    match = _CONTENT_RANGE.match(content_range or '')
+    if not match:
+        raise ChunkedUploadError('Content-Range must be "bytes start-end/size"')
+    start, end, total = (int(g) for g in match.groups())
+    chunk_size = state['chunk_size']
+    if total != state['size'] or start % chunk_size or end != min(start + chunk_size, total) - 1:
+        raise ChunkedUploadError('Content-Range does not match a chunk of this upload', status=416)
+    if checksum is not None and not _HEX_SHA256.match(checksum.lower()):
+        raise ChunkedUploadError('X-Chunk-SHA256 must be a hex SHA-256 digest')
+
+    expected = end - start + 1
+    digest = hashlib.sha256()
+    directory = _directory(state['id'])
+    written = 0
+    with open(os.path.join(directory, 'data'), 'r+b') as fh:
+        fh.seek(start)
+        while written < expected:
+            piece = stream.read(min(READ_SIZE, expected - written))
+            if not piece:
+                break
+            digest.update(piece)
+            fh.write(piece)
+            written += len(piece)
+        if stream.read(1):
+            raise ChunkedUploadError('Chunk is longer than its Content-Range')
+
+    if written != expected:
+        raise ChunkedUploadError('Chunk is shorter than its Content-Range')
+    if checksum is not None and digest.hexdigest() != checksum.lower():
+        raise ChunkedUploadError('Chunk checksum mismatch', status=422)
+
+    # Marker last: a chunk only counts once its bytes are on disk
+    index = start // chunk_size
+    open(os.path.join(directory, 'chunks', str(index)), 'w').close()
+    return index
+
+
+def assemble(state):
+    """
+    Verify a complete upload and hand it over as an AssembledUpload
+
+    The data file is hashed in one sequential pass and its type sniffed;
+    the caller moves it into storage and then records the outcome with
+    complete(). Only one finalize runs at a time per upload.
+    """
+    try:
+        os.close(os.open(os.path.join(_directory(state['id']), 'finalizing'), os.O_CREAT | os.O_EXCL))
+    except FileExistsError:
+        raise ChunkedUploadError('Upload is already being finalized', status=409)
+    try:
+        return _assemble(state)
+    except Exception:
+        unlock(state)
+        raise
+
+
+def unlock(state):
+    """Let a failed finalize be retried"""
+    try:
+        os.remove(os.path.join(_directory(state['id']), 'finalizing'))
+    except FileNotFoundError:
+        pass
+
+
+def complete(state, result):
+    """
+    Keep only the finalize response, so a client retrying after a dropped
+    connection gets the same answer (sweep() removes it later)
+    """
+    directory = _directory(state['id'])
+    shutil.rmtree(os.path.join(directory, 'chunks'), ignore_errors=True)
+    if os.path.exists(os.path.join(directory, 'data')):
+        os.remove(os.path.join(directory, 'data'))
+    state['result'] = result
+    _save(state)
+
+
+def _assemble(state):
+    current = status(state)
+    missing = sorted(set(range(state['chunks'])) - set(current['received']))
+    if missing:
+        raise ChunkedUploadError(f'{len(missing)} chunk(s) still missing', status=409)
+
+    path = os.path.join(_directory(state['id']), 'data')
+    digest = hashlib.sha256()
+    with open(path, 'rb') as fh:
+        header = fh.read(SNIFF_BYTES)
+        digest.update(header)
+        for piece in iter(lambda: fh.read(MB), b''):
+            digest.update(piece)
+
+    kind = EXTENSIONS[state['file_name'].rsplit('.', 1)[-1].lower()]
+    if sniff(header) != kind:
+        raise ChunkedUploadError(f"{state['file_name']}: contents do not match the file type")
+    return AssembledUpload(path, state['file_name'], digest.hexdigest(), kind)
+
+
+def discard(upload_id):
+    shutil.rmtree(_directory(upload_id), ignore_errors=True)
+
+
+def sweep(max_age):
+    """Remove uploads (finished or abandoned) older than max_age seconds; returns how many"""
+    if not os.path.isdir(UPLOAD_DIR):
+        return 0
+    cutoff = time.time() - max_age
+    removed = 0
+    for name in os.listdir(UPLOAD_DIR):
+        directory = os.path.join(UPLOAD_DIR, name)
+        try:
+            touched = os.path.getmtime(os.path.join(directory, 'state.json'))
+            if os.path.isdir(os.path.join(directory, 'chunks')):
+                touched = max(touched, os.path.getmtime(os.path.join(directory, 'chunks')))
+            if touched < cutoff:
+                shutil.rmtree(directory, ignore_errors=True)
+                removed += 1
+        except OSError:
+            continue
+    return removed
@@ -0,0 +1,222 @@
+"""
+Background ingestion of uploaded order files
+Upload views store the files and insert OrderFile rows in the INGESTING
+state; page counting and validation then run in a process pool, each file
+under its own CPU-time and wall-clock limit, and the rows flip to READY
+(or FAILED) as results come back. The configure page polls until done.
+Workers also render the page previews (thumbnails.py). Results are cached
+on the FileBlob, so content seen before skips the pool.
+
+Set ORDER_INGEST_WORKERS = 0 to ingest inline (development, tests).
+"""
+import logging
+import multiprocessing
+import resource
+import signal
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from . import thumbnails
+from .pdfpages import count_pages
+
+logger = logging.getLogger(__name__)
+
+INGEST_WORKERS = getattr(settings, 'ORDER_INGEST_WORKERS', 2)
+INGEST_CPU_SECONDS = getattr(settings, 'ORDER_INGEST_CPU_SECONDS', 10)
+INGEST_TIME_LIMIT = getattr(settings, 'ORDER_INGEST_TIME_LIMIT', 30)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+class IngestLimit(Exception):
+    """A file went over its CPU or wall-clock budget"""
+
+
+def _raise_limit(signum, frame):
+    raise IngestLimit()
+
+
+def _init_worker():
+    signal.signal(signal.SIGALRM, _raise_limit)
+    signal.signal(signal.SIGXCPU, _raise_limit)
+
+
+def file_kind(file_name):
+    return 'pdf' if file_name.lower().endswith('.pdf') else 'image'
+
+
+def inspect_file(path, kind):
+    """
+    Count pages and check the file opens
+
+    Returns:
+        (pages, error) - error is '' on success
+    """
+    try:
+        if kind == 'pdf':
+            return count_pages(path), ''
+        from PIL import Image
+        with Image.open(path) as image:
+            image.verify()
+        return 1, ''
+    except IngestLimit:
+        raise
+    except Exception:
+        return None, 'could not be read'
+
+
+def render_thumbnails(path, kind, pages):
+    """Page previews for a file that inspected fine; a failure only costs the preview"""
+    try:
+        return thumbnails.render(path, kind, thumbnails.wanted_pages(pages))
+    except IngestLimit:
+        raise
+    except Exception:
+        logger.warning('Could not render thumbnails for %s', path, exc_info=True)
+        return []
+
+
+def process_file(path, kind):
+    """
+    Everything ingestion does with one file
+
+    Returns:
+        (pages, error, thumbnails) - thumbnails is a list of WebP bytes
+    """
+    pages, error = inspect_file(path, kind)
+    if error:
+        return pages, error, []
+    try:
+        return pages, error, render_thumbnails(path, kind, pages)
+    except IngestLimit:
+        # Counted fine; only the previews ran out of time
+        return pages, error, []
+
+
+@contextmanager
+def file_limits():
+    """Per-file CPU-time and wall-clock budget (pool workers only); overruns raise IngestLimit"""
+    # RLIMIT_CPU counts the worker's whole lifetime, so the budget is
+    # relative to what it has used so far
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    soft, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    budget = int(usage.ru_utime + usage.ru_stime) + INGEST_CPU_SECONDS
+    if hard != resource.RLIM_INFINITY:
+        budget = min(budget, hard)
+    resource.setrlimit(resource.RLIMIT_CPU, (budget, hard))
+    signal.alarm(INGEST_TIME_LIMIT)
+    try:
+        yield
+    finally:
+        signal.alarm(0)
+        resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+
+
+def inspect_limited(path, kind):
+    """process_file under the per-file limits (pool workers only)"""
+    try:
+        with file_limits():
+            return process_file(path, kind)
+    except IngestLimit:
+        return None, 'took too long to process', []
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=INGEST_WORKERS,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker,
+            )
+        return _pool
+
+
+def _reset_pool(broken):
+    """Drop a pool whose worker died so the next submit starts a fresh one"""
+    global _pool
+    with _pool_lock:
+        if _pool is broken:
+            _pool = None
+    broken.shutdown(wait=False)
+
+
+def submit_to_pool(fn, *args):
+    """Run fn(*args) in the worker pool, replacing a broken pool once; returns (pool, future)"""
+    pool = _get_pool()
+    try:
+        return pool, pool.submit(fn, *args)
+    except BrokenProcessPool:
+        _reset_pool(pool)
+        pool = _get_pool()
+        return pool, pool.submit(fn, *args)
+
+
+def record_result(blob_id, pages, error, previews=()):
+    """Cache the outcome (and previews) on the blob and settle every file waiting on it"""
+    from .models import FileBlob, OrderFile
+
+    blob = FileBlob.objects.filter(pk=blob_id).only('sha256').first()
+    if blob is None:
+        return
+    FileBlob.objects.filter(pk=blob_id).update(
+        pages_count=None if error else pages,
+        ingest_error=error,
+        thumbnail_pages=thumbnails.save(blob.sha256, previews),
+    )
+    OrderFile.objects.filter(blob_id=blob_id, status=OrderFile.INGESTING).update(
+        status=OrderFile.FAILED if error else OrderFile.READY,
+        pages_count=pages or 1,
+        ingest_error=error,
+    )
+
+
+def _collect(blob_id, pool, future):
+    """Done-callback: record a pool result (runs on an executor thread)"""
+    try:
+        pages, error, previews = future.result()
+    except Exception:
+        logger.exception('Ingestion worker failed for FileBlob %s', blob_id)
+        pages, error, previews = None, 'could not be processed', []
+        _reset_pool(pool)
+    try:
+        record_result(blob_id, pages, error, previews)
+    finally:
+        connection.close()
+
+
+def ingest(blobs):
+    """Queue page counting and previews for blobs not yet ingested (after commit)"""
+    jobs = {blob.pk: (blob.file.path, file_kind(blob.file.name)) for blob in blobs}
+
+    def submit():
+        if not INGEST_WORKERS:
+            for blob_id, (path, kind) in jobs.items():
+                record_result(blob_id, *process_file(path, kind))
+            return
+        for blob_id, (path, kind) in jobs.items():
+            pool, future = submit_to_pool(inspect_limited, path, kind)
+            future.add_done_callback(partial(_collect, blob_id, pool))
+
+    transaction.on_commit(submit)
+
+
+def progress(order):
+    """Ingestion counts for an order's files"""
+    from .models import OrderFile
+
+    statuses = list(order.files.values_list('status', flat=True))
+    return {
+        'total': len(statuses),
+        'ready': statuses.count(OrderFile.READY),
+        'failed': statuses.count(OrderFile.FAILED),
+        'pending': statuses.count(OrderFile.INGESTING),
+    }
@@ -0,0 +1,167 @@
+"""
+Storage lifecycle for order files
+Once an order is settled (completed, dispute window closed, no open
+dispute) its files are not needed live any more:
+
+    ORDER_FILES_COLD_AFTER_DAYS after the window closes  -> cold tier (gzipped)
+    ORDER_FILES_PURGE_AFTER_DAYS after the window closes -> bytes deleted
+
+Blobs are shared, so one only moves when every order using it is past
+the same point. Rows, hashes and page counts are kept; a cold file is
+rehydrated when someone opens it (FileBlob.ensure_hot) and is then left
+hot for REHYDRATED_GRACE. Run through the tier_order_files command.
+
+Orders never paid for are swept separately (sweep_abandoned, via the
+sweep_abandoned_orders command).
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from .models import Dispute, FileBlob, Order, OrderFile
+
+logger = logging.getLogger(__name__)
+
+COLD_AFTER = timedelta(days=getattr(settings, 'ORDER_FILES_COLD_AFTER_DAYS', 0))
+_purge_days = getattr(settings, 'ORDER_FILES_PURGE_AFTER_DAYS', 90)  # None keeps files forever
+PURGE_AFTER = timedelta(days=_purge_days) if _purge_days is not None else None
+REHYDRATED_GRACE = timedelta(days=7)
+BATCH_SIZE = 500
+ABANDONED_AFTER = timedelta(hours=getattr(settings, 'ORDER_ABANDONED_AFTER_HOURS', 24))
+SWEEP_BATCH_SIZE = 200
+
+OPEN_DISPUTE_STATUSES = ('PENDING', 'IN_REVIEW')
+
+
+def settled_orders(cutoff):
+    """Completed orders whose dispute window closed before cutoff and have no open dispute"""
+    open_disputes = Dispute.objects.filter(status__in=OPEN_DISPUTE_STATUSES).values('order_id')
+    return Order.objects.filter(
+        status='COMPLETED', dispute_window_expires__lt=cutoff
+    ).exclude(id__in=open_disputes)
+
+
+def _settled_blobs(order_ids, cutoff, tiers):
+    """Blobs of these orders in `tiers` that no unsettled order still uses"""
+    blob_ids = set(
+        OrderFile.objects.filter(order_id__in=order_ids, blob__tier__in=tiers).values_list('blob_id', flat=True)
+    )
+    in_use = OrderFile.objects.filter(blob_id__in=blob_ids).exclude(
+        order_id__in=settled_orders(cutoff).values('id')
+    ).values_list('blob_id', flat=True)
+    return blob_ids - set(in_use)
+
+
+def _walk(cutoff, tiers, batch_size):
+    """Yield (order_count, blobs) per batch of settled orders, keyset-paginated by id"""
+    last_id = 0
+    while True:
+        order_ids = list(
+            settled_orders(cutoff).filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:batch_size]
+        )
+        if not order_ids:
+            return
+        last_id = order_ids[-1]
+        yield len(order_ids), FileBlob.objects.filter(pk__in=_settled_blobs(order_ids, cutoff, tiers))
+
+
+def run(batch_size=BATCH_SIZE, dry_run=False, now=None):
+    """
+    Apply the lifecycle to all settled orders
+
+    Returns:
+        dict of counts: orders seen, blobs cooled, purged and failed, bytes freed
+    """
+    now = now or timezone.now()
+    stats = {'orders': 0, 'cooled': 0, 'purged': 0, 'failed': 0, 'bytes_freed': 0}
+    purged = set()  # Only needed for dry runs, where tiers do not change
+
+    # Purge first, so nothing is compressed only to be deleted
+    if PURGE_AFTER is not None:
+        for order_count, blobs in _walk(now - PURGE_AFTER, [FileBlob.HOT, FileBlob.COLD], batch_size):
+            for blob in blobs:
+                try:
+                    stats['bytes_freed'] += (blob.cold_size or blob.stored_size) if dry_run else blob.purge()
+                except OSError:
+                    logger.exception('Could not purge FileBlob %s', blob.pk)
+                    stats['failed'] += 1
+                    continue
+                stats['purged'] += 1
+                purged.add(blob.pk)
+
+    recently_rehydrated = Q(tier_changed_at__gt=now - REHYDRATED_GRACE)
+    for order_count, blobs in _walk(now - COLD_AFTER, [FileBlob.HOT], batch_size):
+        stats['orders'] += order_count
+        for blob in blobs.exclude(recently_rehydrated).exclude(pk__in=purged):
+            if dry_run:
+                stats['cooled'] += 1
+                stats['bytes_freed'] += blob.stored_size
+                continue
+            try:
+                freed = blob.move_to_cold()
+            except OSError:
+                logger.exception('Could not move FileBlob %s to cold storage', blob.pk)
+                stats['failed'] += 1
+                continue
+            if freed:
+                stats['cooled'] += 1
+                stats['bytes_freed'] += freed - blob.cold_size
+    return stats
+
+
+def _reclaimable_bytes(order_ids):
+    """Bytes freed by deleting these orders: blobs no other order references"""
+    refs = dict(
+        OrderFile.objects.filter(order_id__in=order_ids, blob__isnull=False)
+        .values_list('blob_id').annotate(n=Count('id'))
+    )
+    freed = 0
+    for blob in FileBlob.objects.filter(pk__in=refs).only('ref_count', 'size', 'optimized_size', 'tier', 'cold_size'):
+        if blob.ref_count <= refs[blob.pk]:
+            freed += {FileBlob.HOT: blob.stored_size, FileBlob.COLD: blob.cold_size or 0}.get(blob.tier, 0)
+    return freed
+
+
+def sweep_abandoned(max_age=ABANDONED_AFTER, batch_size=SWEEP_BATCH_SIZE, dry_run=False, now=None):
+    """
+    Delete PENDING (never paid) orders created and last changed more than
+    max_age ago, with their files
+
+    One short transaction per batch, oldest first, so no lock is held for
+    long; file references are released by the OrderFile delete signal, and
+    the files themselves go once the batch is committed (FileBlob.release).
+
+    Returns:
+        dict of counts: orders and files deleted, rows deleted in total, bytes freed
+    """
+    cutoff = (now or timezone.now()) - max_age
+    stats = {'orders': 0, 'files': 0, 'rows': 0, 'bytes_freed': 0}
+    abandoned = Order.objects.filter(status='PENDING', created_at__lt=cutoff, updated_at__lt=cutoff)
+
+    last = None
+    while True:
+        batch = abandoned.order_by('created_at', 'id')
+        if last is not None:
+            batch = batch.filter(Q(created_at__gt=last[0]) | Q(created_at=last[0], id__gt=last[1]))
+        keys = list(batch.values_list('created_at', 'id')[:batch_size])
+        if not keys:
+            return stats
+        last = keys[-1]
+        order_ids = [order_id for created_at, order_id in keys]
+
+        with transaction.atomic():
+            # Locked and checked again: one may have been paid or changed since it was listed
+            order_ids = list(abandoned.select_for_update().filter(id__in=order_ids).values_list('id', flat=True))
+            stats['bytes_freed'] += _reclaimable_bytes(order_ids)
+            if dry_run:
+                stats['orders'] += len(order_ids)
+                stats['files'] += OrderFile.objects.filter(order_id__in=order_ids).count()
+                continue
+            rows, per_model = abandoned.filter(id__in=order_ids).delete()
+        stats['rows'] += rows
+        stats['orders'] += per_model.get(Order._meta.label, 0)
+        stats['files'] += per_model.get(OrderFile._meta.label, 0)
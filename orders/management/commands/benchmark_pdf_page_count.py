@@ -0,0 +1,390 @@
+"""
+Management command to benchmark PDF page counting
+Compares orders.pdfpages.fast_count_pages with the full
+PyPDF2.PdfReader(...).pages parse on a generated corpus: small text PDFs,
+large image-only "scans", a linearized layout, incremental updates, and
+object streams with a cross-reference stream. Peak RSS is measured in a
+fresh process per file and method.
+"""
+import io
+import multiprocessing
+import os
+import resource
+import statistics
+import tempfile
+import time
+import zlib
+
+from django.core.management.base import BaseCommand, CommandError
+
+from orders.pdfpages import fast_count_pages
+
+try:
+    import PyPDF2
+except ImportError:
+    PyPDF2 = None
+
+
+def pypdf2_count_pages(path):
+    return len(PyPDF2.PdfReader(path).pages)
+
+
+METHODS = {
+    'fast': fast_count_pages,
+    'pypdf2': pypdf2_count_pages,
+}
+
+
+def _status_kb(field):
+    with open('/proc/self/status') as fh:
+        for line in fh:
+            if line.startswith(field + ':'):
+                return int(line.split()[1])
+    raise OSError(field)
+
+
+def _peak_rss(method, path):
+    """Runs in a fresh process: peak RSS growth (KB) while counting one file"""
+    try:
+        # Linux: reset the high-water mark left by interpreter start-up
+        with open('/proc/self/clear_refs', 'w') as fh:
+            fh.write('5')
+        before = _status_kb('VmRSS')
+        METHODS[method](path)
+        return _status_kb('VmHWM') - before
+    except OSError:
+        before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        METHODS[method](path)
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - before
+
+
+# ------------------------------------------------------------------
+# Corpus
+# ------------------------------------------------------------------
+
+def _page_objects(pages, first_num, parent=2, font=3):
+    """(page dict, content stream) object bodies for `pages` text pages"""
+    objects = []
+    for i in range(pages):
+        content = f"BT /F1 24 Tf 72 720 Td (Page {i + 1}) Tj ET".encode()
+        objects.append((
+            f"<< /Type /Page /Parent {parent} 0 R /MediaBox [0 0 595 842] "
+            f"/Resources << /Font << /F1 {font} 0 R >> >> /Contents {first_num + 2 * i + 1} 0 R >>".encode(),
+            b"<< /Length %d >>\nstream\n%s\nendstream" % (len(content), content),
+        ))
+    return objects
+
+
+def _base_objects(pages):
+    """Object bodies numbered from 1: catalog, page tree, font, then pages"""
+    page_nums = [4 + 2 * i for i in range(pages)]
+    kids = ' '.join(f'{n} 0 R' for n in page_nums)
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        f"<< /Type /Pages /Kids [{kids}] /Count {pages} >>".encode(),
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    for page, content in _page_objects(pages, 4):
+        objects += [page, content]
+    return objects
+
+
+def _xref_table(entries):
+    """entries: list of (first num, [offsets]) subsections"""
+    out = [b"xref\n"]
+    for start, offsets in entries:
+        out.append(b"%d %d\n" % (start, len(offsets)))
+        for offset in offsets:
+            out.append(b"%010d 65535 f\r\n" % 0 if offset is None else b"%010d 00000 n\r\n" % offset)
+    return b''.join(out)
+
+
+def write_table_pdf(path, pages):
+    """Classic xref table; returns (data, xref offset, object count) for incremental updates"""
+    buf = io.BytesIO()
+    buf.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+    offsets = []
+    for num, body in enumerate(_base_objects(pages), start=1):
+        offsets.append(buf.tell())
+        buf.write(b"%d 0 obj\n%s\nendobj\n" % (num, body))
+    xref = buf.tell()
+    buf.write(_xref_table([(0, [None] + offsets)]))
+    buf.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(offsets) + 1, xref))
+    data = buf.getvalue()
+    with open(path, 'wb') as fh:
+        fh.write(data)
+    return data, xref, len(offsets)
+
+
+def write_incremental_pdf(path, pages, updates, pages_per_update):
+    """Base revision plus `updates` incremental updates that each append pages"""
+    data, prev_xref, size = write_table_pdf(path, pages)
+    buf = io.BytesIO(data)
+    buf.seek(0, io.SEEK_END)
+    page_nums = [4 + 2 * i for i in range(pages)]
+
+    for _ in range(updates):
+        first = size + 1
+        added = _page_objects(pages_per_update, first)
+        page_nums += [first + 2 * i for i in range(pages_per_update)]
+        offsets = []
+        for i, (page, content) in enumerate(added):
+            offsets.append(buf.tell())
+            buf.write(b"%d 0 obj\n%s\nendobj\n" % (first + 2 * i, page))
+            offsets.append(buf.tell())
+            buf.write(b"%d 0 obj\n%s\nendobj\n" % (first + 2 * i + 1, content))
+        # Replace the page tree with one that includes the new pages
+        tree = buf.tell()
+        kids = ' '.join(f'{n} 0 R' for n in page_nums)
+        buf.write(f"2 0 obj\n<< /Type /Pages /Kids [{kids}] /Count {len(page_nums)} >>\nendobj\n".encode())
+        size += len(offsets)
+        xref = buf.tell()
+        buf.write(_xref_table([(2, [tree]), (first, offsets)]))
+        buf.write(b"trailer\n<< /Size %d /Root 1 0 R /Prev %d >>\nstartxref\n%d\n%%%%EOF\n" % (size + 1, prev_xref, xref))
+        prev_xref = xref
+
+    with open(path, 'wb') as fh:
+        fh.write(buf.getvalue())
+
+
+def write_linearized_pdf(path, pages):
+    """
+    Linearized layout: linearization dict and first-page xref section at the
+    front (its trailer /Prev-links the main table at the end, which the
+    final startxref skips past). No hint stream - readers that count pages
+    do not use it.
+    """
+    objects = _base_objects(pages)
+    # Front section: linearization dict, catalog and first page (renumbered to the end)
+    main = objects[1:3] + objects[5:]  # Page tree, font, pages 2..n
+    lin_num, catalog_num, first_page_num, first_content_num = len(objects) + 1, 1, 4, 5
+    front_nums = [lin_num, catalog_num, first_page_num, first_content_num]
+    front_bodies = [None, objects[0], objects[3], objects[4]]
+    main_nums = [2, 3] + list(range(6, len(objects) + 1))
+
+    header = b"%PDF-1.5\n%\xe2\xe3\xcf\xd3\n"
+
+    def front_sections(offsets):
+        return [(catalog_num, [offsets[catalog_num]]),
+                (first_page_num, [offsets[first_page_num], offsets[first_content_num]]),
+                (lin_num, [offsets[lin_num]])]
+
+    def build(file_length, main_xref):
+        buf = io.BytesIO()
+        buf.write(header)
+        lin = b"<< /Linearized 1 /L %010d /O %d /E 0 /N %d /T %010d /H [0 0] >>" % (
+            file_length, first_page_num, pages, main_xref
+        )
+        front_xref = buf.tell()
+        # Front xref + trailer come first; offsets are patched on the second pass
+        placeholder = len(_xref_table(front_sections({num: 0 for num in front_nums})))
+        buf.write(b' ' * placeholder)
+        trailer = b"trailer\n<< /Size %d /Root 1 0 R /Prev %010d >>\nstartxref\n0\n%%%%EOF\n" % (lin_num + 1, main_xref)
+        buf.write(trailer)
+
+        offsets = {}
+        for num, body in zip(front_nums, front_bodies):
+            offsets[num] = buf.tell()
+            buf.write(b"%d 0 obj\n%s\nendobj\n" % (num, lin if body is None else body))
+        for num, body in zip(main_nums, main):
+            offsets[num] = buf.tell()
+            buf.write(b"%d 0 obj\n%s\nendobj\n" % (num, body))
+
+        xref = buf.tell()
+        buf.write(_xref_table([(0, [None] + [offsets[n] if n in main_nums else None for n in range(1, len(objects) + 1)])]))
+        buf.write(b"trailer\n<< /Size %d >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, front_xref))
+
+        data = bytearray(buf.getvalue())
+        front = _xref_table(front_sections(offsets))
+        data[front_xref:front_xref + len(front)] = front
+        return bytes(data), xref
+
+    data, xref = build(0, 0)
+    data, _ = build(len(data), xref)
+    with open(path, 'wb') as fh:
+        fh.write(data)
+
+
+def write_object_stream_pdf(path, pages, per_stream=100):
+    """PDF 1.5 with dictionaries packed into object streams and a predicted xref stream"""
+    objects = _base_objects(pages)
+    packable = [n for n, body in enumerate(objects, start=1) if b'stream' not in body]
+    streamed = [n for n, body in enumerate(objects, start=1) if b'stream' in body]
+
+    buf = io.BytesIO()
+    buf.write(b"%PDF-1.5\n%\xe2\xe3\xcf\xd3\n")
+    entries = {}
+    next_num = len(objects) + 1
+
+    for num in streamed:
+        entries[num] = (1, buf.tell(), 0)
+        buf.write(b"%d 0 obj\n%s\nendobj\n" % (num, objects[num - 1]))
+
+    for chunk_start in range(0, len(packable), per_stream):
+        chunk = packable[chunk_start:chunk_start + per_stream]
+        header, body = [], io.BytesIO()
+        for index, num in enumerate(chunk):
+            header.append(b"%d %d" % (num, body.tell()))
+            body.write(objects[num - 1] + b"\n")
+            entries[num] = (2, next_num, index)
+        header = b' '.join(header) + b'\n'
+        packed = zlib.compress(header + body.getvalue())
+        entries[next_num] = (1, buf.tell(), 0)
+        buf.write(b"%d 0 obj\n<< /Type /ObjStm /N %d /First %d /Filter /FlateDecode /Length %d >>\nstream\n"
+                  % (next_num, len(chunk), len(header), len(packed)))
+        buf.write(packed + b"\nendstream\nendobj\n")
+        next_num += 1
+
+    xref_num = next_num
+    xref = buf.tell()
+    entries[xref_num] = (1, xref, 0)
+    rows, previous = [], bytes(7)
+    for num in range(xref_num + 1):
+        kind, field, gen = entries.get(num, (0, 0, 0))
+        row = bytes([kind]) + field.to_bytes(4, 'big') + gen.to_bytes(2, 'big')
+        # PNG "Up" predictor, as Acrobat/qpdf write it
+        rows.append(b'\x02' + bytes((a - b) & 0xFF for a, b in zip(row, previous)))
+        previous = row
+    packed = zlib.compress(b''.join(rows))
+    buf.write(b"%d 0 obj\n<< /Type /XRef /Size %d /W [1 4 2] /Root 1 0 R /Filter /FlateDecode "
+              b"/DecodeParms << /Predictor 12 /Columns 7 >> /Length %d >>\nstream\n"
+              % (xref_num, xref_num + 1, len(packed)))
+    buf.write(packed + b"\nendstream\nendobj\n")
+    buf.write(b"startxref\n%d\n%%%%EOF\n" % xref)
+    with open(path, 'wb') as fh:
+        fh.write(buf.getvalue())
+
+
+def write_reportlab_text_pdf(path, pages):
+    from reportlab.pdfgen import canvas
+
+    pdf = canvas.Canvas(path)
+    for page in range(pages):
+        text = pdf.beginText(72, 770)
+        for line in range(45):
+            text.textLine(f"Page {page + 1}, line {line + 1}: the quick brown fox jumps over the lazy dog")
+        pdf.drawText(text)
+        pdf.showPage()
+    pdf.save()
+
+
+def write_scan_pdf(path, pages, workdir):
+    """Image-only pages (noisy grayscale JPEGs, like a phone or copier scan)"""
+    from PIL import Image
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfgen import canvas
+
+    pdf = canvas.Canvas(path, pagesize=A4)
+    for page in range(pages):
+        image_path = os.path.join(workdir, f'scan_{page}.jpg')
+        Image.effect_noise((1240, 1754), 40 + page % 16).save(image_path, quality=60)
+        pdf.drawImage(image_path, 0, 0, *A4)
+        pdf.showPage()
+        os.remove(image_path)
+    pdf.save()
+
+
+class Command(BaseCommand):
+    help = 'Benchmark fast PDF page counting against a full PyPDF2 parse (latency and peak RSS)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--corpus',
+            help='Directory of PDFs to benchmark instead of the generated corpus',
+        )
+        parser.add_argument(
+            '--iterations',
+            type=int,
+            default=20,
+            help='Page counts per file and method',
+        )
+        parser.add_argument(
+            '--scan-pages',
+            type=int,
+            default=30,
+            help='Pages in the generated scanned PDF (about 0.6 MB each)',
+        )
+
+    def handle(self, *args, **options):
+        if PyPDF2 is None:
+            raise CommandError('PyPDF2 is not installed')
+
+        with tempfile.TemporaryDirectory() as workdir:
+            if options['corpus']:
+                paths = sorted(
+                    os.path.join(options['corpus'], name) for name in os.listdir(options['corpus'])
+                    if name.lower().endswith('.pdf')
+                )
+            else:
+                self.stdout.write('Generating corpus...')
+                paths = self._generate(workdir, options['scan_pages'])
+
+            self.stdout.write(f"\n{'='*60}")
+            self.stdout.write("  PDF PAGE COUNT BENCHMARK")
+            self.stdout.write(f"{'='*60}")
+            self.stdout.write(
+                f"  {'file':<24} {'MB':>6} {'pages':>6} {'fast p50/p95 ms':>17} "
+                f"{'pypdf2 p50/p95 ms':>19} {'fast RSS MB':>12} {'pypdf2 RSS MB':>14}"
+            )
+
+            context = multiprocessing.get_context('spawn')
+            for path in paths:
+                self._benchmark(path, options['iterations'], context)
+
+            self.stdout.write(f"{'='*60}\n")
+
+    def _generate(self, workdir, scan_pages):
+        corpus = [
+            ('text-3p.pdf', lambda p: write_reportlab_text_pdf(p, 3)),
+            ('text-300p.pdf', lambda p: write_reportlab_text_pdf(p, 300)),
+            (f'scan-{scan_pages}p.pdf', lambda p: write_scan_pdf(p, scan_pages, workdir)),
+            ('linearized-200p.pdf', lambda p: write_linearized_pdf(p, 200)),
+            ('incremental-100p.pdf', lambda p: write_incremental_pdf(p, 40, updates=3, pages_per_update=20)),
+            ('objstm-2000p.pdf', lambda p: write_object_stream_pdf(p, 2000)),
+        ]
+        paths = []
+        for name, write in corpus:
+            path = os.path.join(workdir, name)
+            write(path)
+            paths.append(path)
+        return paths
+
+    def _benchmark(self, path, iterations, context):
+        name = os.path.basename(path)
+        size = os.path.getsize(path) / (1024 * 1024)
+
+        counts, timings = {}, {}
+        for method, func in METHODS.items():
+            runs = []
+            try:
+                for _ in range(iterations):
+                    started = time.perf_counter()
+                    counts[method] = func(path)
+                    runs.append((time.perf_counter() - started) * 1000)
+            except Exception as e:
+                counts[method] = f'error: {e.__class__.__name__}'
+            timings[method] = runs
+
+        rss = {}
+        for method in METHODS:
+            with context.Pool(1) as pool:
+                try:
+                    rss[method] = f"{pool.apply(_peak_rss, (method, path)) / 1024:.1f}"
+                except Exception:
+                    rss[method] = '-'
+
+        self.stdout.write(
+            f"  {name:<24} {size:>6.1f} {str(counts['pypdf2']):>6} "
+            f"{self._summary(timings['fast']):>17} {self._summary(timings['pypdf2']):>19} "
+            f"{rss['fast']:>12} {rss['pypdf2']:>14}"
+        )
+        if counts['fast'] != counts['pypdf2']:
+            self.stdout.write(self.style.WARNING(f"    page counts differ: fast={counts['fast']}"))
+
+    @staticmethod
+    def _summary(timings):
+        if not timings:
+            return '-'
+        ordered = sorted(timings)
+        p95 = ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))]
+        return f"{statistics.median(timings):.2f}/{p95:.2f}"
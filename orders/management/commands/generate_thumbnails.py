@@ -0,0 +1,46 @@
+"""
+Management command to render page previews for stored uploads
+New uploads get theirs during ingestion; this backfills blobs stored
+before previews existed (or after installing a PDF renderer)
+"""
+from django.core.management.base import BaseCommand
+
+from orders import ingest, thumbnails
+from orders.models import FileBlob
+
+
+class Command(BaseCommand):
+    help = 'Render WebP page previews for uploaded files that have none'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Re-render previews that already exist',
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"\n{'='*60}")
+        self.stdout.write("  PAGE PREVIEW THUMBNAILS")
+        self.stdout.write(f"{'='*60}")
+
+        # Cold and purged blobs have no bytes in hot storage to render from
+        blobs = FileBlob.objects.filter(ingest_error='', pages_count__isnull=False, tier=FileBlob.HOT)
+        if not options['force']:
+            blobs = blobs.filter(thumbnail_pages=0)
+
+        rendered, skipped = 0, 0
+        for blob in blobs.iterator():
+            kind = ingest.file_kind(blob.file.name)
+            previews = ingest.render_thumbnails(blob.file.path, kind, blob.pages_count)
+            if not previews:
+                skipped += 1
+                continue
+            thumbnails.delete(blob.sha256, blob.thumbnail_pages)
+            FileBlob.objects.filter(pk=blob.pk).update(thumbnail_pages=thumbnails.save(blob.sha256, previews))
+            rendered += 1
+
+        self.stdout.write(self.style.SUCCESS(f"  {rendered} uploads rendered, {skipped} skipped"))
+        if skipped and thumbnails.fitz is None:
+            self.stdout.write("  (PDF previews need PyMuPDF or poppler's pdftoppm)")
+        self.stdout.write(f"{'='*60}\n")
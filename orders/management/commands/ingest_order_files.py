@@ -0,0 +1,48 @@
+"""
+Management command to finish ingestion of order files left INGESTING
+Files are normally processed by the background pool right after upload;
+rows can be stranded if the server restarts before a result comes back
+"""
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from orders import ingest
+from orders.models import OrderFile, FileBlob
+
+
+class Command(BaseCommand):
+    help = 'Count pages for order files still waiting on background ingestion'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--older-than',
+            type=int,
+            default=10,
+            help='Only files uploaded at least this many minutes ago (default: 10)',
+        )
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(minutes=options['older_than'])
+
+        self.stdout.write(f"\n{'='*60}")
+        self.stdout.write("  ORDER FILE INGESTION")
+        self.stdout.write(f"{'='*60}")
+
+        stranded = OrderFile.objects.filter(status=OrderFile.INGESTING, created_at__lte=cutoff)
+        # Rows whose upload never made it into a blob have nothing to read
+        lost = stranded.filter(blob__isnull=True).update(status=OrderFile.FAILED, ingest_error='could not be read')
+
+        done, failed = 0, lost
+        for blob in FileBlob.objects.filter(pk__in=stranded.values('blob_id')).iterator():
+            pages, error, previews = ingest.process_file(blob.file.path, ingest.file_kind(blob.file.name))
+            ingest.record_result(blob.pk, pages, error, previews)
+            if error:
+                failed += 1
+                self.stdout.write(f"  {blob.file.name}: {error}")
+            else:
+                done += 1
+
+        self.stdout.write(self.style.SUCCESS(f"  {done} uploads ready, {failed} failed"))
+        self.stdout.write(f"{'='*60}\n")
@@ -0,0 +1,58 @@
+"""
+Management command to recompute the live queue counters on Shop
+The counters are maintained incrementally by Order.save/delete; run this
+after bulk edits that bypass them (queryset.update, raw SQL) or via cron
+as a drift check
+"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, Sum
+
+from shops.models import Shop
+from orders.models import Order
+
+
+class Command(BaseCommand):
+    help = 'Recompute Shop.queue_orders/queue_sheets from outstanding orders'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report shops whose counters drifted',
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+
+        self.stdout.write(f"\n{'='*60}")
+        self.stdout.write("  SHOP QUEUE RECOUNT")
+        self.stdout.write(f"{'='*60}")
+
+        actual = {
+            row['shop']: (row['orders'], row['sheets'] or 0)
+            for row in Order.objects.filter(status__in=Order.QUEUE_STATUSES).values('shop').annotate(
+                orders=Count('id'), sheets=Sum('final_sheets')
+            )
+        }
+
+        fixed = 0
+        with transaction.atomic():
+            for shop_id, name, orders, sheets in Shop.objects.select_for_update().values_list(
+                'id', 'name', 'queue_orders', 'queue_sheets'
+            ):
+                expected = actual.get(shop_id, (0, 0))
+                if (orders, sheets) == expected:
+                    continue
+                fixed += 1
+                self.stdout.write(
+                    f"  {name}: {orders} orders / {sheets} sheets -> {expected[0]} / {expected[1]}"
+                )
+                if not dry_run:
+                    Shop.objects.filter(pk=shop_id).update(
+                        queue_orders=expected[0], queue_sheets=expected[1], queue_version=F('queue_version') + 1
+                    )
+
+        verb = 'would be fixed' if dry_run else 'fixed'
+        self.stdout.write(self.style.SUCCESS(f"  {fixed} shops {verb}"))
+        self.stdout.write(f"{'='*60}\n")
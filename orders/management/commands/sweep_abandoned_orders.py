@@ -0,0 +1,52 @@
+"""
+Management command to delete orders that were never paid for
+Every visit to the upload step creates a PENDING order with its files;
+this clears the ones left behind (and stale chunked uploads). Run via cron.
+"""
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from orders import chunked, lifecycle
+
+
+class Command(BaseCommand):
+    help = 'Delete unpaid PENDING orders older than a given age, with their files'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--older-than',
+            type=int,
+            default=int(lifecycle.ABANDONED_AFTER.total_seconds() // 3600),
+            help='Age in hours after which an unpaid order is abandoned (default: %(default)s)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=lifecycle.SWEEP_BATCH_SIZE,
+            help='Orders deleted per transaction (default: %(default)s)',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report what would be deleted without deleting',
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        max_age = timedelta(hours=options['older_than'])
+
+        self.stdout.write(f"\n{'='*60}")
+        self.stdout.write(f"  ABANDONED ORDER SWEEP{' (DRY RUN)' if dry_run else ''}")
+        self.stdout.write(f"{'='*60}")
+
+        stats = lifecycle.sweep_abandoned(max_age, batch_size=options['batch_size'], dry_run=dry_run)
+        uploads = 0 if dry_run else chunked.sweep(max_age.total_seconds())
+
+        self.stdout.write(f"  Orders deleted:   {stats['orders']}")
+        self.stdout.write(f"  Files deleted:    {stats['files']}")
+        if not dry_run:
+            self.stdout.write(f"  Rows deleted:     {stats['rows']}")
+            self.stdout.write(f"  Chunked uploads:  {uploads}")
+        self.stdout.write(self.style.SUCCESS(f"  Space freed:      {stats['bytes_freed'] / (1024 * 1024):.1f} MB"))
+        self.stdout.write(f"{'='*60}\n")
@@ -0,0 +1,41 @@
+"""
+Management command to move settled orders' files to cold storage or purge them
+Meant to run daily (cron); see orders/lifecycle.py for the rules
+"""
+from django.core.management.base import BaseCommand
+
+from orders import lifecycle
+
+
+class Command(BaseCommand):
+    help = 'Compress or purge files of completed orders whose dispute window has closed'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report what would change without touching any file',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=lifecycle.BATCH_SIZE,
+            help=f'Orders per batch (default: {lifecycle.BATCH_SIZE})',
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+
+        self.stdout.write(f"\n{'='*60}")
+        self.stdout.write(f"  ORDER FILE LIFECYCLE{' (DRY RUN)' if dry_run else ''}")
+        self.stdout.write(f"{'='*60}")
+
+        stats = lifecycle.run(batch_size=options['batch_size'], dry_run=dry_run)
+
+        self.stdout.write(f"  Settled orders:   {stats['orders']}")
+        self.stdout.write(f"  Moved to cold:    {stats['cooled']}")
+        self.stdout.write(f"  Purged:           {stats['purged']}")
+        if stats['failed']:
+            self.stdout.write(self.style.WARNING(f"  Failed:           {stats['failed']}"))
+        self.stdout.write(self.style.SUCCESS(f"  Space freed:      {stats['bytes_freed'] / (1024 * 1024):.1f} MB"))
+        self.stdout.write(f"{'='*60}\n")
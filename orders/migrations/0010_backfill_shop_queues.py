@@ -0,0 +1,24 @@
+from django.db import migrations
+from django.db.models import Count, Sum
+
+
+def backfill_shop_queues(apps, schema_editor):
+    Order = apps.get_model('orders', 'Order')
+    Shop = apps.get_model('shops', 'Shop')
+    queues = Order.objects.filter(status__in=['PAID', 'ACCEPTED', 'PRINTING']).values('shop').annotate(
+        orders=Count('id'), sheets=Sum('final_sheets')
+    )
+    for row in queues:
+        Shop.objects.filter(pk=row['shop']).update(queue_orders=row['orders'], queue_sheets=row['sheets'] or 0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0009_payout'),
+        ('shops', '0018_shop_queue_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_shop_queues, migrations.RunPython.noop),
+    ]
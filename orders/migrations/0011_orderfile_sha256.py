@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-17 04:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0010_backfill_shop_queues'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderfile',
+            name='sha256',
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+    ]
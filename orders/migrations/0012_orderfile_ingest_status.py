@@ -0,0 +1,23 @@
+# Generated by Django 4.2.30 on 2026-10-17 04:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0011_orderfile_sha256'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderfile',
+            name='ingest_error',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='orderfile',
+            name='status',
+            field=models.CharField(choices=[('INGESTING', 'Processing'), ('READY', 'Ready'), ('FAILED', 'Failed')], default='READY', max_length=10),
+        ),
+    ]
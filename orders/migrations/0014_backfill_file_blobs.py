@@ -0,0 +1,47 @@
+import hashlib
+
+from django.core.files.storage import default_storage
+from django.db import migrations
+
+
+def backfill_file_blobs(apps, schema_editor):
+    """
+    Give existing uploads a blob. Files stay where they are (the first copy
+    of each content becomes the blob); later duplicates are pointed at it
+    and their own copies left on disk for a manual clean-up
+    """
+    OrderFile = apps.get_model('orders', 'OrderFile')
+    FileBlob = apps.get_model('orders', 'FileBlob')
+
+    for order_file in OrderFile.objects.filter(blob__isnull=True).exclude(file='').order_by('id').iterator():
+        name = order_file.file.name
+        if not default_storage.exists(name):
+            continue
+        sha256 = order_file.sha256
+        if not sha256:
+            digest = hashlib.sha256()
+            with default_storage.open(name, 'rb') as fh:
+                for chunk in iter(lambda: fh.read(1024 * 1024), b''):
+                    digest.update(chunk)
+            sha256 = digest.hexdigest()
+
+        blob = FileBlob.objects.filter(sha256=sha256).first()
+        if blob is None:
+            blob = FileBlob.objects.create(
+                sha256=sha256, file=name, size=default_storage.size(name), ref_count=0,
+                pages_count=order_file.pages_count if order_file.status == 'READY' else None,
+            )
+        blob.ref_count += 1
+        blob.save(update_fields=['ref_count'])
+        OrderFile.objects.filter(pk=order_file.pk).update(blob=blob, file=blob.file.name, sha256=sha256)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0013_fileblob'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_file_blobs, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-17 04:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0014_backfill_file_blobs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fileblob',
+            name='thumbnail_pages',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.30 on 2026-10-17 04:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0015_fileblob_thumbnail_pages'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fileblob',
+            name='cold_size',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='fileblob',
+            name='tier',
+            field=models.CharField(choices=[('HOT', 'Hot'), ('COLD', 'Cold (compressed)'), ('PURGED', 'Purged')], db_index=True, default='HOT', max_length=6),
+        ),
+        migrations.AddField(
+            model_name='fileblob',
+            name='tier_changed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['status', 'dispute_window_expires'], name='orders_orde_status_6477e5_idx'),
+        ),
+    ]
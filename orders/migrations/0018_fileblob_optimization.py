@@ -0,0 +1,23 @@
+# Generated by Django 4.2.30 on 2026-10-17 04:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0017_order_status_created_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fileblob',
+            name='optimized_for',
+            field=models.CharField(blank=True, max_length=2),
+        ),
+        migrations.AddField(
+            model_name='fileblob',
+            name='optimized_size',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -1,9 +1,18 @@
-from django.db import models
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import F
 from django.contrib.auth.models import User
+from django.core.files import File
+from django.core.files.storage import default_storage
 from shops.models import Shop
+from . import thumbnails
+import gzip
+import os
 import random
 import math
+import shutil
 from datetime import timedelta
+from functools import partial
 from django.utils import timezone
 
 
@@ -52,6 +61,61 @@ class Order(models.Model):
     paid_at = models.DateTimeField(null=True, blank=True)
     completed_at = models.DateTimeField(null=True, blank=True)
     
+    # Statuses that count towards the shop's live queue (Shop.queue_orders/queue_sheets)
+    QUEUE_STATUSES = ('PAID', 'ACCEPTED', 'PRINTING')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember what this row already contributes to its shop's queue
+        if {'shop_id', 'status', 'final_sheets'} <= set(field_names):
+            instance._queue_state = instance._queue_contribution()
+        return instance
+
+    def _queue_contribution(self):
+        """(shop_id, orders, sheets) this order adds to its shop's queue"""
+        if self.status in self.QUEUE_STATUSES:
+            return (self.shop_id, 1, self.final_sheets or 0)
+        return (self.shop_id, 0, 0)
+
+    def _stored_queue_state(self):
+        """What the saved row contributes, for instances loaded without those fields"""
+        row = Order.objects.filter(pk=self.pk).values_list('shop_id', 'status', 'final_sheets').first()
+        if row is None:
+            return None
+        shop_id, status, final_sheets = row
+        if status in self.QUEUE_STATUSES:
+            return (shop_id, 1, final_sheets or 0)
+        return (shop_id, 0, 0)
+
+    def _sync_shop_queue(self, deleted=False):
+        old = getattr(self, '_queue_state', None)
+        if old is None:
+            old = (self.shop_id, 0, 0)  # New order, nothing counted yet
+        new = (self.shop_id, 0, 0) if deleted else self._queue_contribution()
+        if old[0] == new[0]:
+            Shop.adjust_queue(new[0], new[1] - old[1], new[2] - old[2])
+        else:
+            Shop.adjust_queue(old[0], -old[1], -old[2])
+            Shop.adjust_queue(new[0], new[1], new[2])
+        self._queue_state = new
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            if not self._state.adding and getattr(self, '_queue_state', None) is None:
+                # Loaded with .only()/.defer(): read the counted state before overwriting it
+                self._queue_state = self._stored_queue_state()
+            super().save(*args, **kwargs)
+            self._sync_shop_queue()
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            if getattr(self, '_queue_state', None) is None:
+                self._queue_state = self._stored_queue_state()
+            result = super().delete(*args, **kwargs)
+            self._sync_shop_queue(deleted=True)
+        return result
+
     def generate_pin(self):
         """Generate a random 4-digit PIN"""
         self.pin_code = ''.join([str(random.randint(0, 9)) for _ in range(4)])
@@ -100,6 +164,201 @@ class Order(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # File lifecycle walks (orders/lifecycle.py)
+            models.Index(fields=['status', 'dispute_window_expires']),
+            # Abandoned PENDING orders (lifecycle.sweep_abandoned)
+            models.Index(fields=['status', 'created_at']),
+        ]
+
+
+class FileBlob(models.Model):
+    """
+    Content-addressed upload, shared by every OrderFile with the same bytes
+    Stored once under uploads/blobs/<2 hex>/<2 hex>/<sha256>.<ext> (once
+    optimized: <sha256>-<digest of the new bytes>.<ext>, see optimize.py); page
+    count, ingestion outcome and page thumbnails are cached here, so a
+    duplicate upload costs no disk and no parsing. Deleted when the last
+    OrderFile goes.
+
+    Once every order using it is settled the bytes move to the cold tier
+    (gzipped under ORDER_COLD_STORAGE_DIR) and later are purged, keeping
+    the row; see lifecycle.py. Opening a cold file brings it back.
+    """
+    BLOB_ROOT = 'uploads/blobs'
+    COLD_ROOT = str(getattr(settings, 'ORDER_COLD_STORAGE_DIR', settings.BASE_DIR / 'var' / 'cold-storage'))
+
+    HOT = 'HOT'
+    COLD = 'COLD'
+    PURGED = 'PURGED'
+    TIER_CHOICES = [
+        (HOT, 'Hot'),
+        (COLD, 'Cold (compressed)'),
+        (PURGED, 'Purged'),
+    ]
+
+    sha256 = models.CharField(max_length=64, unique=True)
+    file = models.FileField(upload_to=BLOB_ROOT)
+    size = models.BigIntegerField(default=0)
+    ref_count = models.PositiveIntegerField(default=0)
+    pages_count = models.IntegerField(null=True, blank=True)  # None until ingested
+    ingest_error = models.CharField(max_length=255, blank=True)
+    thumbnail_pages = models.PositiveIntegerField(default=0)  # WebP previews stored, see thumbnails.py
+    tier = models.CharField(max_length=6, choices=TIER_CHOICES, default=HOT, db_index=True)
+    tier_changed_at = models.DateTimeField(null=True, blank=True)
+    cold_size = models.BigIntegerField(null=True, blank=True)  # Compressed bytes while COLD
+    # Optimization stage (optimize.py): paper it ran for, bytes kept afterwards
+    optimized_for = models.CharField(max_length=2, blank=True)
+    optimized_size = models.BigIntegerField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.sha256[:12]} ({self.ref_count} refs)"
+
+    def thumbnail_url(self, page=1):
+        """URL of a page preview, or None if it was not rendered"""
+        if page > self.thumbnail_pages:
+            return None
+        return default_storage.url(thumbnails.storage_name(self.sha256, page))
+
+    @property
+    def stored_size(self):
+        """Bytes in hot storage (after optimization, if it ran)"""
+        return self.optimized_size if self.optimized_size is not None else self.size
+
+    @property
+    def is_ingested(self):
+        return self.pages_count is not None or bool(self.ingest_error)
+
+    @classmethod
+    def storage_name(cls, sha256, file_name, variant=''):
+        ext = file_name.rsplit('.', 1)[-1].lower() if '.' in file_name else 'bin'
+        suffix = f"-{variant}" if variant else ''
+        return f"{cls.BLOB_ROOT}/{sha256[:2]}/{sha256[2:4]}/{sha256}{suffix}.{ext}"
+
+    @classmethod
+    def acquire(cls, uploaded_file):
+        """
+        Blob for an upload that passed OrderUploadHandler (has .sha256),
+        storing the bytes only if this content is new; takes one reference
+        """
+        with transaction.atomic():
+            blob, created = cls.objects.select_for_update().get_or_create(
+                sha256=uploaded_file.sha256, defaults={'size': uploaded_file.size}
+            )
+            if created:
+                name = cls.storage_name(blob.sha256, uploaded_file.name)
+                # A leftover from an interrupted upload already holds these bytes
+                blob.file.name = name if default_storage.exists(name) else default_storage.save(name, uploaded_file)
+                blob.ref_count = 1
+                blob.save(update_fields=['file', 'ref_count'])
+            else:
+                if blob.tier != cls.HOT or blob.stored_size != blob.size:
+                    # The upload has the original bytes: no need to rehydrate,
+                    # and the new order gets its own optimization pass
+                    default_storage.delete(blob.file.name)
+                    original = cls.storage_name(blob.sha256, blob.file.name)
+                    blob.file.name = original if default_storage.exists(original) else default_storage.save(original, uploaded_file)
+                    OrderFile.objects.filter(blob=blob).update(file=blob.file.name)
+                    blob._drop_cold_copy()
+                    restored = {'file': blob.file.name, 'cold_size': None, 'optimized_for': '', 'optimized_size': None}
+                    if blob.tier != cls.HOT:
+                        blob._set_tier(cls.HOT, **restored)
+                    else:
+                        cls.objects.filter(pk=blob.pk).update(**restored)
+                    blob.optimized_for, blob.optimized_size = '', None
+                cls.objects.filter(pk=blob.pk).update(ref_count=F('ref_count') + 1)
+                blob.ref_count += 1
+        return blob
+
+    @classmethod
+    def release(cls, blob_id):
+        """Drop one reference; the last one deletes the stored file once that is committed"""
+        with transaction.atomic():
+            blob = cls.objects.select_for_update().filter(pk=blob_id).first()
+            if blob is None:
+                return
+            if blob.ref_count > 1:
+                cls.objects.filter(pk=blob_id).update(ref_count=F('ref_count') - 1)
+                return
+            blob.delete()
+            # A rolled back delete (e.g. a whole sweep batch) keeps its files
+            transaction.on_commit(partial(cls._delete_stored, blob))
+
+    @classmethod
+    def _delete_stored(cls, blob):
+        with transaction.atomic():
+            if cls.objects.select_for_update().filter(sha256=blob.sha256).exists():
+                return  # Uploaded again meanwhile; the new row owns these files
+            blob.file.delete(save=False)
+            blob._drop_cold_copy()
+            thumbnails.delete(blob.sha256, blob.thumbnail_pages)
+
+    @property
+    def cold_path(self):
+        return os.path.join(self.COLD_ROOT, self.sha256[:2], self.sha256[2:4], f"{self.sha256}.gz")
+
+    def _drop_cold_copy(self):
+        try:
+            os.remove(self.cold_path)
+        except FileNotFoundError:
+            pass
+
+    def _set_tier(self, tier, **fields):
+        self.tier = tier
+        self.tier_changed_at = timezone.now()
+        type(self).objects.filter(pk=self.pk).update(tier=tier, tier_changed_at=self.tier_changed_at, **fields)
+
+    def move_to_cold(self):
+        """Compress the bytes into the cold tier; returns bytes freed in hot storage"""
+        target = self.cold_path
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        # Compress outside the lock; only the switch-over needs it
+        with self.file.open('rb') as source, gzip.open(target + '.tmp', 'wb', compresslevel=6) as dest:
+            shutil.copyfileobj(source, dest, 1024 * 1024)
+        os.replace(target + '.tmp', target)
+        cold_size = os.path.getsize(target)
+
+        with transaction.atomic():
+            tier = type(self).objects.select_for_update().filter(pk=self.pk).values_list('tier', flat=True).first()
+            if tier != self.HOT:
+                # Released, purged or already moved meanwhile; a COLD row owns the copy just written
+                if tier != self.COLD:
+                    self._drop_cold_copy()
+                return 0
+            self._set_tier(self.COLD, cold_size=cold_size)
+            self.cold_size = cold_size
+            default_storage.delete(self.file.name)
+        return self.stored_size
+
+    def ensure_hot(self):
+        """Bring a cold file back into hot storage (no-op when it is there)"""
+        if self.tier != self.COLD:
+            return
+        with transaction.atomic():
+            if not type(self).objects.select_for_update().filter(pk=self.pk, tier=self.COLD).exists():
+                self.refresh_from_db(fields=['tier', 'file'])
+                return
+            default_storage.delete(self.file.name)
+            with gzip.open(self.cold_path, 'rb') as fh:
+                self.file.name = default_storage.save(self.file.name, File(fh, name=self.file.name))
+            self._set_tier(self.HOT, file=self.file.name, cold_size=None)
+            self.cold_size = None
+            self._drop_cold_copy()
+
+    def purge(self):
+        """Delete the bytes and previews for good, keeping the row; returns bytes freed"""
+        with transaction.atomic():
+            current = type(self).objects.select_for_update().filter(pk=self.pk).first()
+            if current is None or current.tier == self.PURGED:
+                return 0
+            freed = current.stored_size if current.tier == self.HOT else (current.cold_size or 0)
+            default_storage.delete(current.file.name)
+            current._drop_cold_copy()
+            thumbnails.delete(current.sha256, current.thumbnail_pages)
+            current._set_tier(self.PURGED, cold_size=None, thumbnail_pages=0)
+        self.tier, self.thumbnail_pages = self.PURGED, 0
+        return freed
 
 
 class OrderFile(models.Model):
@@ -122,12 +381,26 @@ class OrderFile(models.Model):
         ("ODD", "Odd pages only"),
         ("EVEN", "Even pages only"),
     ]
+
+    # Ingestion (page counting / validation runs in the background, see ingest.py)
+    INGESTING = 'INGESTING'
+    READY = 'READY'
+    FAILED = 'FAILED'
+    STATUS_CHOICES = [
+        (INGESTING, 'Processing'),
+        (READY, 'Ready'),
+        (FAILED, 'Failed'),
+    ]
     
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='files')
     file = models.FileField(upload_to='uploads/orders/')
+    blob = models.ForeignKey(FileBlob, on_delete=models.SET_NULL, null=True, blank=True, related_name='order_files')
     file_name = models.CharField(max_length=255)
     file_size_mb = models.FloatField(default=0.0)
+    sha256 = models.CharField(max_length=64, blank=True, db_index=True)
     pages_count = models.IntegerField(default=1)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=READY)
+    ingest_error = models.CharField(max_length=255, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     
     # Print Configuration (Per File)
@@ -144,6 +417,11 @@ class OrderFile(models.Model):
     final_sheets = models.IntegerField(default=0)
     total_price = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
     
+    @property
+    def thumbnail_url(self):
+        """First-page preview (prefetch `blob` when listing files)"""
+        return self.blob.thumbnail_url() if self.blob_id else None
+
     def adjusted_pages(self):
         if self.print_type == "ODD":
             return (self.pages_count + 1) // 2
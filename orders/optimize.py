@@ -0,0 +1,244 @@
+"""
+Optional upload optimization stage (ORDER_OPTIMIZE_UPLOADS = True)
+Once an order is configured, its uploads are shrunk in the ingestion
+worker pool for the paper they will be printed on:
+
+    images  downscaled to ORDER_PRINT_DPI on that paper, re-encoded in
+            their own format
+    PDFs    page content stored raw or ASCII-encoded is re-compressed
+            with Flate; documents with catalog entries the rebuild can't
+            carry over (forms, XMP metadata, attachments...) are left alone
+
+Blobs are shared, so the target is the largest paper any order using the
+blob asked for. The result replaces the stored bytes only if it saves at
+least ORDER_OPTIMIZE_MIN_SAVING, under a name of its own (FileBlob.
+storage_name with a digest of the new bytes), so URLs and ETags never
+mix the two versions; either way the before/after byte counts are
+recorded on the blob (size / optimized_size). A later upload of the same
+content restores the original (FileBlob.acquire), to be optimized again
+for its order.
+"""
+import hashlib
+import logging
+import os
+import tempfile
+from functools import partial
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+
+from . import ingest
+
+logger = logging.getLogger(__name__)
+
+OPTIMIZE_UPLOADS = getattr(settings, 'ORDER_OPTIMIZE_UPLOADS', False)
+PRINT_DPI = getattr(settings, 'ORDER_PRINT_DPI', 300)
+MIN_SAVING = getattr(settings, 'ORDER_OPTIMIZE_MIN_SAVING', 0.10)  # Fraction of the original size
+JPEG_QUALITY = getattr(settings, 'ORDER_OPTIMIZE_JPEG_QUALITY', 90)
+
+# Smallest first; short and long side in millimetres
+PAPER_MM = {'A4': (210, 297), 'A3': (297, 420)}
+# Filters that only encode bytes; streams using nothing else get re-compressed
+_REENCODABLE_FILTERS = {'/ASCII85Decode', '/ASCIIHexDecode', '/FlateDecode'}
+# Catalog entries that survive the rebuild in compact_pdf
+_CARRIED_CATALOG_KEYS = {'/Type', '/Pages', '/Outlines', '/PageMode', '/PageLayout', '/Names'}
+
+
+def target_pixels(paper_size):
+    """(short, long) side in pixels for printing on paper_size at PRINT_DPI"""
+    short_mm, long_mm = PAPER_MM.get(paper_size, PAPER_MM['A4'])
+    return round(short_mm / 25.4 * PRINT_DPI), round(long_mm / 25.4 * PRINT_DPI)
+
+
+def largest_paper(paper_sizes):
+    sizes = [size for size in PAPER_MM if size in set(paper_sizes)]
+    return sizes[-1] if sizes else 'A4'
+
+
+def optimize_image(path, paper_size, out):
+    """Downscale to the print resolution; returns False when there is nothing to gain"""
+    from PIL import Image, ImageOps
+
+    with Image.open(path) as image:
+        image_format = 'JPEG' if image.format == 'MPO' else image.format  # Phone cameras
+        short_px, long_px = target_pixels(paper_size)
+        oversized = min(image.size) > short_px or max(image.size) > long_px
+        # Re-encoding a JPEG at print size already costs quality; only PNG is lossless
+        if not oversized and image_format != 'PNG':
+            return False
+        icc_profile = image.info.get('icc_profile')
+        image = ImageOps.exif_transpose(image)
+        if oversized:
+            box = (short_px, long_px) if image.width <= image.height else (long_px, short_px)
+            image.thumbnail(box, Image.LANCZOS)
+        options = {'dpi': (PRINT_DPI, PRINT_DPI), 'optimize': True}
+        if icc_profile:
+            options['icc_profile'] = icc_profile
+        if image_format == 'JPEG':
+            image = image.convert('RGB') if image.mode not in ('RGB', 'L', 'CMYK') else image
+            options['quality'] = JPEG_QUALITY
+        image.save(out, image_format, **options)
+    return True
+
+
+def _content_filters(page):
+    """Filters of each of a page's content streams; None if one can't be re-encoded losslessly"""
+    contents = page.get('/Contents')
+    if contents is None:
+        return []
+    contents = contents.get_object()
+    filters = []
+    for stream in (contents if isinstance(contents, list) else [contents]):
+        stream = stream.get_object()
+        names = stream.get('/Filter')
+        names = [] if names is None else [names] if isinstance(names, str) else list(names)
+        if '/DecodeParms' in stream or not set(names) <= _REENCODABLE_FILTERS:
+            return None
+        filters.append(names)
+    return filters
+
+
+def compact_pdf(path, out):
+    """Re-compress page content stored raw or ASCII-encoded; returns False when there is none"""
+    from PyPDF2 import PdfReader, PdfWriter
+
+    reader = PdfReader(path)
+    if reader.is_encrypted:
+        return False
+    catalog = reader.trailer['/Root']
+    names = catalog.get('/Names')
+    # PdfWriter.append carries pages, annotations, the outline and named
+    # destinations; anything else in the catalog would be dropped
+    if set(catalog) - _CARRIED_CATALOG_KEYS or (names is not None and set(names.get_object()) - {'/Dests'}):
+        return False
+
+    recompressed = 0
+    for page in reader.pages:
+        filters = _content_filters(page)
+        if filters and any(names != ['/FlateDecode'] for names in filters):
+            # On the reader's page, so the old streams are not copied over
+            page.compress_content_streams()
+            recompressed += 1
+    if not recompressed:
+        return False
+
+    writer = PdfWriter()
+    writer.append(reader)
+    if reader.metadata:
+        writer.add_metadata(reader.metadata)
+    for layout in ('page_mode', 'page_layout'):
+        if getattr(reader, layout):
+            setattr(writer, layout, getattr(reader, layout))
+    if hasattr(writer, 'compress_identical_objects'):  # pypdf 4.3+
+        writer.compress_identical_objects()
+    with open(out, 'wb') as fh:
+        writer.write(fh)
+    return True
+
+
+def optimize_file(path, kind, paper_size):
+    """
+    Optimized copy of a stored file, written next to it
+
+    Returns:
+        (candidate path or None, bytes before, bytes after) - None when the
+        original is kept (nothing to gain, saving below MIN_SAVING, failure)
+    """
+    before = os.path.getsize(path)
+    fd, out = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.optimizing')
+    os.close(fd)
+    try:
+        written = compact_pdf(path, out) if kind == 'pdf' else optimize_image(path, paper_size, out)
+        after = os.path.getsize(out) if written else before
+    except ingest.IngestLimit:
+        os.remove(out)
+        raise
+    except Exception:
+        logger.warning('Could not optimize %s', path, exc_info=True)
+        written, after = False, before
+
+    if not written or after > before * (1 - MIN_SAVING):
+        os.remove(out)
+        return None, before, before
+    return out, before, after
+
+
+def optimize_limited(path, kind, paper_size):
+    """optimize_file under the per-file ingestion limits (pool workers only)"""
+    try:
+        with ingest.file_limits():
+            return optimize_file(path, kind, paper_size)
+    except ingest.IngestLimit:
+        before = os.path.getsize(path)
+        return None, before, before
+
+
+def _digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as fh:
+        for piece in iter(lambda: fh.read(1024 * 1024), b''):
+            digest.update(piece)
+    return digest.hexdigest()
+
+
+def record_result(blob_id, source_name, paper_size, candidate, before, after):
+    """Swap the optimized bytes in under their own name, unless the blob changed meanwhile"""
+    from .models import FileBlob, OrderFile
+
+    with transaction.atomic():
+        blob = FileBlob.objects.select_for_update().filter(
+            pk=blob_id, file=source_name, tier=FileBlob.HOT, optimized_for=''
+        ).first()
+        if blob is None:
+            if candidate:
+                os.remove(candidate)
+            return
+        fields = {'optimized_for': paper_size, 'optimized_size': after}
+        if candidate:
+            name = FileBlob.storage_name(blob.sha256, source_name, variant=_digest(candidate)[:16])
+            os.replace(candidate, default_storage.path(name))
+            default_storage.delete(source_name)
+            fields['file'] = name
+            OrderFile.objects.filter(blob_id=blob_id).update(file=name)
+        FileBlob.objects.filter(pk=blob_id).update(**fields)
+
+
+def _collect(job, pool, future):
+    """Done-callback: record a pool result (runs on an executor thread)"""
+    try:
+        candidate, before, after = future.result()
+    except Exception:
+        logger.exception('Optimization worker failed for FileBlob %s', job[0])
+        ingest._reset_pool(pool)
+        return
+    try:
+        record_result(*job, candidate, before, after)
+    finally:
+        connection.close()
+
+
+def schedule(order):
+    """Queue optimization of an order's not yet optimized uploads (after commit)"""
+    from .models import FileBlob, OrderFile
+
+    if not OPTIMIZE_UPLOADS:
+        return
+    blobs = FileBlob.objects.filter(
+        order_files__order=order, tier=FileBlob.HOT, optimized_for='', pages_count__isnull=False
+    ).distinct()
+    jobs = []
+    for blob in blobs:
+        paper_size = largest_paper(OrderFile.objects.filter(blob=blob).values_list('paper_size', flat=True))
+        jobs.append((blob.pk, blob.file.name, paper_size, blob.file.path, ingest.file_kind(blob.file.name)))
+
+    def submit():
+        for blob_id, name, paper_size, path, kind in jobs:
+            job = (blob_id, name, paper_size)
+            if not ingest.INGEST_WORKERS:
+                record_result(*job, *optimize_file(path, kind, paper_size))
+                continue
+            pool, future = ingest.submit_to_pool(optimize_limited, path, kind, paper_size)
+            future.add_done_callback(partial(_collect, job, pool))
+
+    transaction.on_commit(submit)
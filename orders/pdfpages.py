@@ -0,0 +1,432 @@
+"""
+Fast PDF page counting
+Memory-maps the file and reads only what is needed to answer
+/Root -> /Pages -> /Count: the startxref pointer, the cross-reference
+sections (tables or streams, following /Prev through incremental
+updates), and the two or three objects on that path - possibly out of an
+object stream. Encrypted or damaged files fall back to a full PyPDF2
+parse.
+"""
+import mmap
+import re
+import zlib
+from collections import namedtuple
+
+import numpy as np
+
+# Try to import PyPDF2 for the fallback path
+try:
+    import PyPDF2
+except ImportError:
+    PyPDF2 = None
+
+# startxref sits in the last ~1 KB; leave room for junk after %%EOF
+TAIL_BYTES = 4096
+MAX_XREF_SECTIONS = 256  # Guard against /Prev loops
+MAX_REF_DEPTH = 8
+
+WHITESPACE = b'\x00\t\n\x0c\r '
+_REGULAR = re.compile(rb'[^\x00\t\n\x0c\r ()<>\[\]{}/%]+')
+_INTEGER = re.compile(rb'[+-]?\d+$')
+_XREF_ENTRY = re.compile(rb'(\d{10}) (\d{5}) ([nf])[\r\n ]{2}')
+_NAME_ESCAPE = re.compile(rb'#([0-9A-Fa-f]{2})')
+
+Ref = namedtuple('Ref', 'num gen')
+
+
+class PDFStructureError(ValueError):
+    """The fast path can't make sense of the file"""
+
+
+class Name(str):
+    """A PDF name (without the leading slash)"""
+
+
+def count_pages(path):
+    """Page count of a PDF file (fast path, PyPDF2 for anything unusual)"""
+    try:
+        return fast_count_pages(path)
+    except (PDFStructureError, ValueError, KeyError, IndexError, TypeError, zlib.error):
+        if PyPDF2 is None:
+            raise
+        return len(PyPDF2.PdfReader(path).pages)
+
+
+def fast_count_pages(path):
+    """Page count from the document catalog, without parsing page objects"""
+    with open(path, 'rb') as fh, mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        return _Document(data).page_count()
+
+
+# ------------------------------------------------------------------
+# Object parser (just enough PDF syntax for dictionaries and arrays)
+# ------------------------------------------------------------------
+
+class _Parser:
+    def __init__(self, data, pos):
+        self.data = data
+        self.pos = pos
+
+    def skip(self):
+        data, pos, end = self.data, self.pos, len(self.data)
+        while pos < end:
+            c = data[pos]
+            if c in WHITESPACE:
+                pos += 1
+            elif c == 0x25:  # % comment
+                while pos < end and data[pos] not in b'\r\n':
+                    pos += 1
+            else:
+                break
+        self.pos = pos
+
+    def token(self):
+        """Next regular token (keyword or number), or b'' at a delimiter"""
+        self.skip()
+        match = _REGULAR.match(self.data, self.pos)
+        if not match:
+            return b''
+        self.pos = match.end()
+        return match.group()
+
+    def integer(self):
+        token = self.token()
+        if not _INTEGER.match(token):
+            raise PDFStructureError(f'expected an integer at {self.pos}')
+        return int(token)
+
+    def keyword(self, expected):
+        if self.token() != expected:
+            raise PDFStructureError(f'expected {expected!r} at {self.pos}')
+
+    def parse(self):
+        self.skip()
+        data, pos = self.data, self.pos
+        head = data[pos:pos + 2]
+        if head == b'<<':
+            self.pos += 2
+            return self._dictionary()
+        if head[:1] == b'<':
+            end = data.find(b'>', pos)
+            if end < 0:
+                raise PDFStructureError('unterminated hex string')
+            self.pos = end + 1
+            return bytes(data[pos + 1:end])
+        if head[:1] == b'[':
+            self.pos += 1
+            return self._array()
+        if head[:1] == b'(':
+            return self._literal_string()
+        if head[:1] == b'/':
+            self.pos += 1
+            match = _REGULAR.match(data, self.pos)
+            raw = match.group() if match else b''
+            self.pos += len(raw)
+            return Name(_NAME_ESCAPE.sub(lambda m: bytes([int(m.group(1), 16)]), raw).decode('latin-1'))
+
+        token = self.token()
+        if not token:
+            raise PDFStructureError(f'unexpected delimiter at {pos}')
+        if token == b'true':
+            return True
+        if token == b'false':
+            return False
+        if token == b'null':
+            return None
+        if _INTEGER.match(token):
+            value = int(token)
+            # "num gen R" is an indirect reference
+            mark = self.pos
+            gen = self.token()
+            if gen.isdigit() and self.token() == b'R':
+                return Ref(value, int(gen))
+            self.pos = mark
+            return value
+        try:
+            return float(token)
+        except ValueError:
+            raise PDFStructureError(f'unexpected token {token[:20]!r}')
+
+    def _dictionary(self):
+        result = {}
+        while True:
+            self.skip()
+            if self.data[self.pos:self.pos + 2] == b'>>':
+                self.pos += 2
+                return result
+            key = self.parse()
+            if not isinstance(key, Name):
+                raise PDFStructureError('dictionary key is not a name')
+            result[key] = self.parse()
+
+    def _array(self):
+        result = []
+        while True:
+            self.skip()
+            if self.data[self.pos:self.pos + 1] == b']':
+                self.pos += 1
+                return result
+            result.append(self.parse())
+
+    def _literal_string(self):
+        data, pos, depth = self.data, self.pos + 1, 1
+        start = pos
+        while depth:
+            if pos >= len(data):
+                raise PDFStructureError('unterminated string')
+            c = data[pos]
+            if c == 0x5c:  # backslash escape
+                pos += 1
+            elif c == 0x28:
+                depth += 1
+            elif c == 0x29:
+                depth -= 1
+            pos += 1
+        self.pos = pos
+        return bytes(data[start:pos - 1])
+
+
+# ------------------------------------------------------------------
+# Cross-reference sections
+# ------------------------------------------------------------------
+
+class _XrefTable:
+    """Classic "xref" table; entries are read on demand (20 bytes each)"""
+
+    def __init__(self, data, pos):
+        self.data = data
+        self.subsections = []
+        parser = _Parser(data, pos)
+        parser.keyword(b'xref')
+        while True:
+            parser.skip()
+            if data[parser.pos:parser.pos + 7] == b'trailer':
+                parser.pos += 7
+                break
+            start, count = parser.integer(), parser.integer()
+            parser.skip()
+            self.subsections.append((start, count, parser.pos))
+            parser.pos += 20 * count
+        self.trailer = parser.parse()
+        if not isinstance(self.trailer, dict):
+            raise PDFStructureError('bad trailer')
+
+    def lookup(self, num):
+        for start, count, pos in self.subsections:
+            if start <= num < start + count:
+                entry = _XREF_ENTRY.match(self.data, pos + 20 * (num - start))
+                if not entry:
+                    raise PDFStructureError('malformed xref entry')
+                if entry.group(3) == b'n':
+                    return ('offset', int(entry.group(1)))
+                return None
+        return None
+
+
+class _XrefStream:
+    """Cross-reference stream (PDF 1.5+); rows decoded once, looked up by index"""
+
+    def __init__(self, document, pos):
+        header, raw = document.stream_at(pos)
+        if header.get('Type') != 'XRef':
+            raise PDFStructureError('startxref does not point at a cross-reference section')
+        self.trailer = header
+        self.widths = [int(w) for w in header['W']]
+        if len(self.widths) != 3:
+            raise PDFStructureError('bad /W')
+        self.row = sum(self.widths)
+        self.rows = document.decode(header, raw)
+        index = header.get('Index', [0, header['Size']])
+        self.subsections = []
+        base = 0
+        for i in range(0, len(index), 2):
+            self.subsections.append((index[i], index[i + 1], base))
+            base += index[i + 1]
+
+    def lookup(self, num):
+        for start, count, base in self.subsections:
+            if start <= num < start + count:
+                offset = (base + num - start) * self.row
+                fields = []
+                for width in self.widths:
+                    fields.append(int.from_bytes(self.rows[offset:offset + width], 'big'))
+                    offset += width
+                kind = fields[0] if self.widths[0] else 1
+                if kind == 1:
+                    return ('offset', fields[1])
+                if kind == 2:
+                    return ('compressed', fields[1], fields[2])
+                return None
+        return None
+
+
+# ------------------------------------------------------------------
+# Document
+# ------------------------------------------------------------------
+
+class _Document:
+    def __init__(self, data):
+        self.data = data
+        self.sections = []  # Newest first
+        self.trailer = {}
+        self._objects = {}
+        self._object_streams = {}
+        self._read_xref_chain()
+
+    def page_count(self):
+        if 'Encrypt' in self.trailer:
+            raise PDFStructureError('encrypted')
+        root = self.resolve(self.trailer['Root'])
+        pages = self.resolve(root['Pages'])
+        count = self.resolve(pages['Count'])
+        if not isinstance(count, int) or count < 0:
+            raise PDFStructureError('bad /Count')
+        return count
+
+    def _read_xref_chain(self):
+        data = self.data
+        marker = data.rfind(b'startxref', max(0, len(data) - TAIL_BYTES))
+        if marker < 0:
+            raise PDFStructureError('no startxref')
+        parser = _Parser(data, marker + 9)
+        pos, seen = parser.integer(), set()
+
+        while pos is not None:
+            if pos in seen or len(seen) >= MAX_XREF_SECTIONS or not 0 <= pos < len(data):
+                raise PDFStructureError('bad xref chain')
+            seen.add(pos)
+            section = self._section_at(pos)
+            self.sections.append(section)
+            # Hybrid-reference files: the table's companion stream comes next
+            if isinstance(section, _XrefTable) and 'XRefStm' in section.trailer:
+                self.sections.append(_XrefStream(self, section.trailer['XRefStm']))
+            for key, value in section.trailer.items():
+                self.trailer.setdefault(key, value)  # Newer revisions win
+            pos = section.trailer.get('Prev')
+
+    def _section_at(self, pos):
+        parser = _Parser(self.data, pos)
+        parser.skip()
+        if self.data[parser.pos:parser.pos + 4] == b'xref':
+            return _XrefTable(self.data, parser.pos)
+        return _XrefStream(self, parser.pos)
+
+    def _locate(self, num):
+        for section in self.sections:
+            entry = section.lookup(num)
+            if entry:
+                return entry
+        raise PDFStructureError(f'object {num} not found')
+
+    def resolve(self, value):
+        for _ in range(MAX_REF_DEPTH):
+            if not isinstance(value, Ref):
+                return value
+            value = self.object(value.num)
+        raise PDFStructureError('reference chain too deep')
+
+    def object(self, num):
+        if num not in self._objects:
+            entry = self._locate(num)
+            if entry[0] == 'offset':
+                value, _ = self._indirect_at(entry[1], num)
+            else:
+                value = self._from_object_stream(entry[1], entry[2], num)
+            self._objects[num] = value
+        return self._objects[num]
+
+    def _indirect_at(self, pos, expected=None):
+        """Parse "num gen obj ..." at pos; returns (value, stream data start or None)"""
+        parser = _Parser(self.data, pos)
+        num = parser.integer()
+        parser.integer()
+        parser.keyword(b'obj')
+        if expected is not None and num != expected:
+            raise PDFStructureError(f'object {expected} is not at its xref offset')
+        value = parser.parse()
+        if isinstance(value, dict) and parser.token() == b'stream':
+            start = parser.pos
+            if self.data[start:start + 2] == b'\r\n':
+                start += 2
+            elif self.data[start:start + 1] in (b'\n', b'\r'):
+                start += 1
+            return value, start
+        return value, None
+
+    def stream_at(self, pos):
+        header, start = self._indirect_at(pos)
+        if start is None:
+            raise PDFStructureError('expected a stream')
+        length = self.resolve(header['Length'])
+        return header, self.data[start:start + length]
+
+    def decode(self, header, raw):
+        """Apply the stream's filters (FlateDecode, PNG predictors)"""
+        filters = header.get('Filter', [])
+        filters = filters if isinstance(filters, list) else [filters]
+        params = header.get('DecodeParms') or {}
+        params = params[0] if isinstance(params, list) else params
+        if not filters:
+            return raw
+        if filters != ['FlateDecode']:
+            raise PDFStructureError(f'unsupported filter {filters}')
+        data = zlib.decompress(raw)
+        predictor = params.get('Predictor', 1)
+        if predictor == 1:
+            return data
+        if predictor < 10 or params.get('Colors', 1) != 1 or params.get('BitsPerComponent', 8) != 8:
+            raise PDFStructureError('unsupported predictor')
+        return _png_unpredict(data, params.get('Columns', 1))
+
+    def _from_object_stream(self, stream_num, index, num):
+        if stream_num not in self._object_streams:
+            entry = self._locate(stream_num)
+            if entry[0] != 'offset':
+                raise PDFStructureError('nested object stream')
+            header, raw = self.stream_at(entry[1])
+            decoded = self.decode(header, raw)
+            parser = _Parser(decoded, 0)
+            pairs = [(parser.integer(), parser.integer()) for _ in range(header['N'])]
+            self._object_streams[stream_num] = (decoded, header['First'], pairs)
+
+        decoded, first, pairs = self._object_streams[stream_num]
+        obj_num, offset = pairs[index]
+        if obj_num != num:
+            raise PDFStructureError(f'object {num} is not at its object stream index')
+        return _Parser(decoded, first + offset).parse()
+
+
+def _png_unpredict(data, columns):
+    """Undo PNG row predictors for 1-byte-per-pixel data"""
+    width = columns + 1
+    if len(data) % width:
+        raise PDFStructureError('predictor row size mismatch')
+    rows = np.frombuffer(data, dtype=np.uint8).reshape(-1, width)
+    if (rows[:, 0] == 2).all():
+        # "Up" on every row (what writers use for xref streams) is a running sum
+        return np.cumsum(rows[:, 1:], axis=0, dtype=np.uint8).tobytes()
+
+    out = np.zeros((len(rows), columns), dtype=np.int32)
+    previous = np.zeros(columns, dtype=np.int32)
+    for i, row in enumerate(rows):
+        kind, line = row[0], row[1:].astype(np.int32)
+        if kind == 1:
+            line = np.cumsum(line) & 0xFF
+        elif kind == 2:
+            line = (line + previous) & 0xFF
+        elif kind == 3:
+            for j in range(columns):
+                left = line[j - 1] if j else 0
+                line[j] = (line[j] + (left + previous[j]) // 2) & 0xFF
+        elif kind == 4:
+            for j in range(columns):
+                a = line[j - 1] if j else 0
+                b, c = previous[j], previous[j - 1] if j else 0
+                p = a + b - c
+                pa, pb, pc = abs(p - a), abs(p - b), abs(p - c)
+                predicted = a if pa <= pb and pa <= pc else b if pb <= pc else c
+                line[j] = (line[j] + predicted) & 0xFF
+        elif kind != 0:
+            raise PDFStructureError('bad predictor row')
+        out[i] = previous = line
+    return out.astype(np.uint8).tobytes()
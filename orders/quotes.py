@@ -0,0 +1,133 @@
+"""
+Price comparison across shops for a print job
+Sheet counts come from the OrderFile sheet math (one evaluation per file);
+prices for every shop are then a single product of a shops x 4 price
+matrix with the job's sheets per (paper size, colour) column.
+"""
+from decimal import Decimal
+
+import numpy as np
+from django.db.models import FloatField
+from django.db.models.functions import Cast
+
+from shops.ranking import haversine_km
+from shops.spatial import radius_prefilter
+from .models import OrderFile
+
+# Column order of the price matrix: (paper_size, color_type, Shop price field)
+PRICE_COLUMNS = [
+    ('A4', 'BW', 'a4_bw_price'),
+    ('A4', 'COLOR', 'a4_color_price'),
+    ('A3', 'BW', 'a3_bw_price'),
+    ('A3', 'COLOR', 'a3_color_price'),
+]
+MAX_QUOTE_FILES = 50
+MAX_QUOTE_SHOPS = 500
+MAX_QUOTE_PAGES = 10000
+PAISE = Decimal('0.01')
+
+
+class QuoteError(ValueError):
+    """Invalid job spec"""
+
+
+def _choice(value, choices, field):
+    allowed = [c[0] for c in choices]
+    if value not in allowed:
+        raise QuoteError(f"{field} must be one of {', '.join(str(a) for a in allowed)}")
+    return value
+
+
+def _positive_int(value, field, maximum):
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        raise QuoteError(f"{field} must be a whole number")
+    if not 1 <= value <= maximum:
+        raise QuoteError(f"{field} must be between 1 and {maximum}")
+    return value
+
+
+def parse_job(files):
+    """
+    Validate a job spec into unsaved OrderFile objects
+
+    Args:
+        files: list of dicts with pages and, optionally, paper_size,
+               color_type, print_side, pages_per_sheet, print_type, copies
+               (OrderFile defaults apply)
+    """
+    if not isinstance(files, list) or not files:
+        raise QuoteError('files must be a non-empty list')
+    if len(files) > MAX_QUOTE_FILES:
+        raise QuoteError(f"At most {MAX_QUOTE_FILES} files per quote")
+
+    job = []
+    for spec in files:
+        if not isinstance(spec, dict):
+            raise QuoteError('Each file must be an object')
+        job.append(OrderFile(
+            pages_count=_positive_int(spec.get('pages'), 'pages', MAX_QUOTE_PAGES),
+            paper_size=_choice(spec.get('paper_size', 'A4'), OrderFile.PAPER_SIZE_CHOICES, 'paper_size'),
+            color_type=_choice(spec.get('color_type', 'BW'), OrderFile.COLOR_CHOICES, 'color_type'),
+            print_side=_choice(spec.get('print_side', 'SINGLE'), OrderFile.SIDE_CHOICES, 'print_side'),
+            pages_per_sheet=_choice(
+                _positive_int(spec.get('pages_per_sheet', 1), 'pages_per_sheet', 9),
+                OrderFile.PAGES_PER_SHEET_CHOICES, 'pages_per_sheet'
+            ),
+            print_type=_choice(spec.get('print_type', 'ALL'), OrderFile.PRINT_TYPE_CHOICES, 'print_type'),
+            copies=_positive_int(spec.get('copies', 1), 'copies', 1000),
+        ))
+    return job
+
+
+def sheet_vector(job):
+    """Total sheets per PRICE_COLUMNS column, same sequence as OrderFile.calculate_price"""
+    sheets = np.zeros(len(PRICE_COLUMNS), dtype=np.int64)
+    columns = {(paper, color): i for i, (paper, color, _) in enumerate(PRICE_COLUMNS)}
+    for f in job:
+        sheets_per_copy = f.final_sheet_count_calc(f.sheets_after_micro(f.adjusted_pages()))
+        sheets[columns[(f.paper_size, f.color_type)]] += sheets_per_copy * f.copies
+    return sheets
+
+
+def quote_shops(queryset, job, lat, lon, radius):
+    """
+    Price a job at every shop of a queryset within `radius` km that offers
+    every paper size / colour the job needs
+
+    Returns:
+        List of dicts (shop_id, name, location, distance, total), cheapest first
+    """
+    fields = [field for _, _, field in PRICE_COLUMNS]
+    rows = list(
+        queryset.filter(radius_prefilter(lat, lon, radius))
+        .annotate(**{f'{field}_value': Cast(field, FloatField()) for field in fields})
+        .order_by()
+        .values_list('id', 'name', 'location', 'latitude', 'longitude', *[f'{field}_value' for field in fields])
+    )
+    if not rows:
+        return []
+
+    ids, names, locations, lats, lons, *prices = zip(*rows)
+    sheets = sheet_vector(job)
+    prices = np.nan_to_num(np.array(prices, dtype=float).T)  # Shops x columns, NULL -> 0
+    # A price of 0 (or none) means the shop doesn't offer that print, as in
+    # the facets (shops/facets.py); such shops can't take the job
+    offered = (prices[:, sheets > 0] > 0).all(axis=1)
+    distance = haversine_km(float(lat), float(lon), np.asarray(lats, dtype=float), np.asarray(lons, dtype=float))
+    keep = np.flatnonzero((distance <= radius) & offered)
+    keep = keep[np.argsort(distance[keep], kind='stable')][:MAX_QUOTE_SHOPS]  # Nearest first when capping
+
+    # Prices in paise so the totals are exact
+    matrix = np.rint(prices[keep] * 100).astype(np.int64)
+    totals = matrix @ sheets
+
+    cheapest = np.argsort(totals, kind='stable')
+    return [{
+        'shop_id': str(ids[keep[i]]),
+        'name': names[keep[i]],
+        'location': locations[keep[i]],
+        'distance': float(distance[keep[i]]),
+        'total': str((Decimal(int(totals[i])) / 100).quantize(PAISE)),
+    } for i in cheapest]
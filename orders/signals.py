@@ -0,0 +1,10 @@
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from .models import OrderFile, FileBlob
+
+
+@receiver(post_delete, sender=OrderFile)
+def release_file_blob(sender, instance, **kwargs):
+    """Drop the deleted file's reference on its shared blob (also on order cascades)."""
+    if instance.blob_id:
+        FileBlob.release(instance.blob_id)
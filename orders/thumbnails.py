@@ -0,0 +1,112 @@
+"""
+Page preview thumbnails for uploaded files
+Rendered during background ingestion (see ingest.py), cached per content
+hash next to the blob as small WebP images:
+uploads/thumbs/<2 hex>/<2 hex>/<sha256>-<page>.webp
+
+Images are thumbnailed with Pillow. PDFs are rendered with PyMuPDF (in
+requirements.txt), else poppler's pdftoppm on the PATH; without either,
+PDFs get no thumbnail and pages fall back to the file-type icon.
+"""
+import io
+import os
+import shutil
+import subprocess
+import tempfile
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+# Try to import PyMuPDF for PDF rendering
+try:
+    import fitz
+except ImportError:
+    fitz = None
+
+THUMB_ROOT = 'uploads/thumbs'
+THUMB_WIDTH = getattr(settings, 'ORDER_THUMBNAIL_WIDTH', 240)  # 2x a 120px preview
+THUMB_QUALITY = getattr(settings, 'ORDER_THUMBNAIL_QUALITY', 70)
+ALL_PAGES = getattr(settings, 'ORDER_THUMBNAIL_ALL_PAGES', False)
+MAX_PAGES = getattr(settings, 'ORDER_THUMBNAIL_MAX_PAGES', 50)
+RENDER_TIMEOUT = 60
+
+
+def storage_name(sha256, page):
+    return f"{THUMB_ROOT}/{sha256[:2]}/{sha256[2:4]}/{sha256}-{page}.webp"
+
+
+def wanted_pages(page_count):
+    """How many pages to thumbnail for a document of page_count pages"""
+    return min(page_count or 1, MAX_PAGES) if ALL_PAGES else 1
+
+
+def render(path, kind, pages=1):
+    """
+    WebP thumbnails for the first `pages` pages of a file
+
+    Returns:
+        list of WebP bytes (empty when no renderer can handle the file)
+    """
+    from PIL import Image, ImageOps
+
+    if kind == 'pdf':
+        images = _render_pdf(path, pages)
+    else:
+        with Image.open(path) as image:
+            image = ImageOps.exif_transpose(image)
+            image.thumbnail((THUMB_WIDTH, THUMB_WIDTH * 2))
+            images = [image.convert('RGB')]
+
+    thumbnails = []
+    for image in images:
+        if image.width > THUMB_WIDTH:
+            image = image.resize((THUMB_WIDTH, max(1, round(image.height * THUMB_WIDTH / image.width))))
+        out = io.BytesIO()
+        image.save(out, 'WEBP', quality=THUMB_QUALITY, method=4)
+        thumbnails.append(out.getvalue())
+    return thumbnails
+
+
+def _render_pdf(path, pages):
+    from PIL import Image
+
+    if fitz is not None:
+        images = []
+        with fitz.open(path) as document:
+            for number in range(min(pages, document.page_count)):
+                page = document[number]
+                zoom = THUMB_WIDTH / page.rect.width
+                pixmap = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+                images.append(Image.frombytes('RGB', (pixmap.width, pixmap.height), pixmap.samples))
+        return images
+
+    pdftoppm = shutil.which('pdftoppm')
+    if pdftoppm is None:
+        return []
+    with tempfile.TemporaryDirectory() as workdir:
+        subprocess.run(
+            [pdftoppm, '-png', '-f', '1', '-l', str(pages), '-scale-to-x', str(THUMB_WIDTH),
+             '-scale-to-y', '-1', path, os.path.join(workdir, 'page')],
+            check=True, capture_output=True, timeout=RENDER_TIMEOUT,
+        )
+        images = []
+        for name in sorted(os.listdir(workdir)):
+            with Image.open(os.path.join(workdir, name)) as image:
+                images.append(image.convert('RGB'))
+        return images
+
+
+def save(sha256, thumbnails):
+    """Store rendered thumbnails (page 1 first); returns how many were stored"""
+    for page, data in enumerate(thumbnails, start=1):
+        name = storage_name(sha256, page)
+        if default_storage.exists(name):
+            default_storage.delete(name)
+        default_storage.save(name, ContentFile(data))
+    return len(thumbnails)
+
+
+def delete(sha256, count):
+    for page in range(1, count + 1):
+        default_storage.delete(storage_name(sha256, page))
@@ -0,0 +1,140 @@
+"""
+Streaming upload handler for order files
+Chunks are hashed (SHA-256) and spooled straight to a temp file as they
+arrive; the file type is sniffed from its first bytes before anything is
+written, and per-file / per-order size caps are enforced mid-stream so a
+bad or oversized file is dropped without being buffered.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, SkipFile, StopUpload
+from django.http import QueryDict
+from django.utils.datastructures import MultiValueDict
+
+MB = 1024 * 1024
+MAX_FILE_BYTES = getattr(settings, 'ORDER_UPLOAD_MAX_FILE_BYTES', 50 * MB)
+MAX_ORDER_BYTES = getattr(settings, 'ORDER_UPLOAD_MAX_ORDER_BYTES', 200 * MB)
+# Multipart boundaries and form fields on top of the file bytes
+MULTIPART_SLACK = 1 * MB
+
+UPLOAD_FIELD = 'files'
+# Extension -> expected kind
+EXTENSIONS = {'pdf': 'pdf', 'jpg': 'jpeg', 'jpeg': 'jpeg', 'png': 'png'}
+# PDF headers may follow a little junk (the spec allows up to 1 KB)
+SNIFF_BYTES = 1024
+
+
+def sniff(header):
+    """File kind from its leading bytes, or None"""
+    if header.startswith(b'\xff\xd8\xff'):
+        return 'jpeg'
+    if header.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'png'
+    if b'%PDF-' in header[:SNIFF_BYTES]:
+        return 'pdf'
+    return None
+
+
+class OrderUploadHandler(FileUploadHandler):
+    """
+    Sole upload handler for order file uploads
+
+    Completed files are TemporaryUploadedFile objects with two extra
+    attributes, `sha256` (hex digest) and `kind` ('pdf', 'jpeg' or 'png').
+    Skipped files are reported in `errors`; `rejected` is set when the
+    whole upload went over the per-order cap.
+    """
+
+    def __init__(self, request=None, used_bytes=0):
+        super().__init__(request)
+        self.total = used_bytes  # Bytes already on the order
+        self.errors = []
+        self.rejected = False
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        if content_length and self.total + content_length > MAX_ORDER_BYTES + MULTIPART_SLACK:
+            # Refuse before reading a byte of the body
+            self._reject_order()
+            return QueryDict(encoding=encoding), MultiValueDict()
+        return None
+
+    def new_file(self, field_name, file_name, content_type, content_length, charset=None,
+                 content_type_extra=None):
+        super().new_file(field_name, file_name, content_type, content_length, charset, content_type_extra)
+        if self.rejected:
+            raise StopUpload(connection_reset=True)
+        if field_name != UPLOAD_FIELD:
+            raise SkipFile()
+
+        self.expected = EXTENSIONS.get(file_name.rsplit('.', 1)[-1].lower()) if '.' in file_name else None
+        if self.expected is None:
+            self.errors.append(f"{file_name}: only PDF, JPG and PNG files are accepted")
+            raise SkipFile()
+
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+        self.header = b''
+
+    def receive_data_chunk(self, raw_data, start):
+        self.size += len(raw_data)
+        self.total += len(raw_data)
+        if self.total > MAX_ORDER_BYTES:
+            self._discard()
+            self._reject_order()
+            raise StopUpload(connection_reset=True)
+        if self.size > MAX_FILE_BYTES:
+            self._discard()
+            self.errors.append(f"{self.file_name}: larger than {MAX_FILE_BYTES // MB} MB")
+            self.total -= self.size
+            raise SkipFile()
+
+        self.sha256.update(raw_data)
+        if hasattr(self, 'file'):
+            self.file.write(raw_data)
+            return None
+
+        # Hold the first bytes back until the type is known
+        self.header += raw_data
+        if len(self.header) >= SNIFF_BYTES:
+            self._open()
+        return None
+
+    def file_complete(self, file_size):
+        if not hasattr(self, 'file'):
+            if not self.size:
+                self.errors.append(f"{self.file_name}: file is empty")
+                return None
+            self._open(skip=False)
+            if not hasattr(self, 'file'):
+                return None
+
+        uploaded = self.__dict__.pop('file')
+        uploaded.seek(0)
+        uploaded.size = file_size
+        uploaded.sha256 = self.sha256.hexdigest()
+        uploaded.kind = self.expected
+        return uploaded
+
+    def _open(self, skip=True):
+        """Check the sniffed type, then start spooling to disk"""
+        kind = sniff(self.header)
+        if kind != self.expected:
+            self.errors.append(f"{self.file_name}: contents do not match the file type")
+            self.total -= self.size
+            if skip:
+                raise SkipFile()
+            return
+        self.file = TemporaryUploadedFile(self.file_name, self.content_type, 0, self.charset, self.content_type_extra)
+        self.file.write(self.header)
+        self.header = b''
+
+    def _discard(self):
+        uploaded = self.__dict__.pop('file', None)
+        if uploaded is not None:
+            uploaded.close()  # Deletes the temp file
+
+    def _reject_order(self):
+        self.rejected = True
+        self.errors.append(f"Uploads are limited to {MAX_ORDER_BYTES // MB} MB per order")
@@ -7,6 +7,10 @@ urlpatterns = [
     path('upload/<uuid:shop_id>/', views.upload_file, name='upload'),
     path('configure/<int:order_id>/', views.configure_order, name='configure'),
     path('add-files/<int:order_id>/', views.add_files_to_order, name='add_files'),
+    path('ingest-status/<int:order_id>/', views.ingest_status, name='ingest_status'),
+    path('uploads/<int:order_id>/', views.chunked_upload_create, name='chunked_upload_create'),
+    path('uploads/<int:order_id>/<uuid:upload_id>/', views.chunked_upload, name='chunked_upload'),
+    path('uploads/<int:order_id>/<uuid:upload_id>/finalize/', views.chunked_upload_finalize, name='chunked_upload_finalize'),
     path('checkout/<int:order_id>/', views.checkout, name='checkout'),
     path('payment/<int:order_id>/', views.process_payment, name='payment'),
     path('payment/success/<int:order_id>/', views.payment_success, name='payment_success'),
@@ -14,4 +18,5 @@ urlpatterns = [
     path('pickup/<int:order_id>/', views.pickup_info, name='pickup_info'),
     path('verify-pin/', views.verify_pin, name='verify_pin'),
     path('dispute/<int:order_id>/', views.raise_dispute, name='raise_dispute'),
+    path('api/quote/', views.price_quote, name='api_quote'),
 ]
@@ -2,31 +2,49 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
 from django.core.files.storage import FileSystemStorage
 from django.http import JsonResponse
-from django.views.decorators.csrf import csrf_exempt
+from django.db import transaction
+from django.db.models import Sum
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+from django.views.decorators.http import require_POST, require_http_methods
 from django.contrib.auth.decorators import login_required
 from django.conf import settings
 from shops.models import Shop
-from .models import Order, OrderFile, Dispute, Refund
+from .models import Order, OrderFile, FileBlob, Dispute, Refund
+from .uploads import OrderUploadHandler, MB
+from . import ingest, chunked, optimize
 import json
 
-# Try to import PyPDF2 for page counting
-try:
-    import PyPDF2
-except ImportError:
-    PyPDF2 = None
+QUOTE_DEFAULT_RADIUS_KM = 5
+QUOTE_MAX_RADIUS_KM = 50
 
+@csrf_exempt
 def upload_file(request, shop_id):
     """Step 2: File upload (Batch Support)"""
+    # The streaming handler has to be installed before anything reads the
+    # body, so CSRF is checked by the inner view once it is parsed
+    handler = OrderUploadHandler(request)
+    request.upload_handlers = [handler]
+    return _upload_file(request, shop_id, handler)
+
+
+@csrf_protect
+def _upload_file(request, shop_id, handler):
     shop = get_object_or_404(Shop, id=shop_id, is_approved=True)
     
     if request.method == 'POST':
-        # Get list of files (from multiple input)
+        # Get list of files (from multiple input) - already type-checked and hashed
         files = request.FILES.getlist('files')
         phone = request.POST.get('phone')
         customer_name = request.POST.get('customer_name', '')
         
+        if handler.rejected:
+            messages.error(request, handler.errors[-1])
+            return redirect('shops:detail', shop_id=shop_id)
+        for error in handler.errors:
+            messages.warning(request, f'Skipped {error}')
+
         if not files:
-            messages.error(request, 'Please upload at least one file.')
+            messages.error(request, 'Please upload at least one valid PDF, JPG or PNG file.')
             return redirect('shops:detail', shop_id=shop_id)
         
         # Create Order Container
@@ -38,46 +56,75 @@ def upload_file(request, shop_id):
             status='PENDING'
         )
         
-        allowed_extensions = ['pdf', 'jpg', 'jpeg', 'png']
-        
-        for uploaded_file in files:
-            ext = uploaded_file.name.split('.')[-1].lower()
-            if ext not in allowed_extensions:
-                continue # Skip invalid files
-            
-            # Estimate pages
-            pages = 1
-            if ext == 'pdf' and PyPDF2:
-                try:
-                    reader = PyPDF2.PdfReader(uploaded_file)
-                    pages = len(reader.pages)
-                except:
-                    pass
-            
-            OrderFile.objects.create(
-                order=order,
-                file=uploaded_file,
-                file_name=uploaded_file.name,
-                file_size_mb=round(uploaded_file.size / (1024 * 1024), 2),
-                pages_count=pages
-            )
-        
-        if not order.files.exists():
-            order.delete()
-            messages.error(request, 'No valid files uploaded.')
-            return redirect('shops:detail', shop_id=shop_id)
+        _store_order_files(order, files)
+        _remember_order(request, 'draft_order_ids', order.id)
 
         return redirect('orders:configure', order_id=order.id)
     
     return redirect('shops:detail', shop_id=shop_id)
 
 
+def _remember_order(request, key, value):
+    """
+    Add to a session list that grants a guest access to orders' files
+    (core/media.py): guest_order_ids (placed orders, also listed in order
+    tracking), draft_order_ids (unpaid uploads, for the configure step),
+    guest_phones (numbers looked up in order tracking)
+    """
+    remembered = request.session.get(key, [])
+    if value not in remembered:
+        remembered.append(value)
+        request.session[key] = remembered
+        request.session.modified = True
+
+
+def _store_order_files(order, uploaded_files):
+    """
+    Insert OrderFile rows for files that passed OrderUploadHandler in one
+    query. Bytes go to shared content-addressed blobs; content seen before
+    reuses its cached page count, the rest is counted in the background
+    (see ingest.py)
+    """
+    blobs = [FileBlob.acquire(uploaded_file) for uploaded_file in uploaded_files]
+    order_files = OrderFile.objects.bulk_create([
+        OrderFile(
+            order=order,
+            blob=blob,
+            file=blob.file.name,
+            file_name=uploaded_file.name,
+            file_size_mb=round(uploaded_file.size / MB, 2),
+            sha256=blob.sha256,
+            pages_count=blob.pages_count or 1,
+            ingest_error=blob.ingest_error,
+            status=(
+                OrderFile.FAILED if blob.ingest_error else
+                OrderFile.READY if blob.pages_count is not None else
+                OrderFile.INGESTING
+            ),
+        )
+        for uploaded_file, blob in zip(uploaded_files, blobs)
+    ])
+    ingest.ingest({blob.pk: blob for blob in blobs if not blob.is_ingested}.values())
+    return order_files
+
+
 def configure_order(request, order_id):
     """Step 3: Configure print settings (Multi-File Support)"""
     order = get_object_or_404(Order, id=order_id)
-    files = order.files.all()
+
+    # Files that failed ingestion are dropped, with a note saying why
+    for failed in order.files.filter(status=OrderFile.FAILED):
+        messages.error(request, f'{failed.file_name} {failed.ingest_error} and was removed.')
+        failed.delete()  # Releases its blob
+
+    files = order.files.select_related('blob')
+    progress = ingest.progress(order)
     
     if request.method == 'POST':
+        if progress['pending']:
+            messages.error(request, 'Your files are still being processed. Please wait a moment.')
+            return redirect('orders:configure', order_id=order.id)
+
         apply_to_all = request.POST.get('apply_to_all') == 'on'
         
         if apply_to_all:
@@ -111,6 +158,7 @@ def configure_order(request, order_id):
         
         # Calculate totals
         order.calculate_totals()
+        optimize.schedule(order)  # Paper sizes are known now
         
         # Handle Note for whole order if needed, but we stored per file. 
         # Maybe store a general note on order too? User said "Special note" in "Settings Panel".
@@ -121,11 +169,18 @@ def configure_order(request, order_id):
     context = {
         'order': order,
         'shop': order.shop,
-        'files': files
+        'files': files,
+        'progress': progress
     }
     return render(request, 'orders/configure.html', context)
 
 
+def ingest_status(request, order_id):
+    """AJAX endpoint polled by the configure page while files are processed"""
+    order = get_object_or_404(Order, id=order_id)
+    return JsonResponse(ingest.progress(order))
+
+
 @csrf_exempt
 def add_files_to_order(request, order_id):
     """AJAX endpoint to add more files to an existing order"""
@@ -134,47 +189,23 @@ def add_files_to_order(request, order_id):
     
     try:
         order = get_object_or_404(Order, id=order_id)
+        # Files already on the order count towards its size cap
+        handler = OrderUploadHandler(request, used_bytes=_used_bytes(order))
+        request.upload_handlers = [handler]
         files = request.FILES.getlist('files')
         
+        if handler.rejected:
+            return JsonResponse({'success': False, 'error': handler.errors[-1]})
         if not files:
-            return JsonResponse({'success': False, 'error': 'No files uploaded'})
+            error = '; '.join(handler.errors) or 'No files uploaded'
+            return JsonResponse({'success': False, 'error': error})
         
-        added_files = []
-        allowed_extensions = ['pdf', 'jpg', 'jpeg', 'png']
-        
-        for uploaded_file in files:
-            ext = uploaded_file.name.split('.')[-1].lower()
-            if ext not in allowed_extensions:
-                continue
-            
-            # Estimate pages
-            pages = 1
-            if ext == 'pdf' and PyPDF2:
-                try:
-                    reader = PyPDF2.PdfReader(uploaded_file)
-                    pages = len(reader.pages)
-                except:
-                    pass
-            
-            order_file = OrderFile.objects.create(
-                order=order,
-                file=uploaded_file,
-                file_name=uploaded_file.name,
-                file_size_mb=round(uploaded_file.size / (1024 * 1024), 2),
-                pages_count=pages
-            )
-            
-            added_files.append({
-                'id': order_file.id,
-                'file_name': order_file.file_name,
-                'file_url': order_file.file.url,
-                'pages_count': order_file.pages_count,
-                'file_size_mb': order_file.file_size_mb
-            })
+        added_files = [_order_file_json(order_file) for order_file in _store_order_files(order, files)]
         
         return JsonResponse({
             'success': True,
             'files': added_files,
+            'skipped': handler.errors,
             'message': f'{len(added_files)} file(s) added successfully'
         })
         
@@ -182,6 +213,93 @@ def add_files_to_order(request, order_id):
         return JsonResponse({'success': False, 'error': str(e)})
 
 
+def _order_file_json(order_file):
+    return {
+        'id': order_file.id,
+        'file_name': order_file.file_name,
+        'file_url': order_file.file.url,
+        'pages_count': order_file.pages_count,
+        'status': order_file.status,
+        'file_size_mb': order_file.file_size_mb
+    }
+
+
+def _used_bytes(order):
+    used_mb = order.files.aggregate(total=Sum('file_size_mb'))['total'] or 0
+    return int(used_mb * MB)
+
+
+@require_POST
+def chunked_upload_create(request, order_id):
+    """Start a resumable upload: {file_name, size} -> upload id and chunk size"""
+    order = get_object_or_404(Order, id=order_id)
+    try:
+        data = json.loads(request.body)
+    except ValueError:
+        data = None
+    if not isinstance(data, dict):
+        return JsonResponse({'success': False, 'error': 'Invalid JSON body'}, status=400)
+
+    try:
+        # Uploads still in flight count too, or several could each pass the cap
+        used_bytes = _used_bytes(order) + chunked.reserved_bytes(order.id)
+        upload = chunked.create(order.id, str(data.get('file_name', '')), data.get('size'), used_bytes)
+    except chunked.ChunkedUploadError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=e.status)
+    return JsonResponse({'success': True, **upload}, status=201)
+
+
+@require_http_methods(['GET', 'PUT', 'DELETE'])
+def chunked_upload(request, order_id, upload_id):
+    """Resume state (GET), one chunk (PUT, Content-Range), or abandon (DELETE)"""
+    state = {}
+    try:
+        state = chunked.load(order_id, upload_id)
+        if request.method == 'DELETE':
+            chunked.discard(upload_id)
+            return JsonResponse({'success': True})
+        if request.method == 'PUT':
+            chunked.write_chunk(
+                state, request.headers.get('Content-Range'), request,
+                checksum=request.headers.get('X-Chunk-SHA256')
+            )
+        return JsonResponse({'success': True, **chunked.status(state)})
+    except chunked.ChunkedUploadError as e:
+        error = {'success': False, 'error': str(e)}
+        if 'result' in state:
+            error['result'] = state['result']  # Finalized already: the stored outcome
+        return JsonResponse(error, status=e.status)
+
+
+@require_POST
+def chunked_upload_finalize(request, order_id, upload_id):
+    """Assemble a complete upload into an OrderFile (safe to retry)"""
+    order = get_object_or_404(Order, id=order_id)
+    try:
+        state = chunked.load(order.id, upload_id)
+        if 'result' in state:
+            return JsonResponse(state['result'])
+        upload = chunked.assemble(state)
+    except chunked.ChunkedUploadError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=e.status)
+
+    try:
+        with upload, transaction.atomic():
+            # Locking the order serializes its finalizes, so the cap check holds
+            Order.objects.select_for_update().get(pk=order.pk)
+            chunked.check_order_cap(_used_bytes(order), state['size'])
+            order_file, = _store_order_files(order, [upload])
+    except chunked.ChunkedUploadError as e:
+        chunked.unlock(state)
+        return JsonResponse({'success': False, 'error': str(e)}, status=e.status)
+    except Exception:
+        chunked.unlock(state)
+        raise
+    result = {'success': True, 'file': _order_file_json(order_file)}
+    chunked.complete(state, result)
+    return JsonResponse(result)
+
+
 def checkout(request, order_id):
     """Step 4: Checkout page"""
     order = get_object_or_404(Order, id=order_id)
@@ -238,11 +356,7 @@ def payment_success(request, order_id):
                 })
             
             # Save order ID to session for guest tracking
-            guest_orders = request.session.get('guest_order_ids', [])
-            if order.id not in guest_orders:
-                guest_orders.append(order.id)
-                request.session['guest_order_ids'] = guest_orders
-                request.session.modified = True
+            _remember_order(request, 'guest_order_ids', order.id)
 
             # Mark order as paid
             order.mark_paid()
@@ -289,9 +403,10 @@ def my_orders(request):
         query |= Q(id__in=session_order_ids)
     if phone_query:
         query |= Q(customer_phone=phone_query)
+        _remember_order(request, 'guest_phones', phone_query)  # Their files open from this page
         
     if query:
-        orders = Order.objects.filter(query).distinct().order_by('-created_at')
+        orders = Order.objects.filter(query).distinct().prefetch_related('files__blob').order_by('-created_at')
     else:
         orders = Order.objects.none()
     
@@ -382,3 +497,40 @@ def raise_dispute(request, order_id):
             return redirect('orders:my_orders')
             
     return render(request, 'orders/raise_dispute.html', {'order': order})
+
+
+@csrf_exempt
+@require_POST
+def price_quote(request):
+    """
+    Compare the price of a print job at every shop within a radius
+
+    JSON body:
+        files: [{pages, paper_size, color_type, print_side, pages_per_sheet,
+                 print_type, copies}, ...]
+        lat, lon: customer location
+        radius: km (default QUOTE_DEFAULT_RADIUS_KM)
+    """
+    from .quotes import QuoteError, parse_job, quote_shops, sheet_vector
+
+    try:
+        data = json.loads(request.body)
+        lat = float(data.get('lat'))
+        lon = float(data.get('lon'))
+        radius = float(data.get('radius', QUOTE_DEFAULT_RADIUS_KM))
+    except (json.JSONDecodeError, AttributeError, TypeError, ValueError):
+        return JsonResponse({'error': 'A JSON body with lat, lon and files is required'}, status=400)
+
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180) or not 0 < radius <= QUOTE_MAX_RADIUS_KM:
+        return JsonResponse({'error': 'Location or radius out of range'}, status=400)
+
+    try:
+        job = parse_job(data.get('files'))
+    except QuoteError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    shops = Shop.objects.filter(is_approved=True, is_suspended=False)
+    return JsonResponse({
+        'sheets': int(sheet_vector(job).sum()),
+        'quotes': quote_shops(shops, job, lat, lon, radius),
+    })
@@ -0,0 +1,67 @@
+"""
+ZIP archives streamed as they are built
+zipfile writes into a sink that the generator drains after every chunk,
+so only one READ_SIZE piece of one member is in memory at a time whatever
+the archive size. The sink cannot seek, so zipfile puts each member's CRC
+and sizes in a data descriptor after its bytes.
+"""
+import zipfile
+
+READ_SIZE = 64 * 1024
+# Formats that are compressed already; deflating them again only costs CPU
+STORED_EXTENSIONS = {'pdf', 'jpg', 'jpeg', 'png', 'webp', 'zip'}
+
+
+class _Sink:
+    """Write-only file object for zipfile; drain() hands over what was written"""
+
+    def __init__(self):
+        self._parts = []
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._parts)
+        self._parts = []
+        return data
+
+
+def compress_type(name):
+    ext = name.rsplit('.', 1)[-1].lower() if '.' in name else ''
+    return zipfile.ZIP_STORED if ext in STORED_EXTENSIONS else zipfile.ZIP_DEFLATED
+
+
+def stream_zip(members):
+    """
+    Yield a ZIP archive piece by piece
+
+    Args:
+        members: iterable of (archive_name, size, date_time, open_fn); open_fn()
+                 returns a binary file object, opened only when its turn comes
+    """
+    sink = _Sink()
+    with zipfile.ZipFile(sink, 'w') as archive:
+        for name, size, date_time, open_fn in members:
+            info = zipfile.ZipInfo(name, date_time=date_time)
+            info.compress_type = compress_type(name)
+            info.file_size = size  # Lets zipfile decide on ZIP64 up front
+            with open_fn() as source, archive.open(info, 'w') as dest:
+                while True:
+                    piece = source.read(READ_SIZE)
+                    if not piece:
+                        break
+                    dest.write(piece)
+                    yield from _pending(sink)
+            yield from _pending(sink)  # Data descriptor
+    yield from _pending(sink)  # Central directory
+
+
+def _pending(sink):
+    data = sink.drain()
+    if data:
+        yield data
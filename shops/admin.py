@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import Shop
+from .models import Shop, ShopCatalogVersion
+from . import facets
 
 @admin.register(Shop)
 class ShopAdmin(admin.ModelAdmin):
@@ -10,10 +11,14 @@ class ShopAdmin(admin.ModelAdmin):
     
     def approve_shops(self, request, queryset):
         queryset.update(is_approved=True, is_verified=True)
+        ShopCatalogVersion.bump()  # update() skips the post_save signal
+        facets.rebuild()
         self.message_user(request, f"{queryset.count()} shops approved.")
     approve_shops.short_description = "Approve selected shops"
     
     def suspend_shops(self, request, queryset):
         queryset.update(is_suspended=True)
+        ShopCatalogVersion.bump()
+        facets.rebuild()
         self.message_user(request, f"{queryset.count()} shops suspended.")
     suspend_shops.short_description = "Suspend selected shops"
@@ -1,10 +1,23 @@
 """
 API views for shop geocoding and map features
 """
+import hashlib
+
+from django.core.cache import cache
+from django.db.models import Avg, Count, Sum
+from django.db.models.functions import Substr
 from django.http import JsonResponse
-from django.views.decorators.http import require_GET, require_POST
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import require_GET, require_POST, condition
 from django.contrib.auth.decorators import login_required
-from .geocoding import geocode_address, search_places
+from .geocoding import geocode_address, search_places, reverse_geocode
+from .models import Shop, ShopCatalogVersion
+from .spatial import bbox_prefilter, radius_prefilter, snap_bbox, cluster_precision
+from .schedule import parse_open_filter
+from .listing import filter_shops, filter_signature, parse_location
+
+CLUSTER_MAX_ZOOM = 13  # At this zoom and below markers are grouped into clusters
+CLUSTER_CACHE_SECONDS = 60 * 60
 
 
 @require_GET
@@ -31,6 +44,35 @@ def geocode(request):
         }, status=404)
 
 
+@require_GET
+def reverse_lookup(request):
+    """Convert coordinates to an address (grid-snapped and cached)"""
+    try:
+        lat = float(request.GET.get('lat', ''))
+        lon = float(request.GET.get('lon', ''))
+    except ValueError:
+        return JsonResponse({'error': 'Valid lat and lon are required'}, status=400)
+
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        return JsonResponse({'error': 'Coordinates out of range'}, status=400)
+
+    result = reverse_geocode(lat, lon)
+
+    if result:
+        return JsonResponse({
+            'success': True,
+            'lat': result['lat'],
+            'lon': result['lon'],
+            'display_name': result['display_name'],
+            'address': result['address']
+        })
+    else:
+        return JsonResponse({
+            'success': False,
+            'error': 'Could not reverse geocode coordinates'
+        }, status=404)
+
+
 @require_GET
 def search_locations(request):
     """Search for places with autocomplete"""
@@ -48,18 +90,122 @@ def search_locations(request):
     })
 
 
+def _parse_viewport(request):
+    """
+    Read bbox (west,south,east,north - Leaflet's toBBoxString order) and zoom
+
+    Returns:
+        (bbox, zoom) with bbox snapped to tile boundaries, or (None, zoom)
+    """
+    try:
+        zoom = max(0, min(20, int(request.GET.get('zoom', CLUSTER_MAX_ZOOM + 1))))
+    except ValueError:
+        zoom = CLUSTER_MAX_ZOOM + 1
+
+    raw = request.GET.get('bbox', '')
+    if not raw:
+        return None, zoom
+    try:
+        west, south, east, north = (float(v) for v in raw.split(','))
+    except ValueError:
+        return None, zoom
+    if south > north or west > east:
+        return None, zoom
+    return snap_bbox(south, north, west, east, zoom), zoom
+
+
+def _markers_etag(request):
+    bbox, zoom = _parse_viewport(request)
+    window = parse_open_filter(request.GET.get('open'))  # Changes every minute
+    # Only individual markers show queues; clusters survive order traffic.
+    # Per-shop queue versions only grow, so their sum over the visible shops
+    # moves whenever any of those queues does
+    queue = '-'
+    if zoom > CLUSTER_MAX_ZOOM:
+        shops = _visible_shops(request.GET)
+        if bbox:
+            shops = shops.filter(bbox_prefilter(*bbox))
+        queue = shops.aggregate(total=Sum('queue_version'))['total']
+    key = f"{ShopCatalogVersion.current()}|{queue}|{bbox}|{zoom}|{window}|{filter_signature(request.GET)}"
+    return hashlib.md5(key.encode()).hexdigest()
+
+
+def _visible_shops(params):
+    """
+    Shops on the map: the shop list's filters (search, facets, open,
+    distance) applied to the shops that have coordinates
+
+    The distance cut here is the prefilter box; markers apply the exact one.
+    """
+    shops, _, _ = filter_shops(params)
+    shops = shops.exclude(geohash='').order_by()
+    origin, radius = parse_location(params)
+    if origin and radius is not None:
+        shops = shops.filter(radius_prefilter(origin[0], origin[1], radius))
+    return shops
+
+
+def _clusters(precision, params):
+    """Per-cell shop counts for the whole map, cached per catalog version and filters"""
+    window = parse_open_filter(params.get('open'))
+    hours = '%s-%s' % window if window else 'any'
+    filters = hashlib.md5(filter_signature(params).encode()).hexdigest()
+    cache_key = f"shops:clusters:{ShopCatalogVersion.current()}:{precision}:{hours}:{filters}"
+    clusters = cache.get(cache_key)
+    if clusters is None:
+        cells = _visible_shops(params).annotate(
+            cell=Substr('geohash', 1, precision)
+        ).values('cell').annotate(
+            count=Count('id'), lat=Avg('latitude'), lon=Avg('longitude')
+        )
+        clusters = [{
+            'cell': c['cell'],
+            'lat': float(c['lat']),
+            'lon': float(c['lon']),
+            'count': c['count'],
+        } for c in cells]
+        cache.set(cache_key, clusters, CLUSTER_CACHE_SECONDS)
+    return clusters
+
+
 @require_GET
+@cache_control(no_cache=True)
+@condition(etag_func=_markers_etag)
 def shop_markers(request):
-    """Get all approved shops as map markers"""
-    from .models import Shop
-    
-    shops = Shop.objects.filter(
-        is_approved=True,
-        is_suspended=False,
-        latitude__isnull=False,
-        longitude__isnull=False
-    ).values('id', 'name', 'location', 'latitude', 'longitude', 'a4_bw_price', 'rating')
-    
+    """
+    Map markers for approved shops, clipped to the viewport
+
+    Query params:
+        bbox: west,south,east,north (optional - whole map when omitted)
+        zoom: map zoom level; at CLUSTER_MAX_ZOOM and below the response
+              carries clusters with counts instead of individual markers
+        search, open, price, rating, a3, color, lat/lon/distance: the shop
+              list's filters, so the map shows the shops the list does
+    """
+    bbox, zoom = _parse_viewport(request)
+
+    if zoom <= CLUSTER_MAX_ZOOM:
+        clusters = _clusters(cluster_precision(zoom), request.GET)
+        if bbox:
+            south, north, west, east = bbox
+            clusters = [c for c in clusters if south <= c['lat'] <= north and west <= c['lon'] <= east]
+        return JsonResponse({'zoom': zoom, 'clustered': True, 'clusters': clusters, 'markers': []})
+
+    shops = _visible_shops(request.GET)
+    if bbox:
+        shops = shops.filter(bbox_prefilter(*bbox))
+    shops = shops.values(
+        'id', 'name', 'location', 'latitude', 'longitude', 'a4_bw_price', 'rating',
+        'queue_orders', 'queue_sheets', 'avg_print_time'
+    )
+
+    origin, radius = parse_location(request.GET)
+
+    def within(shop):
+        if not origin or radius is None:
+            return True
+        return Shop.haversine(origin[0], origin[1], shop['latitude'], shop['longitude']) <= radius
+
     markers = [{
         'id': str(shop['id']),
         'name': shop['name'],
@@ -67,10 +213,12 @@ def shop_markers(request):
         'lat': float(shop['latitude']),
         'lon': float(shop['longitude']),
         'price': float(shop['a4_bw_price']),
-        'rating': float(shop['rating'])
-    } for shop in shops]
+        'rating': float(shop['rating']),
+        'queue': shop['queue_orders'],
+        'eta_minutes': Shop.eta_minutes(shop['queue_orders'], shop['queue_sheets'], shop['avg_print_time'])
+    } for shop in shops if within(shop)]
     
-    return JsonResponse({'markers': markers})
+    return JsonResponse({'zoom': zoom, 'clustered': False, 'clusters': [], 'markers': markers})
 
 
 @login_required
@@ -78,7 +226,6 @@ def shop_markers(request):
 def update_shop_location(request, shop_id):
     """Update shop location via AJAX"""
     import json
-    from .models import Shop
     
     try:
         shop = Shop.objects.get(id=shop_id, owner=request.user)
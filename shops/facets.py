@@ -0,0 +1,221 @@
+"""
+Faceted filters for the shop list
+Counts come from ShopFacetCount, a small cube of listed shops per
+(price band, A3, colour, rating bucket) cell kept in step by the Shop
+signals, so any combination of filters is answered from at most
+len(PRICE_BANDS) * 2 * 2 * len(RATING_BUCKETS) rows instead of COUNT(*)s.
+When the list is narrowed by search, opening hours or distance the same
+cells are counted over those shops with one GROUP BY instead.
+A price of 0 means the shop does not offer that paper/colour; such shops
+fall in no price band.
+"""
+from django.db import transaction
+from django.db.models import BooleanField, Case, Count, ExpressionWrapper, F, Q, Value, When
+
+# (key, label, min inclusive, max exclusive) on a4_bw_price
+PRICE_BANDS = [
+    ('under-1', 'Under ₹1', None, 1),
+    ('1-2', '₹1 – ₹2', 1, 2),
+    ('2-5', '₹2 – ₹5', 2, 5),
+    ('5-plus', '₹5 and up', 5, None),
+]
+# Disjoint rating buckets (key, min rating); the filter is "this bucket and up"
+RATING_BUCKETS = [
+    ('4', 4),
+    ('3', 3),
+    ('0', 0),
+]
+RATING_LABELS = {'4': '4★ & up', '3': '3★ & up'}
+
+
+def price_band(price):
+    price = float(price or 0)
+    if price <= 0:
+        return ''  # Not offered
+    for key, _, low, high in PRICE_BANDS:
+        if (low is None or price >= low) and (high is None or price < high):
+            return key
+    return PRICE_BANDS[-1][0]
+
+
+def rating_bucket(rating):
+    rating = float(rating or 0)
+    for key, low in RATING_BUCKETS:
+        if rating >= low:
+            return key
+    return RATING_BUCKETS[-1][0]
+
+
+def facet_cell(shop):
+    """Cube cell a shop counts towards, or None when it isn't listed"""
+    if not shop.is_approved or shop.is_suspended:
+        return None
+    return (
+        price_band(shop.a4_bw_price),
+        float(shop.a3_bw_price or 0) > 0 or float(shop.a3_color_price or 0) > 0,
+        float(shop.a4_color_price or 0) > 0 or float(shop.a3_color_price or 0) > 0,
+        rating_bucket(shop.rating),
+    )
+
+
+def move_shop(old, new):
+    """Shift one shop between cube cells (either may be None)"""
+    from .models import ShopFacetCount
+
+    if old == new:
+        return
+    with transaction.atomic():
+        if old:
+            ShopFacetCount.objects.filter(**_cell_lookup(old)).update(count=F('count') - 1)
+        if new:
+            cell, created = ShopFacetCount.objects.select_for_update().get_or_create(
+                **_cell_lookup(new), defaults={'count': 1}
+            )
+            if not created:
+                ShopFacetCount.objects.filter(pk=cell.pk).update(count=F('count') + 1)
+
+
+def rebuild():
+    """Recompute the whole cube (after queryset.update() on shops, or as a drift fix)"""
+    from .models import Shop, ShopFacetCount
+
+    cells = {}
+    shops = Shop.objects.filter(is_approved=True, is_suspended=False).only(
+        'is_approved', 'is_suspended', 'a4_bw_price', 'a4_color_price', 'a3_bw_price', 'a3_color_price', 'rating'
+    )
+    for shop in shops.iterator():
+        cell = facet_cell(shop)
+        cells[cell] = cells.get(cell, 0) + 1
+
+    with transaction.atomic():
+        ShopFacetCount.objects.all().delete()
+        ShopFacetCount.objects.bulk_create([
+            ShopFacetCount(**_cell_lookup(cell), count=count) for cell, count in cells.items()
+        ])
+
+
+def _cell_lookup(cell):
+    band, a3, color, rating = cell
+    return {'price_band': band, 'has_a3': a3, 'has_color': color, 'rating_bucket': rating}
+
+
+# ------------------------------------------------------------------
+# Request side
+# ------------------------------------------------------------------
+
+def parse_selection(params):
+    """Active facet filters from GET params (unknown values are ignored)"""
+    selected = {}
+    if params.get('price') in {key for key, _, _, _ in PRICE_BANDS}:
+        selected['price'] = params['price']
+    if params.get('rating') in RATING_LABELS:
+        selected['rating'] = params['rating']
+    if params.get('a3') == '1':
+        selected['a3'] = True
+    if params.get('color') == '1':
+        selected['color'] = True
+    return selected
+
+
+def facet_q(selected):
+    """Shop filter for the active facets"""
+    q = Q()
+    if 'price' in selected:
+        _, _, low, high = next(b for b in PRICE_BANDS if b[0] == selected['price'])
+        q &= Q(a4_bw_price__gt=0)
+        if low is not None:
+            q &= Q(a4_bw_price__gte=low)
+        if high is not None:
+            q &= Q(a4_bw_price__lt=high)
+    if selected.get('a3'):
+        q &= Q(a3_bw_price__gt=0) | Q(a3_color_price__gt=0)
+    if selected.get('color'):
+        q &= Q(a4_color_price__gt=0) | Q(a3_color_price__gt=0)
+    if 'rating' in selected:
+        q &= Q(rating__gte=dict(RATING_BUCKETS)[selected['rating']])
+    return q
+
+
+def _matches(row, selected, skip=None):
+    """Does a cube row satisfy every active facet except `skip`?"""
+    if skip != 'price' and 'price' in selected and row.price_band != selected['price']:
+        return False
+    if skip != 'a3' and selected.get('a3') and not row.has_a3:
+        return False
+    if skip != 'color' and selected.get('color') and not row.has_color:
+        return False
+    if skip != 'rating' and 'rating' in selected:
+        if int(row.rating_bucket) < int(selected['rating']):
+            return False
+    return True
+
+
+def scoped_rows(shops):
+    """
+    Cube rows for a queryset of listed shops, counted in one GROUP BY
+
+    Returns:
+        Unsaved ShopFacetCount instances, one per non-empty cell
+    """
+    from .models import ShopFacetCount
+
+    band = Case(
+        When(a4_bw_price__lte=0, then=Value('')),
+        *[When(a4_bw_price__lt=high, then=Value(key)) for key, _, _, high in PRICE_BANDS if high is not None],
+        default=Value(PRICE_BANDS[-1][0]),
+    )
+    rating = Case(
+        *[When(rating__gte=low, then=Value(key)) for key, low in RATING_BUCKETS],
+        default=Value(RATING_BUCKETS[-1][0]),
+    )
+    cells = shops.order_by().annotate(
+        cell_band=band,
+        cell_a3=ExpressionWrapper(Q(a3_bw_price__gt=0) | Q(a3_color_price__gt=0), output_field=BooleanField()),
+        cell_color=ExpressionWrapper(Q(a4_color_price__gt=0) | Q(a3_color_price__gt=0), output_field=BooleanField()),
+        cell_rating=rating,
+    ).values('cell_band', 'cell_a3', 'cell_color', 'cell_rating').annotate(count=Count('id'))
+    return [
+        ShopFacetCount(
+            price_band=c['cell_band'], has_a3=c['cell_a3'], has_color=c['cell_color'],
+            rating_bucket=c['cell_rating'], count=c['count'],
+        )
+        for c in cells
+    ]
+
+
+def facet_counts(selected, shops=None):
+    """
+    Counts per facet value, each computed with the other active facets
+    applied (the usual drill-down semantics)
+
+    Args:
+        selected: active facets (parse_selection)
+        shops: listed shops narrowed by search/hours/distance, facets not
+               applied; None reads the catalog-wide cube
+
+    Returns:
+        dict with price/rating lists of (key, label, count) and a3/color counts
+    """
+    from .models import ShopFacetCount
+
+    if shops is None:
+        rows = list(ShopFacetCount.objects.filter(count__gt=0))
+    else:
+        rows = scoped_rows(shops)
+
+    def total(skip, test):
+        return sum(r.count for r in rows if _matches(r, selected, skip) and test(r))
+
+    return {
+        'price': [
+            (key, label, total('price', lambda r, key=key: r.price_band == key))
+            for key, label, _, _ in PRICE_BANDS
+        ],
+        'rating': [
+            (key, label, total('rating', lambda r, key=key: int(r.rating_bucket) >= int(key)))
+            for key, label in RATING_LABELS.items()
+        ],
+        'a3': total('a3', lambda r: r.has_a3),
+        'color': total('color', lambda r: r.has_color),
+        'all': total(None, lambda r: True),
+    }
@@ -1,42 +1,346 @@
 """
 Geocoding utility for converting addresses to coordinates
 Uses Nominatim (OpenStreetMap) - free, no API key required
+
+Lookups go through a two-tier cache: an in-process LRU, then the
+GeocodeCache table. Place autocomplete is answered from the offline
+gazetteer (Place table, see `manage.py import_places`) when it has a
+match. Only misses everywhere reach Nominatim, via a gateway
+that reuses one keep-alive session, collapses identical concurrent
+lookups and enforces Nominatim's 1 request/second policy across workers.
 """
+import hashlib
+import math
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from datetime import timedelta
+
 import requests
 import logging
 from django.conf import settings
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import GeocodeCache, Place, RateLimitBucket
 
 logger = logging.getLogger(__name__)
 
 # Nominatim API (free, no key needed)
 NOMINATIM_URL = "https://nominatim.openstreetmap.org/search"
+NOMINATIM_REVERSE_URL = "https://nominatim.openstreetmap.org/reverse"
 USER_AGENT = "ZeroxNetwork/1.0"
 
+# Cache tuning (override in settings)
+CACHE_TTL = getattr(settings, 'GEOCODING_CACHE_TTL', timedelta(days=30))
+NEGATIVE_CACHE_TTL = getattr(settings, 'GEOCODING_NEGATIVE_CACHE_TTL', timedelta(days=1))
+LRU_SIZE = getattr(settings, 'GEOCODING_LRU_SIZE', 2048)
+# Viewport-biased searches share a cache entry per ~11 km bucket
+BIAS_PRECISION = 1
+# Reverse lookups share a cache entry per ~25 m grid cell
+REVERSE_GRID_METERS = getattr(settings, 'GEOCODING_REVERSE_GRID_METERS', 25)
+METERS_PER_DEGREE_LAT = 111195
+# Gazetteer rows fetched per requested result before distance re-ranking
+GAZETTEER_CANDIDATES_FACTOR = 10
+
+# Upstream budget (Nominatim usage policy: max 1 request/second)
+REQUEST_TIMEOUT = getattr(settings, 'GEOCODING_REQUEST_TIMEOUT', 5)
+RATE_LIMIT_INTERVAL = getattr(settings, 'GEOCODING_RATE_INTERVAL', 1.0)
+RATE_LIMIT_BURST = getattr(settings, 'GEOCODING_RATE_BURST', 1)
+# Longest a caller will sleep for a token before degrading to cache/empty
+RATE_LIMIT_MAX_WAIT = getattr(settings, 'GEOCODING_RATE_MAX_WAIT', 0.5)
+
+_MISS = object()
+
+
+class RateLimited(Exception):
+    """Upstream budget exhausted; caller should degrade instead of waiting"""
+
+
+class LRUCache:
+    """Small thread-safe LRU with per-entry expiry"""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key, _MISS)
+            if entry is _MISS:
+                return _MISS
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._data[key]
+                return _MISS
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl.total_seconds(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class SingleFlight:
+    """Collapse concurrent calls for the same key into one execution"""
+
+    class _Call:
+        def __init__(self):
+            self.done = threading.Event()
+            self.result = None
+            self.error = None
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, func):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = self._Call()
+
+        if not leader:
+            if not call.done.wait(REQUEST_TIMEOUT + RATE_LIMIT_MAX_WAIT + 1):
+                raise RateLimited(f"Timed out waiting for in-flight lookup {key}")
+            if call.error:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+
+class NominatimGateway:
+    """Single entry point for upstream calls: shared session + shared rate limit"""
+
+    BUCKET = 'nominatim'
+
+    def __init__(self):
+        self._session = None
+        self._session_lock = threading.Lock()
+        self._bucket_ready = False
+
+    @property
+    def session(self):
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    session = requests.Session()
+                    session.headers['User-Agent'] = USER_AGENT
+                    self._session = session
+        return self._session
+
+    def acquire(self):
+        """
+        Take one token from the shared bucket (GCRA), waiting at most RATE_LIMIT_MAX_WAIT
+
+        The check-and-advance is a single conditional UPDATE, so concurrent
+        workers cannot both take the same slot.
+        """
+        if not self._bucket_ready:
+            RateLimitBucket.objects.get_or_create(name=self.BUCKET)
+            self._bucket_ready = True
+
+        tolerance = (RATE_LIMIT_BURST - 1) * RATE_LIMIT_INTERVAL
+        deadline = time.time() + RATE_LIMIT_MAX_WAIT
+        while True:
+            now = time.time()
+            taken = RateLimitBucket.objects.filter(name=self.BUCKET, tat__lte=now + tolerance).update(
+                tat=Greatest(F('tat'), Value(now)) + RATE_LIMIT_INTERVAL
+            )
+            if taken:
+                return
+
+            tat = RateLimitBucket.objects.filter(name=self.BUCKET).values_list('tat', flat=True).first() or 0
+            wait = tat - tolerance - now
+            if now + wait > deadline:
+                raise RateLimited(f"Nominatim budget exhausted, next slot in {wait:.2f}s")
+            time.sleep(max(wait, 0.01))
+
+    def get(self, params, url=NOMINATIM_URL):
+        self.acquire()
+        response = self.session.get(url, params=params, timeout=REQUEST_TIMEOUT)
+        response.raise_for_status()
+        return response.json()
+
+
+_lru = LRUCache(LRU_SIZE)
+_inflight = SingleFlight()
+_gateway = NominatimGateway()
+
+
+def normalize_query(query):
+    """Canonical form of a free-text query: NFKC, lowercase, single spaces, no edge punctuation"""
+    query = unicodedata.normalize('NFKC', query or '').lower()
+    query = re.sub(r'\s+', ' ', query)
+    return query.strip(' ,.;:-')
+
+
+def bias_bucket(lat, lon):
+    """Round a viewport bias point so nearby searches share one cache entry"""
+    try:
+        return round(float(lat), BIAS_PRECISION), round(float(lon), BIAS_PRECISION)
+    except (TypeError, ValueError):
+        return None
+
+
+def snap_to_grid(lat, lon):
+    """
+    Snap a coordinate to the REVERSE_GRID_METERS grid
+
+    Returns:
+        (cell, (centre_lat, centre_lon)) where cell is an integer pair
+    """
+    lat_step = REVERSE_GRID_METERS / METERS_PER_DEGREE_LAT
+    row = math.floor(lat / lat_step)
+    centre_lat = (row + 0.5) * lat_step
+    # Keep cells roughly square by widening longitude steps away from the equator
+    lon_step = lat_step / max(math.cos(math.radians(centre_lat)), 0.01)
+    col = math.floor(lon / lon_step)
+    centre_lon = (col + 0.5) * lon_step
+    return (row, col), (round(centre_lat, 6), round(centre_lon, 6))
+
+
+def search_gazetteer(normalized, bucket=None, limit=5):
+    """
+    Prefix search over the offline gazetteer
+
+    Candidates are ranked by importance; with a bias point the nearest of
+    the top candidates win ties (importance drops 0.01 per km away).
+
+    Returns:
+        list of place results, empty when nothing matches
+    """
+    if not normalized:
+        return []
+
+    # Prefix match as an index range scan: [q, q + highest code point)
+    candidates = Place.objects.filter(
+        search_name__gte=normalized,
+        search_name__lt=normalized + '\U0010ffff',
+    ).order_by('-importance')[:limit * GAZETTEER_CANDIDATES_FACTOR]
+    candidates = list(candidates)
+
+    if bucket:
+        b_lat, b_lon = bucket
+
+        def score(place):
+            km = math.hypot(place.latitude - b_lat, (place.longitude - b_lon) * math.cos(math.radians(b_lat))) * 111.2
+            return place.importance - km * 0.01
+
+        candidates.sort(key=score, reverse=True)
+
+    return [{
+        'lat': place.latitude,
+        'lon': place.longitude,
+        'display_name': place.display_name or place.name,
+        'name': place.name,
+        'type': place.place_type,
+        'address': {}
+    } for place in candidates[:limit]]
+
+
+def _cache_key(kind, *parts):
+    raw = '|'.join([kind] + [str(p) for p in parts])
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def _cache_get(key, allow_stale=False):
+    """Look up LRU, then the DB table; returns _MISS when neither has a usable entry"""
+    value = _lru.get(key)
+    if value is not _MISS:
+        return value
+
+    entries = GeocodeCache.objects.filter(key=key)
+    if not allow_stale:
+        entries = entries.filter(expires_at__gt=timezone.now())
+    entry = entries.only('payload', 'expires_at').first()
+    if entry is None:
+        return _MISS
+    if entry.expires_at <= timezone.now():
+        # Expired rows are only served while over budget; don't promote them
+        return entry.payload
+
+    _lru.set(key, entry.payload, entry.expires_at - timezone.now())
+    return entry.payload
+
+
+def _cache_set(key, kind, query, value):
+    ttl = CACHE_TTL if value else NEGATIVE_CACHE_TTL
+    _lru.set(key, value, ttl)
+    try:
+        GeocodeCache.objects.update_or_create(
+            key=key,
+            defaults={
+                'kind': kind,
+                'query': query[:300],
+                'payload': value,
+                'expires_at': timezone.now() + ttl,
+            }
+        )
+    except Exception as e:
+        # The LRU still holds the value; a DB hiccup must not fail the lookup
+        logger.warning(f"Could not persist geocode cache entry for '{query}': {str(e)}")
+
+
+def _lookup(kind, key, query, params, parse, default, url=NOMINATIM_URL):
+    """
+    Serve from cache, otherwise fetch once (per key, per process) and cache
+
+    When the upstream budget is exhausted the caller gets a stale cached
+    value if there is one, else `default`, rather than blocking.
+    """
+    cached = _cache_get(key)
+    if cached is not _MISS:
+        return cached
+
+    def fetch():
+        value = parse(_gateway.get(params, url))
+        _cache_set(key, kind, query, value)
+        return value
+
+    try:
+        return _inflight.do(key, fetch)
+    except RateLimited as e:
+        logger.info(f"{kind} lookup for '{query}' degraded: {str(e)}")
+        stale = _cache_get(key, allow_stale=True)
+        return default if stale is _MISS else stale
+
 
 def geocode_address(address):
     """
     Convert address to latitude/longitude using Nominatim
-    
+
     Args:
         address: Street address string
-        
+
     Returns:
         dict with 'lat', 'lon', 'display_name' or None
     """
-    try:
-        params = {
-            'q': address,
-            'format': 'json',
-            'limit': 1,
-            'addressdetails': 1
-        }
-        headers = {'User-Agent': USER_AGENT}
-        
-        response = requests.get(NOMINATIM_URL, params=params, headers=headers, timeout=5)
-        response.raise_for_status()
-        
-        results = response.json()
-        
+    query = normalize_query(address)
+
+    def parse(results):
         if results:
             return {
                 'lat': float(results[0]['lat']),
@@ -44,7 +348,16 @@ def geocode_address(address):
                 'display_name': results[0].get('display_name', address)
             }
         return None
-        
+
+    try:
+        params = {
+            'q': address,
+            'format': 'json',
+            'limit': 1,
+            'addressdetails': 1
+        }
+        return _lookup('GEOCODE', _cache_key('GEOCODE', query), query, params, parse, None)
+
     except Exception as e:
         logger.error(f"Geocoding failed for '{address}': {str(e)}")
         return None
@@ -53,35 +366,28 @@ def geocode_address(address):
 def search_places(query, lat=None, lon=None, limit=5):
     """
     Search for places/addresses with autocomplete
-    
+
     Args:
         query: Search query
         lat: Bias towards this latitude (optional)
         lon: Bias towards this longitude (optional)
         limit: Max results
-        
+
     Returns:
         list of place results
     """
+    normalized = normalize_query(query)
+    bucket = bias_bucket(lat, lon) if lat and lon else None
+
+    # Local gazetteer first; Nominatim is only a fallback for misses
     try:
-        params = {
-            'q': query,
-            'format': 'json',
-            'limit': limit,
-            'addressdetails': 1
-        }
-        
-        if lat and lon:
-            params['viewbox'] = f"{lon-0.1},{lat+0.1},{lon+0.1},{lat-0.1}"
-            params['bounded'] = 0
-        
-        headers = {'User-Agent': USER_AGENT}
-        
-        response = requests.get(NOMINATIM_URL, params=params, headers=headers, timeout=5)
-        response.raise_for_status()
-        
-        results = response.json()
-        
+        local = search_gazetteer(normalized, bucket, limit)
+        if local:
+            return local
+    except Exception as e:
+        logger.error(f"Gazetteer search failed for '{query}': {str(e)}")
+
+    def parse(results):
         return [{
             'lat': float(r['lat']),
             'lon': float(r['lon']),
@@ -90,7 +396,70 @@ def search_places(query, lat=None, lon=None, limit=5):
             'type': r.get('type', ''),
             'address': r.get('address', {})
         } for r in results]
-        
+
+    try:
+        params = {
+            'q': query,
+            'format': 'json',
+            'limit': limit,
+            'addressdetails': 1
+        }
+
+        if bucket:
+            # Bias around the bucket centre so every caller in it gets the same answer
+            b_lat, b_lon = bucket
+            params['viewbox'] = f"{b_lon-0.1:.4f},{b_lat+0.1:.4f},{b_lon+0.1:.4f},{b_lat-0.1:.4f}"
+            params['bounded'] = 0
+
+        key = _cache_key('SEARCH', normalized, bucket, limit)
+        return _lookup('SEARCH', key, normalized, params, parse, [])
+
     except Exception as e:
         logger.error(f"Place search failed for '{query}': {str(e)}")
-        return []
\ No newline at end of file
+        return []
+
+
+def reverse_geocode(lat, lon):
+    """
+    Convert coordinates to an address using Nominatim's reverse endpoint
+
+    Coordinates are snapped to a ~25 m grid and looked up at the cell
+    centre, so clicks around one spot share a single cached answer.
+
+    Args:
+        lat: Latitude
+        lon: Longitude
+
+    Returns:
+        dict with 'lat', 'lon', 'display_name', 'address' or None
+    """
+    try:
+        lat, lon = float(lat), float(lon)
+        cell, (c_lat, c_lon) = snap_to_grid(lat, lon)
+
+        def parse(result):
+            if not result or 'error' in result:
+                return None
+            return {
+                'display_name': result.get('display_name', ''),
+                'address': result.get('address', {})
+            }
+
+        params = {
+            'lat': c_lat,
+            'lon': c_lon,
+            'format': 'json',
+            'zoom': 18,
+            'addressdetails': 1
+        }
+        query = f"{c_lat},{c_lon}"
+        place = _lookup('REVERSE', _cache_key('REVERSE', *cell), query, params, parse, None, NOMINATIM_REVERSE_URL)
+
+        if place is None:
+            return None
+        # Report the caller's own point, not the cell centre
+        return dict(place, lat=lat, lon=lon)
+
+    except Exception as e:
+        logger.error(f"Reverse geocoding failed for '{lat},{lon}': {str(e)}")
+        return None
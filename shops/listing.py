@@ -0,0 +1,114 @@
+"""
+Filters shared by the shop list and its map
+Both read the same GET params (search, facets, open, lat/lon/distance), so
+the map markers are the shops the list shows.
+"""
+from math import sqrt
+
+from django.conf import settings
+
+from .models import Shop
+from . import facets
+from .schedule import parse_open_filter, filter_open
+from .search import search_shops
+from .spatial import radius_prefilter
+from .pagination import PAGE_SIZE
+
+# Search rings (km) tried around the user when no distance is given
+NEARBY_RADII_KM = (2, 5, 10, 25, 50, 100)
+
+# GET params that narrow the listing (everything but paging and sorting)
+FILTER_PARAMS = ('search', 'open', 'lat', 'lon', 'distance', 'price', 'rating', 'a3', 'color')
+
+
+def parse_location(params):
+    """
+    (origin, radius) from the lat/lon/distance params
+
+    Returns:
+        origin as a (lat, lon) pair or None, radius in km or None
+    """
+    try:
+        origin = (float(params['lat']), float(params['lon'])) if params.get('lat') and params.get('lon') else None
+    except ValueError:
+        origin = None
+    try:
+        radius = float(params['distance']) if params.get('distance') else None
+    except ValueError:
+        radius = None
+    return origin, radius
+
+
+def nearby_radius(shops, origin, minimum=PAGE_SIZE):
+    """
+    Smallest search ring around origin holding at least `minimum` candidates
+
+    Bounds the ranking when the user gave no distance, instead of loading
+    and scoring every listed shop. Each ring costs one indexed COUNT on the
+    geohash prefilter. The box counted is the square inscribed in the ring,
+    so a ring that passes holds a full page at exact distance. The widest
+    ring is used when none fills up.
+    """
+    radii = getattr(settings, 'SHOP_NEARBY_RADII_KM', NEARBY_RADII_KM)
+    for radius in radii[:-1]:
+        if shops.filter(radius_prefilter(origin[0], origin[1], radius / sqrt(2))).count() >= minimum:
+            return radius
+    return radii[-1]
+
+
+def scope_shops(params, at=None):
+    """
+    Listed shops narrowed by the opening-hours and search params, before facets
+
+    This is the set the facet counts are taken over.
+
+    Returns:
+        (Shop queryset, opening-hours window or None)
+    """
+    shops = Shop.objects.filter(is_approved=True, is_suspended=False)
+
+    # Opening hours in SQL (weekly minute-of-week intervals)
+    window = parse_open_filter(params.get('open', ''), at)
+    if window:
+        shops = filter_open(shops, *window)
+
+    # Text search (full-text index, typo tolerant, ranked by relevance)
+    if params.get('search'):
+        shops = search_shops(shops, params['search'])
+    return shops, window
+
+
+def filter_shops(params, at=None):
+    """
+    scope_shops() narrowed by the facet params too
+
+    The distance param is left to the caller: the list cuts on exact
+    distance after ranking (see ranking.py).
+
+    Returns:
+        (Shop queryset, selected facets, opening-hours window or None)
+    """
+    shops, window = scope_shops(params, at)
+
+    # Facets (price band, A3, colour, rating)
+    selected_facets = facets.parse_selection(params)
+    if selected_facets:
+        shops = shops.filter(facets.facet_q(selected_facets))
+    return shops, selected_facets, window
+
+
+def within_radius(shops, origin, radius):
+    """Shops at most `radius` km from origin: geohash prefilter, then exact distance"""
+    rows = shops.filter(radius_prefilter(origin[0], origin[1], radius)).order_by().values_list(
+        'id', 'latitude', 'longitude'
+    )
+    ids = [
+        shop_id for shop_id, lat, lon in rows
+        if Shop.haversine(origin[0], origin[1], lat, lon) <= radius
+    ]
+    return shops.filter(id__in=ids)
+
+
+def filter_signature(params):
+    """The filter params in a stable form, for cache keys and ETags"""
+    return '&'.join(f"{name}={params.get(name, '')}" for name in FILTER_PARAMS)
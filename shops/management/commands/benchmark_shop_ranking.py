@@ -0,0 +1,145 @@
+"""
+Management command to benchmark the composite ranking stage of shop_list
+Scores synthetic candidate sets in memory; no database access
+"""
+import random
+import statistics
+import time
+from math import radians, cos, sin, asin, sqrt
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from shops.ranking import (
+    rank_candidates, ranking_weights, CANDIDATE_DTYPE, QUEUE_HALF_SCORE, MAX_RATING,
+)
+
+KM_PER_DEGREE = 111.2
+
+
+class Command(BaseCommand):
+    help = 'Benchmark p95 latency of the vectorized shop ranking stage (vs a per-shop Python loop)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--candidates',
+            type=int,
+            nargs='+',
+            default=[1000, 10000, 100000],
+            help='Candidate set sizes to rank (default: 1000 10000 100000)',
+        )
+        parser.add_argument(
+            '--radius',
+            type=float,
+            default=10,
+            help='Search radius in km the candidates are scattered over',
+        )
+        parser.add_argument(
+            '--iterations',
+            type=int,
+            default=50,
+            help='Rankings per candidate size for the vectorized path',
+        )
+        parser.add_argument(
+            '--baseline-iterations',
+            type=int,
+            default=5,
+            help='Rankings per candidate size for the pure Python loop (0 to skip)',
+        )
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        radius = options['radius']
+
+        self.stdout.write(f"\n{'='*60}")
+        self.stdout.write(f"  SHOP RANKING BENCHMARK - {radius:g} km radius")
+        self.stdout.write(f"{'='*60}")
+        self.stdout.write(f"  {'candidates':>10} {'load ms':>8} {'p50 ms':>9} {'p95 ms':>9} {'python p95 ms':>14}")
+
+        for size in options['candidates']:
+            rows = self._candidates(size, radius, rng)
+            # Row -> array conversion, as rank_nearby does with the query rows
+            load_timings = self._time(self._load, rows, radius, options['iterations'])
+            candidates = self._load(rows, radius)
+            timings = self._time(self._vectorized, candidates, radius, options['iterations'])
+
+            loop = '-'
+            if options['baseline_iterations'] > 0:
+                loop_timings = self._time(self._python_loop, rows, radius, options['baseline_iterations'])
+                loop = f"{self._p95(loop_timings):.2f}"
+
+            self.stdout.write(
+                f"  {size:>10,} {statistics.median(load_timings):>8.2f} "
+                f"{statistics.median(timings):>9.2f} {self._p95(timings):>9.2f} {loop:>14}"
+            )
+
+        self.stdout.write(f"{'='*60}\n")
+
+    @staticmethod
+    def _candidates(size, radius, rng):
+        """Rows shaped like rank_nearby's values_list"""
+        rows = []
+        for i in range(size):
+            rows.append((
+                i,
+                rng.uniform(-radius, radius) / KM_PER_DEGREE,
+                rng.uniform(-radius, radius) / KM_PER_DEGREE,
+                rng.choice([0.5, 1.0, 1.5, 2.0, 3.0]),
+                round(rng.uniform(0, 5), 2),
+                rng.choice([0, 30, 120, 480]),
+                rng.randint(0, 20),
+            ))
+        return rows
+
+    @staticmethod
+    def _load(rows, radius):
+        return np.fromiter(rows, dtype=CANDIDATE_DTYPE, count=len(rows))
+
+    @staticmethod
+    def _vectorized(candidates, radius):
+        """The ranking stage of shops.ranking.rank_nearby"""
+        return rank_candidates(candidates, 0.0, 0.0, radius)
+
+    @staticmethod
+    def _python_loop(rows, radius):
+        """Equivalent per-candidate loop, for comparison"""
+        w = ranking_weights()
+        total_weight = sum(w.values())
+        kept = []
+        for _, lat, lon, price, rating, open_for, queue in rows:
+            la, lo = radians(lat), radians(lon)
+            a = sin(la / 2) ** 2 + cos(la) * sin(lo / 2) ** 2
+            distance = round(2 * 6371 * asin(sqrt(a)), 1)
+            if distance <= radius:
+                kept.append((distance, price, rating, open_for, queue))
+        if not kept:
+            return []
+        low = min(k[1] for k in kept)
+        high = max(k[1] for k in kept)
+        scored = []
+        for distance, price, rating, open_for, queue in kept:
+            score = (
+                w['distance'] * max(0.0, 1 - distance / radius)
+                + w['price'] * ((high - price) / (high - low) if high > low else 1.0)
+                + w['rating'] * min(1.0, rating / MAX_RATING)
+                + w['open'] * (open_for > 0)
+                + w['queue'] * QUEUE_HALF_SCORE / (QUEUE_HALF_SCORE + queue)
+            ) / total_weight
+            scored.append((-score, distance))
+        scored.sort()
+        return scored
+
+    @staticmethod
+    def _time(func, rows, radius, iterations):
+        timings = []
+        for _ in range(iterations):
+            started = time.perf_counter()
+            func(rows, radius)
+            timings.append((time.perf_counter() - started) * 1000)
+        return timings
+
+    @staticmethod
+    def _p95(timings):
+        ordered = sorted(timings)
+        return ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))]
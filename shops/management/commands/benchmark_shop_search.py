@@ -0,0 +1,168 @@
+"""
+Management command to benchmark radius queries used by the shop list
+Runs against a throwaway test database, never the real one
+"""
+import random
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from shops.models import Shop
+from shops.spatial import encode_geohash, radius_prefilter
+
+# Rough bounding box of India, used to scatter synthetic city centres
+LAT_RANGE = (8.0, 32.0)
+LON_RANGE = (69.0, 89.0)
+KM_PER_DEGREE = 111.2
+
+
+class Command(BaseCommand):
+    help = 'Benchmark p95 latency of nearby-shop radius queries (indexed vs full scan)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--shops',
+            type=int,
+            nargs='+',
+            default=[100000, 1000000],
+            help='Shop counts to benchmark (default: 100000 1000000)',
+        )
+        parser.add_argument(
+            '--radii',
+            type=float,
+            nargs='+',
+            default=[1, 3, 5, 10, 25],
+            help='Radius filters in km (default: 1 3 5 10 25)',
+        )
+        parser.add_argument(
+            '--iterations',
+            type=int,
+            default=50,
+            help='Queries per radius for the indexed path',
+        )
+        parser.add_argument(
+            '--baseline-iterations',
+            type=int,
+            default=3,
+            help='Queries per radius for the legacy full-scan path (0 to skip)',
+        )
+        parser.add_argument(
+            '--cities',
+            type=int,
+            default=20,
+            help='Number of synthetic city clusters shops are spread around',
+        )
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+
+        try:
+            owner = User.objects.create_user(username='bench-owner')
+            cities = [
+                (rng.uniform(*LAT_RANGE), rng.uniform(*LON_RANGE))
+                for _ in range(options['cities'])
+            ]
+            loaded = 0
+
+            for total in sorted(options['shops']):
+                self._populate(owner, cities, loaded, total, rng)
+                loaded = total
+
+                self.stdout.write(f"\n{'='*60}")
+                self.stdout.write(f"  RADIUS QUERY BENCHMARK - {total:,} shops")
+                self.stdout.write(f"{'='*60}")
+                self.stdout.write(f"  {'radius':>7} {'matches':>8} {'p50 ms':>9} {'p95 ms':>9} {'scan p95 ms':>12}")
+
+                for radius in options['radii']:
+                    origins = [self._jitter(rng.choice(cities), 3, rng) for _ in range(options['iterations'])]
+                    timings, matches = self._time(self._indexed, origins, radius)
+
+                    scan = '-'
+                    if options['baseline_iterations'] > 0:
+                        scan_timings, _ = self._time(self._full_scan, origins[:options['baseline_iterations']], radius)
+                        scan = f"{self._p95(scan_timings):.1f}"
+
+                    self.stdout.write(
+                        f"  {radius:>5g}km {statistics.median(matches):>8.0f} "
+                        f"{statistics.median(timings):>9.2f} {self._p95(timings):>9.2f} {scan:>12}"
+                    )
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        self.stdout.write(f"{'='*60}\n")
+
+    def _populate(self, owner, cities, start, total, rng):
+        """Bulk insert shops clustered around the synthetic cities"""
+        self.stdout.write(f"  Loading shops {start:,} -> {total:,} ...")
+        batch = []
+        for i in range(start, total):
+            lat, lon = self._jitter(rng.choice(cities), 15, rng)
+            batch.append(Shop(
+                owner=owner,
+                name=f"Bench Shop {i}",
+                location='Benchmark',
+                phone='0000000000',
+                latitude=round(lat, 6),
+                longitude=round(lon, 6),
+                geohash=encode_geohash(lat, lon),
+                qr_code=f"BENCH-{i}",
+                is_approved=True,
+                is_verified=True,
+            ))
+            if len(batch) >= 5000:
+                Shop.objects.bulk_create(batch)
+                batch = []
+        if batch:
+            Shop.objects.bulk_create(batch)
+
+    @staticmethod
+    def _jitter(centre, sigma_km, rng):
+        lat = centre[0] + rng.gauss(0, sigma_km) / KM_PER_DEGREE
+        lon = centre[1] + rng.gauss(0, sigma_km) / KM_PER_DEGREE
+        return lat, lon
+
+    @staticmethod
+    def _indexed(lat, lon, radius):
+        """Same path as shops.views.shop_list: SQL prefilter, exact distance for candidates"""
+        shops = Shop.objects.filter(is_approved=True, is_suspended=False)
+        result = []
+        for shop in shops.filter(radius_prefilter(lat, lon, radius)):
+            distance = shop.distance_from(lat, lon)
+            if distance is not None and distance <= radius:
+                result.append((distance, shop))
+        result.sort(key=lambda x: x[0])
+        return result
+
+    @staticmethod
+    def _full_scan(lat, lon, radius):
+        """Previous shop_list behaviour: distance for every approved shop"""
+        shops = Shop.objects.filter(is_approved=True, is_suspended=False)
+        result = []
+        for shop in shops:
+            distance = shop.distance_from(lat, lon)
+            if distance is not None and distance <= radius:
+                result.append((distance, shop))
+        result.sort(key=lambda x: x[0])
+        return result
+
+    @staticmethod
+    def _time(func, origins, radius):
+        timings = []
+        matches = []
+        for lat, lon in origins:
+            started = time.perf_counter()
+            result = func(lat, lon, radius)
+            timings.append((time.perf_counter() - started) * 1000)
+            matches.append(len(result))
+        return timings, matches
+
+    @staticmethod
+    def _p95(timings):
+        ordered = sorted(timings)
+        return ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))]
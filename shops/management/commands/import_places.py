@@ -0,0 +1,151 @@
+"""
+Management command to load the offline place gazetteer used for autocomplete
+Accepts a CSV extract with a header row (e.g. exported from OSM) or a
+GeoNames dump (cities15000.txt, IN.txt, ...)
+"""
+import csv
+import math
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from shops.geocoding import normalize_query
+from shops.models import Place
+
+BATCH_SIZE = 5000
+
+# Accepted header names per field for --format csv
+CSV_COLUMNS = {
+    'name': ['name'],
+    'lat': ['lat', 'latitude', 'y'],
+    'lon': ['lon', 'lng', 'longitude', 'x'],
+    'display_name': ['display_name', 'full_name', 'label'],
+    'place_type': ['type', 'place', 'class', 'feature_code'],
+    'population': ['population', 'pop'],
+    'importance': ['importance', 'rank'],
+}
+
+
+def importance_from_population(population):
+    """Map population onto 0-1 (a city of 10M scores 1.0)"""
+    return min(1.0, math.log10(population + 1) / 7)
+
+
+class Command(BaseCommand):
+    help = 'Import an OSM/CSV or GeoNames place extract into the offline gazetteer'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Path to the extract file')
+        parser.add_argument(
+            '--format',
+            choices=['csv', 'geonames'],
+            default='csv',
+            help='csv: header row with name,lat,lon[,display_name,type,population,importance]; '
+                 'geonames: tab-separated GeoNames dump',
+        )
+        parser.add_argument(
+            '--replace',
+            action='store_true',
+            help='Delete existing gazetteer entries before importing',
+        )
+        parser.add_argument(
+            '--min-population',
+            type=int,
+            default=0,
+            help='Skip places smaller than this',
+        )
+
+    def handle(self, *args, **options):
+        reader = self._read_geonames if options['format'] == 'geonames' else self._read_csv
+
+        try:
+            handle = open(options['path'], newline='', encoding='utf-8')
+        except OSError as e:
+            raise CommandError(f"Cannot open {options['path']}: {e}")
+
+        imported = 0
+        skipped = 0
+        with handle, transaction.atomic():
+            if options['replace']:
+                deleted, _ = Place.objects.all().delete()
+                self.stdout.write(f"  Removed {deleted} existing places")
+
+            batch = []
+            for row in reader(handle):
+                place = self._build(row)
+                if place is None or place.population < options['min_population']:
+                    skipped += 1
+                    continue
+                batch.append(place)
+                if len(batch) >= BATCH_SIZE:
+                    Place.objects.bulk_create(batch)
+                    imported += len(batch)
+                    batch = []
+            if batch:
+                Place.objects.bulk_create(batch)
+                imported += len(batch)
+
+        self.stdout.write(self.style.SUCCESS(f"  Imported {imported} places ({skipped} skipped)"))
+
+    def _read_csv(self, handle):
+        rows = csv.DictReader(handle)
+        if not rows.fieldnames:
+            raise CommandError('CSV file has no header row')
+
+        headers = {h.strip().lower(): h for h in rows.fieldnames}
+        columns = {}
+        for field, aliases in CSV_COLUMNS.items():
+            columns[field] = next((headers[a] for a in aliases if a in headers), None)
+        missing = [f for f in ('name', 'lat', 'lon') if not columns[f]]
+        if missing:
+            raise CommandError(f"CSV is missing required columns: {', '.join(missing)}")
+
+        for row in rows:
+            yield {field: row.get(col, '') if col else '' for field, col in columns.items()}
+
+    def _read_geonames(self, handle):
+        # http://download.geonames.org/export/dump/readme.txt
+        for line in handle:
+            cols = line.rstrip('\n').split('\t')
+            if len(cols) < 15:
+                continue
+            yield {
+                'name': cols[1],
+                'lat': cols[4],
+                'lon': cols[5],
+                'display_name': '',
+                'place_type': cols[7],
+                'population': cols[14],
+                'importance': '',
+            }
+
+    def _build(self, row):
+        """Turn a parsed row into an unsaved Place, or None if unusable"""
+        name = (row['name'] or '').strip()
+        try:
+            lat = float(row['lat'])
+            lon = float(row['lon'])
+        except (TypeError, ValueError):
+            return None
+        if not name or not (-90 <= lat <= 90 and -180 <= lon <= 180):
+            return None
+
+        try:
+            population = max(0, int(float(row['population'] or 0)))
+        except ValueError:
+            population = 0
+        try:
+            importance = float(row['importance'])
+        except (TypeError, ValueError):
+            importance = importance_from_population(population)
+
+        return Place(
+            name=name[:200],
+            search_name=normalize_query(name)[:200],
+            display_name=(row['display_name'] or '').strip()[:400],
+            place_type=(row['place_type'] or '').strip()[:50],
+            latitude=lat,
+            longitude=lon,
+            population=population,
+            importance=importance,
+        )
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.30 on 2026-10-17 03:49
+
+from django.db import migrations, models
+
+
+def backfill_geohash(apps, schema_editor):
+    from shops.spatial import encode_geohash
+
+    Shop = apps.get_model('shops', 'Shop')
+    shops = Shop.objects.filter(latitude__isnull=False, longitude__isnull=False)
+    for shop in shops.iterator():
+        shop.geohash = encode_geohash(shop.latitude, shop.longitude)
+        shop.save(update_fields=['geohash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shops', '0008_shop_latitude_shop_longitude_alter_shop_owner'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shop',
+            name='geohash',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, help_text='Spatial index cell, derived from latitude/longitude', max_length=12),
+        ),
+        migrations.AddIndex(
+            model_name='shop',
+            index=models.Index(fields=['latitude', 'longitude'], name='shop_lat_lon_idx'),
+        ),
+        migrations.RunPython(backfill_geohash, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.30 on 2026-10-17 04:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shops', '0010_shopcatalogversion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GeocodeCache',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(help_text='SHA-1 of the normalized lookup key', max_length=64, unique=True)),
+                ('kind', models.CharField(choices=[('GEOCODE', 'Geocode'), ('SEARCH', 'Place Search')], max_length=10)),
+                ('query', models.CharField(help_text='Normalized query, for inspection', max_length=300)),
+                ('payload', models.JSONField(blank=True, help_text='Cached result; null caches a miss', null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('expires_at', models.DateTimeField(db_index=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.30 on 2026-10-17 04:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shops', '0011_geocodecache'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RateLimitBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('tat', models.FloatField(default=0.0, help_text='Theoretical arrival time (epoch seconds) of the next allowed request')),
+            ],
+        ),
+    ]
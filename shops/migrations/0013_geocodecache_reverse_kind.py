@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-17 04:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shops', '0012_ratelimitbucket'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='geocodecache',
+            name='kind',
+            field=models.CharField(choices=[('GEOCODE', 'Geocode'), ('SEARCH', 'Place Search'), ('REVERSE', 'Reverse Geocode')], max_length=10),
+        ),
+    ]
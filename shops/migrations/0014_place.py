@@ -0,0 +1,30 @@
+# Generated by Django 4.2.30 on 2026-10-17 04:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shops', '0013_geocodecache_reverse_kind'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Place',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200)),
+                ('search_name', models.CharField(help_text='Normalized name used for prefix lookups', max_length=200)),
+                ('display_name', models.CharField(blank=True, max_length=400)),
+                ('place_type', models.CharField(blank=True, max_length=50)),
+                ('latitude', models.FloatField()),
+                ('longitude', models.FloatField()),
+                ('population', models.PositiveIntegerField(default=0)),
+                ('importance', models.FloatField(default=0.0, help_text='Ranking weight (0-1), higher ranks first')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['search_name', 'importance'], name='place_prefix_idx')],
+            },
+        ),
+    ]
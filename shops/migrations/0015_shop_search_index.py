@@ -0,0 +1,59 @@
+from django.db import migrations
+
+
+SQLITE_CREATE = """
+CREATE VIRTUAL TABLE IF NOT EXISTS shops_shop_fts USING fts5(
+    shop_id UNINDEXED, name, location, owner_email, tokenize = 'trigram'
+)
+"""
+
+SQLITE_POPULATE = """
+INSERT INTO shops_shop_fts (shop_id, name, location, owner_email)
+SELECT s.id, s.name, s.location, COALESCE(u.email, '')
+FROM shops_shop s LEFT JOIN auth_user u ON u.id = s.owner_id
+"""
+
+POSTGRES_CREATE = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS shop_name_trgm_idx ON shops_shop USING gin (name gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS shop_location_trgm_idx ON shops_shop USING gin (location gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS auth_user_email_trgm_idx ON auth_user USING gin (email gin_trgm_ops)",
+]
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    with schema_editor.connection.cursor() as cursor:
+        if vendor == 'sqlite':
+            try:
+                cursor.execute(SQLITE_CREATE)
+            except Exception:
+                # SQLite built without FTS5/trigram: search falls back to icontains
+                return
+            cursor.execute(SQLITE_POPULATE)
+        elif vendor == 'postgresql':
+            for statement in POSTGRES_CREATE:
+                cursor.execute(statement)
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    with schema_editor.connection.cursor() as cursor:
+        if vendor == 'sqlite':
+            cursor.execute("DROP TABLE IF EXISTS shops_shop_fts")
+        elif vendor == 'postgresql':
+            cursor.execute("DROP INDEX IF EXISTS shop_name_trgm_idx")
+            cursor.execute("DROP INDEX IF EXISTS shop_location_trgm_idx")
+            cursor.execute("DROP INDEX IF EXISTS auth_user_email_trgm_idx")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('shops', '0014_place'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.30 on 2026-10-17 04:12
+
+from django.db import migrations, models
+
+
+def backfill_primary_image(apps, schema_editor):
+    Shop = apps.get_model('shops', 'Shop')
+    ShopImage = apps.get_model('shops', 'ShopImage')
+    for shop in Shop.objects.iterator():
+        images = ShopImage.objects.filter(shop=shop, is_approved=True)
+        primary = images.filter(is_primary=True).first() or images.first()
+        if primary:
+            shop.primary_image_url = primary.image.url
+            shop.save(update_fields=['primary_image_url'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shops', '0015_shop_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shop',
+            name='primary_image_url',
+            field=models.CharField(blank=True, default='', editable=False, help_text='Cached URL of the primary approved image', max_length=300),
+        ),
+        migrations.RunPython(backfill_primary_image, migrations.RunPython.noop),
+    ]
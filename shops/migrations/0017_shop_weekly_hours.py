@@ -0,0 +1,47 @@
+# Generated by Django 4.2.30 on 2026-10-17 04:14
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_intervals(apps, schema_editor):
+    from shops.schedule import weekly_intervals
+
+    Shop = apps.get_model('shops', 'Shop')
+    ShopOpeningInterval = apps.get_model('shops', 'ShopOpeningInterval')
+    rows = []
+    for shop in Shop.objects.iterator():
+        rows.extend(
+            ShopOpeningInterval(shop=shop, start_minute=start, end_minute=end)
+            for start, end in weekly_intervals(shop)
+        )
+    ShopOpeningInterval.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shops', '0016_shop_primary_image_url'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shop',
+            name='weekly_hours',
+            field=models.JSONField(blank=True, default=dict, help_text='Weekday (0=Monday) to list of [opens, closes]; [] = closed'),
+        ),
+        migrations.CreateModel(
+            name='ShopOpeningInterval',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start_minute', models.PositiveIntegerField()),
+                ('end_minute', models.PositiveIntegerField(help_text='May pass the end of the week for Sunday-night intervals')),
+                ('shop', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='opening_intervals', to='shops.shop')),
+            ],
+            options={
+                'ordering': ['start_minute'],
+                'indexes': [models.Index(fields=['start_minute', 'end_minute'], name='opening_interval_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_intervals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.30 on 2026-10-17 04:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shops', '0017_shop_weekly_hours'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shop',
+            name='queue_orders',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='shop',
+            name='queue_sheets',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 4.2.30 on 2026-10-17 04:22
+
+from django.db import migrations, models
+
+
+def backfill_facet_counts(apps, schema_editor):
+    from shops.facets import facet_cell
+
+    Shop = apps.get_model('shops', 'Shop')
+    ShopFacetCount = apps.get_model('shops', 'ShopFacetCount')
+    cells = {}
+    for shop in Shop.objects.filter(is_approved=True, is_suspended=False).iterator():
+        cell = facet_cell(shop)
+        cells[cell] = cells.get(cell, 0) + 1
+    ShopFacetCount.objects.bulk_create([
+        ShopFacetCount(price_band=band, has_a3=a3, has_color=color, rating_bucket=rating, count=count)
+        for (band, a3, color, rating), count in cells.items()
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shops', '0018_shop_queue_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShopFacetCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('price_band', models.CharField(max_length=10)),
+                ('has_a3', models.BooleanField()),
+                ('has_color', models.BooleanField()),
+                ('rating_bucket', models.CharField(max_length=2)),
+                ('count', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='shopfacetcount',
+            constraint=models.UniqueConstraint(fields=('price_band', 'has_a3', 'has_color', 'rating_bucket'), name='unique_facet_cell'),
+        ),
+        migrations.RunPython(backfill_facet_counts, migrations.RunPython.noop),
+    ]
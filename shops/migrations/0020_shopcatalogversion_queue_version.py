@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-17 04:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shops', '0019_shopfacetcount'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shopcatalogversion',
+            name='queue_version',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+    ]
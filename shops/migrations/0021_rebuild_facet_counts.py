@@ -0,0 +1,29 @@
+from django.db import migrations
+
+
+def rebuild_facet_counts(apps, schema_editor):
+    """Recount the cube: shops priced 0 (not offered) no longer fall in a price band"""
+    from shops.facets import facet_cell
+
+    Shop = apps.get_model('shops', 'Shop')
+    ShopFacetCount = apps.get_model('shops', 'ShopFacetCount')
+    cells = {}
+    for shop in Shop.objects.filter(is_approved=True, is_suspended=False).iterator():
+        cell = facet_cell(shop)
+        cells[cell] = cells.get(cell, 0) + 1
+    ShopFacetCount.objects.all().delete()
+    ShopFacetCount.objects.bulk_create([
+        ShopFacetCount(price_band=band, has_a3=a3, has_color=color, rating_bucket=rating, count=count)
+        for (band, a3, color, rating), count in cells.items()
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shops', '0020_shopcatalogversion_queue_version'),
+    ]
+
+    operations = [
+        migrations.RunPython(rebuild_facet_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.30 on 2026-10-17 05:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shops', '0021_rebuild_facet_counts'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='shopcatalogversion',
+            name='queue_version',
+        ),
+        migrations.AddField(
+            model_name='shop',
+            name='queue_version',
+            field=models.PositiveBigIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -1,9 +1,17 @@
 from django.db import models
 from django.contrib.auth.models import User
 from django.utils import timezone
-from math import radians, cos, sin, asin, sqrt
+from math import radians, cos, sin, asin, sqrt, ceil
 import uuid
 
+from .spatial import encode_geohash
+from .facets import facet_cell
+
+PLACEHOLDER_IMAGE = '/static/images/shop_placeholder.png'
+QUEUE_SHEETS_PER_ORDER = 20  # Sheets in an average order, for queue ETAs
+# Shop fields that decide its ShopFacetCount cell
+FACET_FIELDS = {'is_approved', 'is_suspended', 'a4_bw_price', 'a4_color_price', 'a3_bw_price', 'a3_color_price', 'rating'}
+
 
 class Shop(models.Model):
     """Shop model for print shop registration"""
@@ -16,6 +24,8 @@ class Shop(models.Model):
     # Location Coordinates
     latitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True, help_text="Shop latitude coordinate")
     longitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True, help_text="Shop longitude coordinate")
+    primary_image_url = models.CharField(max_length=300, blank=True, default='', editable=False, help_text="Cached URL of the primary approved image")
+    geohash = models.CharField(max_length=12, blank=True, default='', db_index=True, editable=False, help_text="Spatial index cell, derived from latitude/longitude")
     
     # Approval & Status
     is_verified = models.BooleanField(default=False)
@@ -36,6 +46,11 @@ class Shop(models.Model):
     rating = models.DecimalField(max_digits=3, decimal_places=2, default=0.00)
     total_orders = models.IntegerField(default=0)
     avg_print_time = models.IntegerField(default=15, help_text="Average print time in minutes")
+
+    # Live queue (PAID/ACCEPTED/PRINTING orders), kept in step by Order.save/delete
+    queue_orders = models.IntegerField(default=0, editable=False)
+    queue_sheets = models.IntegerField(default=0, editable=False)
+    queue_version = models.PositiveBigIntegerField(default=0, editable=False)  # Bumped with every queue change
     
     # Earnings
     earnings_total = models.DecimalField(max_digits=10, decimal_places=2, default=0.00, help_text="Lifetime gross earnings")
@@ -48,7 +63,26 @@ class Shop(models.Model):
     def save(self, *args, **kwargs):
         if not self.qr_code:
             self.qr_code = f"SHOP-{str(self.id)[:8].upper()}"
+        self.refresh_geohash()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'latitude', 'longitude'} & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'geohash'}
         super().save(*args, **kwargs)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the facet cube cell so saves can move the shop between cells
+        if FACET_FIELDS <= set(field_names):
+            instance._facet_cell = facet_cell(instance)
+        return instance
+
+    def refresh_geohash(self):
+        """Keep the spatial index cell in sync with the coordinates"""
+        if self.latitude is not None and self.longitude is not None:
+            self.geohash = encode_geohash(self.latitude, self.longitude)
+        else:
+            self.geohash = ''
     
     # Shop Timings
     opening_time = models.TimeField(null=True, blank=True)
@@ -58,31 +92,60 @@ class Shop(models.Model):
         """Shop is active if approved and not suspended"""
         return self.is_approved and not self.is_suspended
 
+    # Per-weekday overrides: {"0": [["09:00", "13:00"], ["14:00", "18:00"]], "6": []}
+    weekly_hours = models.JSONField(default=dict, blank=True, help_text="Weekday (0=Monday) to list of [opens, closes]; [] = closed")
+
     @property
     def is_open(self):
-        """Check if shop is currently open based on time"""
-        if not self.opening_time or not self.closing_time:
-            return True
-            
-        now = timezone.localtime().time()
-        if self.opening_time < self.closing_time:
-            return self.opening_time <= now <= self.closing_time
-        else:
-            return now >= self.opening_time or now <= self.closing_time
+        """Check if shop is currently open based on its weekly schedule"""
+        from . import schedule
+        return schedule.is_open_at(schedule.weekly_intervals(self), schedule.minute_of_week())
     
+    @property
+    def queue_eta_minutes(self):
+        """
+        Minutes until a new order would be ready: one avg_print_time for the
+        job itself plus one per order ahead, with large queued jobs counted
+        by sheets (QUEUE_SHEETS_PER_ORDER sheets = one average order)
+        """
+        return self.eta_minutes(self.queue_orders, self.queue_sheets, self.avg_print_time)
+
+    @staticmethod
+    def eta_minutes(queue_orders, queue_sheets, avg_print_time):
+        load = max(queue_orders, queue_sheets / QUEUE_SHEETS_PER_ORDER)
+        return ceil(avg_print_time * (1 + load))
+
+    @classmethod
+    def adjust_queue(cls, shop_id, orders, sheets):
+        """Apply a queue delta without touching the rest of the row
+
+        queue_version moves in the same UPDATE; map marker ETags sum it over
+        the visible shops, so no shared row is written per order.
+        """
+        if not shop_id or (not orders and not sheets):
+            return
+        cls.objects.filter(pk=shop_id).update(
+            queue_orders=models.F('queue_orders') + orders,
+            queue_sheets=models.F('queue_sheets') + sheets,
+            queue_version=models.F('queue_version') + 1,
+        )
+
     def calculate_commission(self, amount):
         """Calculate platform commission"""
         return (amount * self.commission_rate) / 100
     
     def get_primary_image(self):
-        """Get the primary image for the shop or return placeholder"""
+        """Get the primary image for the shop or return placeholder (no queries)"""
+        return self.primary_image_url or PLACEHOLDER_IMAGE
+
+    def refresh_primary_image(self):
+        """Recompute the denormalized primary image URL after image changes"""
         primary = self.images.filter(is_primary=True, is_approved=True).first()
-        if primary:
-            return primary.image.url
-        any_img = self.images.filter(is_approved=True).first()
-        if any_img:
-            return any_img.image.url
-        return '/static/images/shop_placeholder.png'
+        if not primary:
+            primary = self.images.filter(is_approved=True).first()
+        self.primary_image_url = primary.image.url if primary else ''
+        # update() so image moderation doesn't touch updated_at or fire Shop signals
+        Shop.objects.filter(pk=self.pk).update(primary_image_url=self.primary_image_url)
 
     def get_images(self):
         """Get all approved images"""
@@ -110,6 +173,134 @@ class Shop(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['latitude', 'longitude'], name='shop_lat_lon_idx'),
+        ]
+
+
+class ShopCatalogVersion(models.Model):
+    """Version counter for the shop table (singleton model)
+
+    Bumped on every shop save/delete so map responses and derived caches
+    can be keyed on it instead of re-reading the whole table. Live queue
+    counters are versioned per shop instead (Shop.queue_version).
+    """
+
+    version = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Shop catalog v{self.version}"
+
+    def save(self, *args, **kwargs):
+        # Singleton pattern - only allow one instance
+        self.pk = 1
+        super().save(*args, **kwargs)
+
+    @classmethod
+    def load(cls):
+        obj, _ = cls.objects.get_or_create(pk=1)
+        return obj
+
+    @classmethod
+    def current(cls):
+        return cls.load().version
+
+    @classmethod
+    def bump(cls, field='version'):
+        """Atomically move to the next version (of `field`)"""
+        if not cls.objects.filter(pk=1).update(**{field: models.F(field) + 1}, updated_at=timezone.now()):
+            cls.objects.get_or_create(pk=1, defaults={field: 1})
+
+
+class GeocodeCache(models.Model):
+    """Persistent cache of Nominatim responses (second tier behind the in-process LRU)"""
+
+    KIND_CHOICES = [
+        ('GEOCODE', 'Geocode'),
+        ('SEARCH', 'Place Search'),
+        ('REVERSE', 'Reverse Geocode'),
+    ]
+
+    key = models.CharField(max_length=64, unique=True, help_text="SHA-1 of the normalized lookup key")
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    query = models.CharField(max_length=300, help_text="Normalized query, for inspection")
+    payload = models.JSONField(null=True, blank=True, help_text="Cached result; null caches a miss")
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"{self.kind}: {self.query}"
+
+
+class Place(models.Model):
+    """Offline gazetteer entry used to answer place autocomplete locally"""
+
+    name = models.CharField(max_length=200)
+    search_name = models.CharField(max_length=200, help_text="Normalized name used for prefix lookups")
+    display_name = models.CharField(max_length=400, blank=True)
+    place_type = models.CharField(max_length=50, blank=True)
+    latitude = models.FloatField()
+    longitude = models.FloatField()
+    population = models.PositiveIntegerField(default=0)
+    importance = models.FloatField(default=0.0, help_text="Ranking weight (0-1), higher ranks first")
+
+    def __str__(self):
+        return self.display_name or self.name
+
+    class Meta:
+        indexes = [
+            # Prefix search is a range scan over this index (a B-tree acts as an on-disk trie)
+            models.Index(fields=['search_name', 'importance'], name='place_prefix_idx'),
+        ]
+
+
+class RateLimitBucket(models.Model):
+    """Shared token bucket (GCRA) so every worker respects an upstream rate limit"""
+
+    name = models.CharField(max_length=50, unique=True)
+    tat = models.FloatField(default=0.0, help_text="Theoretical arrival time (epoch seconds) of the next allowed request")
+
+    def __str__(self):
+        return self.name
+
+
+class ShopFacetCount(models.Model):
+    """Listed shops per facet cell (see shops.facets); maintained from Shop signals"""
+    price_band = models.CharField(max_length=10)
+    has_a3 = models.BooleanField()
+    has_color = models.BooleanField()
+    rating_bucket = models.CharField(max_length=2)
+    count = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.price_band}/{self.has_a3}/{self.has_color}/{self.rating_bucket}: {self.count}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['price_band', 'has_a3', 'has_color', 'rating_bucket'], name='unique_facet_cell'
+            ),
+        ]
+
+
+class ShopOpeningInterval(models.Model):
+    """
+    Opening interval in minutes since Monday 00:00 local time, derived from
+    the shop's hours by shops.schedule so open-now filters run in SQL
+    """
+    shop = models.ForeignKey(Shop, on_delete=models.CASCADE, related_name='opening_intervals')
+    start_minute = models.PositiveIntegerField()
+    end_minute = models.PositiveIntegerField(help_text="May pass the end of the week for Sunday-night intervals")
+
+    def __str__(self):
+        return f"{self.shop.name}: {self.start_minute}-{self.end_minute}"
+
+    class Meta:
+        ordering = ['start_minute']
+        indexes = [
+            models.Index(fields=['start_minute', 'end_minute'], name='opening_interval_idx'),
+        ]
 
 
 class ShopImage(models.Model):
@@ -125,6 +316,12 @@ class ShopImage(models.Model):
             # Ensure only one primary image per shop
             ShopImage.objects.filter(shop=self.shop, is_primary=True).update(is_primary=False)
         super().save(*args, **kwargs)
+        self.shop.refresh_primary_image()
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        self.shop.refresh_primary_image()
+        return result
 
     def __str__(self):
         return f"Image for {self.shop.name}"
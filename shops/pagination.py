@@ -0,0 +1,121 @@
+"""
+Keyset (cursor) pagination for the shop list
+Cursors are opaque url-safe tokens holding the sort key and id of the last
+row served, so each page is "rows after this key" rather than an OFFSET.
+Rankings computed in Python (distance / score, search relevance) are kept
+in the cache for a while, so later pages seek into the same sorted keys.
+"""
+import base64
+import binascii
+import bisect
+import datetime
+import hashlib
+import json
+import uuid
+
+from django.core.cache import cache
+from django.db.models import Q
+
+PAGE_SIZE = 24
+RANKING_CACHE_SECONDS = 10 * 60
+
+
+def encode_cursor(key):
+    raw = json.dumps(key, separators=(',', ':'), default=_json_default)
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Cursor key, or None for a missing/garbled token (start from the top)"""
+    if not token:
+        return None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        key = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (binascii.Error, ValueError, UnicodeDecodeError):
+        return None
+    return key if isinstance(key, list) else None
+
+
+def _json_default(value):
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    return str(value)  # UUID
+
+
+def cached_ranking(params, at, rank):
+    """
+    Result of rank() for a listing, cached per query params (cursor aside),
+    reference minute `at` and shop catalog version
+    """
+    from .models import ShopCatalogVersion
+
+    signature = json.dumps([
+        sorted((name, params.getlist(name)) for name in params if name != 'cursor'),
+        at,
+        ShopCatalogVersion.current(),
+    ])
+    cache_key = f"shops:ranking:{hashlib.md5(signature.encode()).hexdigest()}"
+    ranking = cache.get(cache_key)
+    if ranking is None:
+        ranking = rank()
+        cache.set(cache_key, ranking, RANKING_CACHE_SECONDS)
+    return ranking
+
+
+def page_sorted(keys, cursor, size=PAGE_SIZE):
+    """
+    Page through an in-memory list of sort keys, ascending
+
+    Args:
+        keys: list of key lists, already sorted, each ending in the shop id
+        cursor: key of the last row served (decoded), or None
+
+    Returns:
+        (slice of keys, next cursor key or None)
+    """
+    start = 0
+    if cursor is not None:
+        try:
+            start = bisect.bisect_right(keys, cursor)
+        except TypeError:
+            start = 0  # Cursor from a different sort mode
+    page = keys[start:start + size]
+    more = start + size < len(keys)
+    return page, (page[-1] if more and page else None)
+
+
+def page_queryset(queryset, field, cursor, size=PAGE_SIZE):
+    """
+    Page a queryset by (field, id), both descending
+
+    Args:
+        field: model field or annotation to sort by (non-null)
+        cursor: [value, id] of the last row served, or None
+
+    Returns:
+        (list of objects, next cursor key or None)
+    """
+    queryset = queryset.order_by(f'-{field}', '-id')
+    if cursor is not None and len(cursor) == 2:
+        value, last_id = cursor
+        if field == 'created_at':
+            try:
+                value = datetime.datetime.fromisoformat(value)
+            except (TypeError, ValueError):
+                value = None
+        elif not isinstance(value, (int, float)):
+            value = None
+        try:
+            last_id = uuid.UUID(str(last_id))
+        except ValueError:
+            value = None
+        if value is not None:
+            queryset = queryset.filter(
+                Q(**{f'{field}__lt': value}) | Q(**{field: value, 'id__lt': last_id})
+            )
+    rows = list(queryset[:size + 1])
+    more = len(rows) > size
+    rows = rows[:size]
+    last = rows[-1] if more and rows else None
+    return rows, ([getattr(last, field), str(last.id)] if last else None)
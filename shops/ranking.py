@@ -0,0 +1,141 @@
+"""
+Composite ranking for nearby shops
+Blends distance, A4 B/W price, rating, open status and queue depth into one
+score. The candidate set is read with a single values_list() query and
+scored in one vectorized NumPy pass - no per-Shop attribute access.
+"""
+import numpy as np
+from django.conf import settings
+from django.db.models import FloatField
+from django.db.models.functions import Cast, Coalesce
+
+from .schedule import annotate_open
+from .spatial import EARTH_RADIUS_KM
+
+# Relative weights; override any of them with settings.SHOP_RANKING_WEIGHTS
+DEFAULT_WEIGHTS = {
+    'distance': 0.45,
+    'price': 0.2,
+    'rating': 0.2,
+    'open': 0.1,
+    'queue': 0.05,
+}
+QUEUE_HALF_SCORE = 5  # Outstanding orders at which the queue component scores 0.5
+MAX_RATING = 5.0
+
+# Columns rank_nearby reads per candidate
+CANDIDATE_DTYPE = [
+    ('id', 'O'),
+    ('lat', 'f8'),
+    ('lon', 'f8'),
+    ('price', 'f8'),
+    ('rating', 'f8'),
+    ('open_for', 'f8'),
+    ('queue', 'f8'),
+]
+
+
+def ranking_weights(overrides=None):
+    weights = dict(DEFAULT_WEIGHTS)
+    weights.update(getattr(settings, 'SHOP_RANKING_WEIGHTS', {}))
+    if overrides:
+        weights.update(overrides)
+    return weights
+
+
+def haversine_km(lat, lon, lats, lons):
+    """Vectorized Shop.haversine, rounded to 0.1 km the same way"""
+    lat, lon = np.radians(lat), np.radians(lon)
+    lats, lons = np.radians(lats), np.radians(lons)
+    a = np.sin((lats - lat) / 2) ** 2 + np.cos(lat) * np.cos(lats) * np.sin((lons - lon) / 2) ** 2
+    return np.round(2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a)), 1)
+
+
+def composite_scores(distance, price, rating, open_for, queue, radius=None, weights=None):
+    """
+    Score candidates, higher is better (0-1)
+
+    Args:
+        distance: km from the user
+        price: A4 B/W price per page
+        rating: 0-5
+        open_for: minutes the shop stays open, 0 when closed
+        queue: outstanding paid orders (Shop.queue_orders)
+        radius: search radius in km (default: farthest candidate)
+        weights: overrides for ranking_weights()
+
+    All array args are float arrays of the same length.
+    """
+    w = ranking_weights(weights)
+    if not len(distance):
+        return np.zeros(0)
+
+    reach = radius or distance.max() or 1.0
+    distance_score = np.clip(1 - distance / reach, 0, 1)
+
+    spread = price.max() - price.min()
+    price_score = (price.max() - price) / spread if spread > 0 else np.ones_like(price)
+
+    rating_score = np.clip(rating / MAX_RATING, 0, 1)
+    open_score = (open_for > 0).astype(float)
+    queue_score = QUEUE_HALF_SCORE / (QUEUE_HALF_SCORE + queue)
+
+    total = (
+        w['distance'] * distance_score
+        + w['price'] * price_score
+        + w['rating'] * rating_score
+        + w['open'] * open_score
+        + w['queue'] * queue_score
+    )
+    return total / (sum(w.values()) or 1)
+
+
+def rank_candidates(candidates, lat, lon, radius=None, weights=None):
+    """
+    Ranking stage: exact distance, radius cut and composite score
+
+    Args:
+        candidates: structured array with CANDIDATE_DTYPE fields
+
+    Returns:
+        (positions, distance, scores) for the kept candidates, best first;
+        positions index into `candidates`
+    """
+    distance = haversine_km(float(lat), float(lon), candidates['lat'], candidates['lon'])
+    keep = np.flatnonzero(distance <= radius) if radius is not None else np.arange(len(candidates))
+    kept = candidates[keep]
+    scores = composite_scores(
+        distance[keep], kept['price'], kept['rating'], kept['open_for'], kept['queue'],
+        radius=radius, weights=weights,
+    )
+    order = np.argsort(-scores, kind='stable')
+    return keep[order], distance[keep][order], scores[order]
+
+
+def rank_nearby(queryset, lat, lon, radius=None, weights=None, at=None):
+    """
+    Rank the shops of a queryset around a point
+
+    Shops without coordinates are skipped; callers list them separately.
+
+    Returns:
+        List of (shop_id, distance_km, score), best first
+    """
+    rows = (
+        annotate_open(queryset.exclude(geohash=''), at)
+        .annotate(
+            # Floats straight from the database; Decimal conversion dominates otherwise
+            price_value=Cast('a4_bw_price', FloatField()),
+            rating_value=Cast('rating', FloatField()),
+            open_minutes=Coalesce('open_for', 0),
+        )
+        .order_by()
+        .values_list('id', 'latitude', 'longitude', 'price_value', 'rating_value', 'open_minutes', 'queue_orders')
+    )
+    candidates = np.fromiter(rows, dtype=CANDIDATE_DTYPE)
+    if not len(candidates):
+        return []
+
+    positions, distance, scores = rank_candidates(candidates, lat, lon, radius, weights)
+    ids = candidates['id'][positions]
+    return list(zip(ids.tolist(), distance.tolist(), scores.tolist()))
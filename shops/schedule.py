@@ -0,0 +1,204 @@
+"""
+Weekly opening schedules as minute-of-week intervals
+Minute 0 is Monday 00:00 in the project's local time zone. Each interval is
+stored with start_minute < MINUTES_PER_WEEK and an end_minute that may run
+past the end of the week (Sunday night into Monday), so "open at minute m
+until minute t" is two range checks against an indexed table:
+
+    start <= m AND end >= t   OR   start <= m + WEEK AND end >= t + WEEK
+"""
+import datetime
+
+from django.db.models import Case, Exists, F, IntegerField, Max, OuterRef, Q, Subquery, When
+from django.utils import timezone
+
+MINUTES_PER_DAY = 24 * 60
+MINUTES_PER_WEEK = 7 * MINUTES_PER_DAY
+# Shops without hours are always open; spanning two weeks keeps the
+# single-row check valid for any "until" up to a week ahead
+ALWAYS_OPEN = (0, 2 * MINUTES_PER_WEEK)
+
+WEEKDAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+
+def parse_time(value):
+    """Accept a time, an 'HH:MM[:SS]' string, or empty"""
+    if not value:
+        return None
+    if isinstance(value, datetime.time):
+        return value
+    try:
+        return datetime.time.fromisoformat(str(value).strip())
+    except ValueError:
+        return None
+
+
+def minute_of_day(value):
+    return value.hour * 60 + value.minute
+
+
+def minute_of_week(when=None):
+    """Local minute-of-week for an aware datetime (default: now)"""
+    when = timezone.localtime(when)
+    return when.weekday() * MINUTES_PER_DAY + when.hour * 60 + when.minute
+
+
+def until_minute(at, until):
+    """
+    Minute-of-week for an "open until" time of day, on or after `at`
+
+    A time earlier than `at`'s time of day means the next morning
+    (at 22:00 "until 02:00" asks for four hours).
+    """
+    day_start = at - at % MINUTES_PER_DAY
+    target = day_start + minute_of_day(until)
+    if target < at:
+        target += MINUTES_PER_DAY
+    return target
+
+
+def day_interval(weekday, opens, closes):
+    """One day's opening hours; closing at or before opening runs past midnight"""
+    start = weekday * MINUTES_PER_DAY + minute_of_day(opens)
+    length = (minute_of_day(closes) - minute_of_day(opens)) % MINUTES_PER_DAY or MINUTES_PER_DAY
+    return start, start + length
+
+
+def merge_intervals(intervals):
+    """Sort and merge overlapping/adjacent intervals, including across the week boundary"""
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+
+    if len(merged) > 1 and merged[-1][1] >= MINUTES_PER_WEEK + merged[0][0]:
+        # Sunday night runs into Monday's first interval
+        last_start, last_end = merged[-1]
+        merged[-1] = (last_start, max(last_end, MINUTES_PER_WEEK + merged[0][1]))
+
+    if any(end - start >= MINUTES_PER_WEEK for start, end in merged):
+        return [ALWAYS_OPEN]
+    return merged
+
+
+def weekly_intervals(shop):
+    """
+    Opening intervals for a shop
+
+    weekly_hours maps weekday ("0" = Monday) to a list of [opens, closes]
+    pairs; an empty list means closed that day. Days without an entry use
+    the shop's daily opening_time/closing_time. No hours at all = always open.
+    """
+    daily_opens = parse_time(shop.opening_time)
+    daily_closes = parse_time(shop.closing_time)
+    weekly = shop.weekly_hours or {}
+
+    if not weekly and not (daily_opens and daily_closes):
+        return [ALWAYS_OPEN]
+
+    intervals = []
+    for weekday in range(7):
+        if str(weekday) in weekly:
+            pairs = [(parse_time(o), parse_time(c)) for o, c in weekly[str(weekday)]]
+        elif daily_opens and daily_closes:
+            pairs = [(daily_opens, daily_closes)]
+        else:
+            pairs = [(datetime.time(0, 0), datetime.time(0, 0))]  # No daily hours: open all day
+        intervals.extend(day_interval(weekday, o, c) for o, c in pairs if o and c)
+    return merge_intervals(intervals)
+
+
+def sync_intervals(shop):
+    """Rewrite the shop's interval rows if its hours changed"""
+    from .models import ShopOpeningInterval
+
+    wanted = weekly_intervals(shop)
+    current = list(shop.opening_intervals.order_by('start_minute').values_list('start_minute', 'end_minute'))
+    if current == wanted:
+        return
+    shop.opening_intervals.all().delete()
+    ShopOpeningInterval.objects.bulk_create([
+        ShopOpeningInterval(shop=shop, start_minute=start, end_minute=end) for start, end in wanted
+    ])
+
+
+def parse_open_filter(value, at=None):
+    """
+    Read the ?open= filter shared by the shop list and map markers
+
+    "now" = open at this minute; "HH:MM" = open now and until at least then.
+
+    Returns:
+        (at, until) minute-of-week pair, or None when not filtering
+    """
+    value = (value or '').strip().lower()
+    if not value:
+        return None
+    at = minute_of_week() if at is None else at
+    if value == 'now':
+        return at, None
+    until = parse_time(value)
+    if until is None:
+        return None
+    return at, until_minute(at, until)
+
+
+def is_open_at(intervals, at, until=None):
+    """Python twin of open_q for already-loaded (start, end) pairs"""
+    until = at + 1 if until is None else max(until, at + 1)
+    return any(
+        (start <= at and end >= until) or (start <= at + MINUTES_PER_WEEK and end >= until + MINUTES_PER_WEEK)
+        for start, end in intervals
+    )
+
+
+def open_q(at, until=None):
+    """
+    Q over ShopOpeningInterval rows covering minute `at` through `until`
+
+    Without `until` the shop only has to be open at `at` (end is exclusive).
+    """
+    until = at + 1 if until is None else max(until, at + 1)
+    week = MINUTES_PER_WEEK
+    return (
+        Q(start_minute__lte=at, end_minute__gte=until)
+        | Q(start_minute__lte=at + week, end_minute__gte=until + week)
+    )
+
+
+def _matching_intervals(at, until):
+    from .models import ShopOpeningInterval
+
+    return ShopOpeningInterval.objects.filter(open_q(at, until), shop=OuterRef('pk'))
+
+
+def annotate_open(queryset, at=None, until=None):
+    """
+    Annotate a Shop queryset with `open_for`: minutes the shop stays open
+    from minute `at` (default: now), or NULL when it is closed / closes
+    before `until`
+    """
+    at = minute_of_week() if at is None else at
+    covering = _matching_intervals(at, until)
+    # Wrapped intervals matched a week ahead; measure from that copy of `at`
+    remaining = Case(
+        When(start_minute__lte=at, then=F('end_minute') - at),
+        default=F('end_minute') - (at + MINUTES_PER_WEEK),
+        output_field=IntegerField(),
+    )
+    open_for = covering.values('shop').annotate(longest=Max(remaining)).values('longest')
+    return queryset.annotate(open_for=Subquery(open_for))
+
+
+def filter_open(queryset, at=None, until=None):
+    """
+    Narrow a Shop queryset to shops open at minute `at` (default: now),
+    staying open through `until` when given
+
+    Annotates `open_for` (see annotate_open), so callers can sort by
+    closing time with order_by('-open_for').
+    """
+    at = minute_of_week() if at is None else at
+    return annotate_open(queryset, at, until).filter(Exists(_matching_intervals(at, until)))
@@ -0,0 +1,188 @@
+"""
+Full-text shop search
+SQLite: FTS5 table with the trigram tokenizer, kept in sync from Shop signals
+PostgreSQL: pg_trgm word similarity over GIN trigram indexes
+Anything else (or an SQLite build without FTS5) falls back to icontains.
+
+Matching is typo tolerant: a shop matches when enough of the query's
+trigrams occur in one of the searched fields, and results are ranked by
+that similarity (exact substring hits first).
+"""
+import logging
+import uuid
+
+from django.core.exceptions import FieldError
+from django.db import connection, DatabaseError
+from django.db.models import Case, When, IntegerField, Q
+from django.db.models.functions import Greatest
+
+logger = logging.getLogger(__name__)
+
+FTS_TABLE = 'shops_shop_fts'
+# Column in the FTS table for each searchable Shop lookup
+FTS_COLUMNS = {
+    'name': 'name',
+    'location': 'location',
+    'owner__email': 'owner_email',
+}
+MIN_SIMILARITY = 0.4  # Share of query trigrams that must appear in a field
+MAX_CANDIDATES = 500
+
+
+def trigrams(text):
+    """Trigrams as pg_trgm builds them: per word, padded with two leading and one trailing space"""
+    grams = set()
+    for word in (text or '').lower().split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def raw_trigrams(text):
+    """Unpadded trigrams of the whole string, matching what the FTS5 trigram tokenizer indexes"""
+    text = ' '.join((text or '').lower().split())
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def similarity(query, text):
+    """Word similarity: 1.0 for a substring hit, else share of query trigrams found in text"""
+    query = ' '.join(query.lower().split())
+    text = (text or '').lower()
+    if query in text:
+        return 1.0
+    wanted = trigrams(query)
+    if not wanted:
+        return 0.0
+    return len(wanted & trigrams(text)) / len(wanted)
+
+
+_fts_ready = False
+
+
+def fts_available():
+    """True when the SQLite FTS5 table exists (created by migration)"""
+    global _fts_ready
+    if connection.vendor != 'sqlite':
+        return False
+    if not _fts_ready:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE])
+            _fts_ready = cursor.fetchone() is not None
+    return _fts_ready
+
+
+# ------------------------------------------------------------------
+# Index maintenance (SQLite only; PostgreSQL indexes the columns directly)
+# ------------------------------------------------------------------
+
+def index_shop(shop):
+    """Insert or refresh one shop's row in the FTS table"""
+    if connection.vendor != 'sqlite':
+        return
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE shop_id = %s", [shop.pk.hex])
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE} (shop_id, name, location, owner_email) VALUES (%s, %s, %s, %s)",
+                [shop.pk.hex, shop.name, shop.location, shop.owner.email if shop.owner_id else '']
+            )
+    except DatabaseError as e:
+        logger.error(f"Could not index shop {shop.pk}: {str(e)}")
+
+
+def unindex_shop(shop_id):
+    if connection.vendor != 'sqlite':
+        return
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE shop_id = %s", [shop_id.hex])
+    except DatabaseError as e:
+        logger.error(f"Could not unindex shop {shop_id}: {str(e)}")
+
+
+def reindex_owner(user):
+    """Owner email is denormalized into the index; refresh it when a user changes"""
+    for shop in user.shops.select_related('owner'):
+        index_shop(shop)
+
+
+# ------------------------------------------------------------------
+# Querying
+# ------------------------------------------------------------------
+
+def _ranked_ids_sqlite(queryset, query, fields):
+    columns = [FTS_COLUMNS[f] for f in fields]
+    grams = sorted(raw_trigrams(query))
+    # OR of quoted trigrams restricted to the requested columns; bm25 pre-ranks
+    match = '{%s} : (%s)' % (' '.join(columns), ' OR '.join('"%s"' % g.replace('"', '""') for g in grams))
+    # Only the queryset's shops compete for the candidate limit (Shop ids are stored as hex, like shop_id)
+    shops_sql, shops_params = queryset.order_by().values('id').query.sql_with_params()
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT shop_id, {', '.join(columns)} FROM {FTS_TABLE} "
+            f"WHERE {FTS_TABLE} MATCH %s AND shop_id IN ({shops_sql}) ORDER BY rank LIMIT %s",
+            [match, *shops_params, MAX_CANDIDATES]
+        )
+        rows = cursor.fetchall()
+
+    scored = []
+    for position, row in enumerate(rows):
+        score = max(similarity(query, value) for value in row[1:])
+        if score >= MIN_SIMILARITY:
+            scored.append((-score, position, uuid.UUID(row[0])))
+    scored.sort()
+    return [shop_id for _, _, shop_id in scored]
+
+
+def _ranked_queryset_postgres(queryset, query, fields):
+    from django.contrib.postgres.search import TrigramWordSimilarity
+
+    # Matching goes through the <% operator, which the GIN indexes serve; a
+    # comparison on the computed similarity would scan every row
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT set_config('pg_trgm.word_similarity_threshold', %s, false)", [str(MIN_SIMILARITY)])
+    lookup = Q()
+    for field in fields:
+        lookup |= Q(**{f'{field}__trigram_word_similar': query})
+
+    scores = [TrigramWordSimilarity(query, f) for f in fields]
+    score = Greatest(*scores) if len(scores) > 1 else scores[0]
+    return queryset.filter(lookup).annotate(search_rank=score).order_by('-search_rank')
+
+
+def search_shops(queryset, query, fields=('name', 'location')):
+    """
+    Filter a Shop queryset by a free-text query, ordered by relevance
+
+    Args:
+        queryset: Shop queryset to narrow
+        query: User input
+        fields: Shop lookups to search (any of FTS_COLUMNS)
+
+    Returns:
+        Shop queryset
+    """
+    query = ' '.join((query or '').split())
+    if not query:
+        return queryset
+
+    if len(query) >= 3:
+        try:
+            if connection.vendor == 'postgresql':
+                return _ranked_queryset_postgres(queryset, query, fields)
+            if fts_available():
+                ids = _ranked_ids_sqlite(queryset, query, fields)
+                if not ids:
+                    return queryset.none()
+                order = Case(*[When(id=pk, then=pos) for pos, pk in enumerate(ids)], output_field=IntegerField())
+                return queryset.filter(id__in=ids).order_by(order)
+        except (DatabaseError, FieldError) as e:
+            # FieldError: trigram lookups without django.contrib.postgres installed
+            logger.error(f"Shop search failed for '{query}', falling back to icontains: {str(e)}")
+
+    # Short queries (no trigrams) and unsupported backends
+    lookup = Q()
+    for field in fields:
+        lookup |= Q(**{f'{field}__icontains': query})
+    return queryset.filter(lookup)
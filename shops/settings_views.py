@@ -2,6 +2,7 @@ from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from .models import Shop
+from .schedule import WEEKDAYS, parse_time
 
 @login_required
 def shop_settings(request):
@@ -20,8 +21,30 @@ def shop_settings(request):
              
         shop.opening_time = opening if opening else None
         shop.closing_time = closing if closing else None
+
+        # Per-weekday overrides; a day left blank follows the daily hours
+        weekly_hours = {}
+        for weekday in range(7):
+            if request.POST.get(f'day_{weekday}_closed'):
+                weekly_hours[str(weekday)] = []
+                continue
+            day_open = parse_time(request.POST.get(f'day_{weekday}_open'))
+            day_close = parse_time(request.POST.get(f'day_{weekday}_close'))
+            if day_open and day_close:
+                weekly_hours[str(weekday)] = [[day_open.strftime('%H:%M'), day_close.strftime('%H:%M')]]
+        shop.weekly_hours = weekly_hours
         shop.save()
         messages.success(request, 'Shop timings updated!')
         return redirect('shops:dashboard')
         
-    return render(request, 'shops/settings.html', {'shop': shop})
+    week = []
+    for weekday, day_name in enumerate(WEEKDAYS):
+        hours = shop.weekly_hours.get(str(weekday))
+        week.append({
+            'index': weekday,
+            'name': day_name,
+            'closed': hours == [],
+            'opens': hours[0][0] if hours else '',
+            'closes': hours[0][1] if hours else '',
+        })
+    return render(request, 'shops/settings.html', {'shop': shop, 'week': week})
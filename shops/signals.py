@@ -0,0 +1,59 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.contrib.auth.models import User
+from .models import Shop, ShopCatalogVersion, FACET_FIELDS
+from . import search, schedule, facets
+
+HOURS_FIELDS = {'opening_time', 'closing_time', 'weekly_hours'}
+
+
+@receiver(post_save, sender=Shop)
+@receiver(post_delete, sender=Shop)
+def bump_catalog_version(sender, instance, **kwargs):
+    """Invalidate map ETags and cached clusters whenever a shop changes."""
+    ShopCatalogVersion.bump()
+
+
+@receiver(post_save, sender=Shop)
+def index_shop_for_search(sender, instance, **kwargs):
+    """Keep the full-text index in step with name/location/owner."""
+    search.index_shop(instance)
+
+
+@receiver(post_save, sender=Shop)
+def sync_opening_intervals(sender, instance, update_fields=None, **kwargs):
+    """Rebuild the minute-of-week rows used by open-now filters."""
+    if update_fields is None or HOURS_FIELDS & set(update_fields):
+        schedule.sync_intervals(instance)
+
+
+@receiver(post_save, sender=Shop)
+def update_facet_counts(sender, instance, created, update_fields=None, **kwargs):
+    """Move the shop between facet cube cells."""
+    if update_fields is not None and not FACET_FIELDS & set(update_fields):
+        return
+    new = facets.facet_cell(instance)
+    if created:
+        facets.move_shop(None, new)
+    elif hasattr(instance, '_facet_cell'):
+        facets.move_shop(instance._facet_cell, new)
+    else:
+        facets.rebuild()  # Saved from a partially loaded instance; previous cell unknown
+    instance._facet_cell = new
+
+
+@receiver(post_delete, sender=Shop)
+def remove_facet_count(sender, instance, **kwargs):
+    facets.move_shop(getattr(instance, '_facet_cell', facets.facet_cell(instance)), None)
+
+
+@receiver(post_delete, sender=Shop)
+def unindex_shop_for_search(sender, instance, **kwargs):
+    search.unindex_shop(instance.pk)
+
+
+@receiver(post_save, sender=User)
+def reindex_owner_email(sender, instance, created, **kwargs):
+    """Owner email is searchable from the admin portal."""
+    if not created:
+        search.reindex_owner(instance)
@@ -0,0 +1,163 @@
+"""
+Spatial helpers for shop discovery
+Geohash cell index + bounding-box prefilter so radius queries stay in SQL
+"""
+from math import radians, degrees, cos, sin, asin, ceil, floor, log2, pi
+
+from django.db.models import Q
+
+GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+GEOHASH_PRECISION = 8  # ~38m x 19m cells, stored on Shop.geohash
+EARTH_RADIUS_KM = 6371  # Same radius as Shop.haversine
+KM_PER_DEGREE_LAT = EARTH_RADIUS_KM * pi / 180
+# Shop.haversine rounds to 0.1 km, so a shop at 5.04 km passes a 5 km filter
+DISTANCE_ROUNDING_KM = 0.05
+MAX_COVER_CELLS = 16
+
+
+def encode_geohash(lat, lon, precision=GEOHASH_PRECISION):
+    """Encode a coordinate into a geohash string"""
+    lat, lon = float(lat), float(lon)
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    chars = []
+    bit = 0
+    ch = 0
+    even = True  # Geohash interleaves bits starting with longitude
+
+    while len(chars) < precision:
+        rng, value = (lon_range, lon) if even else (lat_range, lat)
+        mid = (rng[0] + rng[1]) / 2
+        if value >= mid:
+            ch = (ch << 1) | 1
+            rng[0] = mid
+        else:
+            ch = ch << 1
+            rng[1] = mid
+        even = not even
+        bit += 1
+        if bit == 5:
+            chars.append(GEOHASH_ALPHABET[ch])
+            bit = 0
+            ch = 0
+
+    return ''.join(chars)
+
+
+def cell_size(precision):
+    """Return (lat_degrees, lon_degrees) covered by one geohash cell"""
+    bits = precision * 5
+    lon_bits = ceil(bits / 2)
+    lat_bits = bits // 2
+    return 180.0 / (2 ** lat_bits), 360.0 / (2 ** lon_bits)
+
+
+def bounding_box(lat, lon, radius_km):
+    """
+    Degree bounding box that fully contains a circle of radius_km
+
+    Returns:
+        (min_lat, max_lat, min_lon, max_lon)
+    """
+    lat, lon = float(lat), float(lon)
+    dlat = radius_km / KM_PER_DEGREE_LAT
+    # Widest longitude extent of the circle; near the poles it wraps everything
+    ratio = sin(radius_km / EARTH_RADIUS_KM) / max(cos(radians(lat)), 1e-12)
+    dlon = degrees(asin(ratio)) if ratio < 1 else 180.0
+    return (
+        max(lat - dlat, -90.0),
+        min(lat + dlat, 90.0),
+        max(lon - dlon, -180.0),
+        min(lon + dlon, 180.0),
+    )
+
+
+def covering_cells(min_lat, max_lat, min_lon, max_lon, max_cells=MAX_COVER_CELLS):
+    """
+    Geohash prefixes that together cover a bounding box
+
+    Picks the finest precision whose covering stays under max_cells, so the
+    prefilter is tight for small radii without exploding into many OR terms.
+    Boxes crossing the antimeridian are not split (callers clamp to +/-180).
+    """
+    span_lat = max(max_lat - min_lat, 1e-9)
+    span_lon = max(max_lon - min_lon, 1e-9)
+
+    # Rough starting point: precision where one cell is about the box size
+    precision = max(1, min(GEOHASH_PRECISION, int(log2(360.0 / span_lon) * 2 / 5) + 1))
+
+    while precision > 1:
+        cell_lat, cell_lon = cell_size(precision)
+        if (span_lat / cell_lat + 1) * (span_lon / cell_lon + 1) <= max_cells:
+            break
+        precision -= 1
+
+    cell_lat, cell_lon = cell_size(precision)
+    cells = set()
+    lat = min_lat
+    while True:
+        lon = min_lon
+        while True:
+            cells.add(encode_geohash(lat, lon, precision))
+            if lon >= max_lon:
+                break
+            lon = min(lon + cell_lon, max_lon)
+        if lat >= max_lat:
+            break
+        lat = min(lat + cell_lat, max_lat)
+
+    return sorted(cells)
+
+
+def radius_prefilter(lat, lon, radius_km):
+    """
+    Build a Q object selecting shops that may lie within radius_km
+
+    Candidates still need an exact distance check; the box is a superset
+    of the circle.
+    """
+    return bbox_prefilter(*bounding_box(lat, lon, radius_km + DISTANCE_ROUNDING_KM))
+
+
+def bbox_prefilter(min_lat, max_lat, min_lon, max_lon):
+    """
+    Build a Q object selecting shops inside a degree bounding box
+
+    Prefix matches are expressed as string ranges so the geohash index is
+    usable on every backend (LIKE with ESCAPE is not).
+    """
+    cell_q = Q()
+    for prefix in covering_cells(min_lat, max_lat, min_lon, max_lon):
+        cell_q |= Q(geohash__gte=prefix, geohash__lt=prefix + '~')
+
+    return cell_q & Q(
+        latitude__range=(min_lat, max_lat),
+        longitude__range=(min_lon, max_lon),
+    )
+
+
+def tile_degrees(zoom):
+    """Longitude width of one web-map tile at the given zoom level"""
+    return 360.0 / (2 ** zoom)
+
+
+def snap_bbox(min_lat, max_lat, min_lon, max_lon, zoom):
+    """
+    Expand a viewport outward to tile boundaries at the given zoom
+
+    Small pans then map onto the same box, so responses (and their ETags)
+    can be reused instead of refetched.
+    """
+    step = tile_degrees(zoom)
+    return (
+        max(floor(min_lat / step) * step, -90.0),
+        min(ceil(max_lat / step) * step, 90.0),
+        max(floor(min_lon / step) * step, -180.0),
+        min(ceil(max_lon / step) * step, 180.0),
+    )
+
+
+def cluster_precision(zoom):
+    """Geohash precision whose cells are roughly a quarter of a tile wide"""
+    lon_bits = zoom + 2
+    return max(1, min(GEOHASH_PRECISION, ceil(lon_bits * 2 / 5)))
@@ -10,11 +10,13 @@ urlpatterns = [
     path('register/', views.register_shop, name='register'),
     path('dashboard/', views.shop_dashboard, name='dashboard'),
     path('list/', views.shop_list, name='list'),
+    path('list/page/', views.shop_list_page, name='list_page'),
     path('<uuid:shop_id>/', views.shop_detail, name='detail'),
     path('order/<int:order_id>/accept/', views.accept_order, name='accept_order'),
     path('order/<int:order_id>/reject/', views.reject_order, name='reject_order'),
     path('order/<int:order_id>/ready/', views.mark_ready, name='mark_ready'),
     path('order/<int:order_id>/complete/', views.complete_order, name='complete_order'),
+    path('order/<int:order_id>/download/', views.download_order_files, name='download_order_files'),
     
     # QR Code Routes - Unique Shop Profiles
     path('<str:qr_code>/', views.shop_profile_by_qr, name='profile_by_qr'),
@@ -36,6 +38,7 @@ urlpatterns = [
     
     # API Endpoints
     path('api/geocode/', api_views.geocode, name='api_geocode'),
+    path('api/reverse-geocode/', api_views.reverse_lookup, name='api_reverse_geocode'),
     path('api/search/', api_views.search_locations, name='api_search'),
     path('api/markers/', api_views.shop_markers, name='api_markers'),
     path('api/<uuid:shop_id>/update-location/', api_views.update_shop_location, name='api_update_location'),
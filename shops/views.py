@@ -1,13 +1,26 @@
+import io
+import uuid
+from functools import partial
+
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
 from django.contrib.auth import login, authenticate
 from django.contrib import messages
-from django.http import HttpResponse
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from .models import Shop, ShopImage
 from .forms import ShopImageForm
-from orders.models import Order
-from django.db.models import Sum
+from .spatial import radius_prefilter
+from .schedule import MINUTES_PER_WEEK, minute_of_week, filter_open
+from .listing import filter_shops, nearby_radius, parse_location, scope_shops, within_radius
+from .ranking import rank_nearby
+from . import facets
+from .pagination import cached_ranking, decode_cursor, encode_cursor, page_sorted, page_queryset
+from .search import reindex_owner
+from orders.models import Order, OrderFile, FileBlob
+from orders.zipstream import stream_zip
+from django.db.models import Sum, Q
+from django.utils import timezone
 
 
 def register_shop(request):
@@ -67,46 +80,121 @@ def register_shop(request):
     return render(request, 'shops/register.html')
 
 
-def shop_list(request):
-    """List all verified shops with optional geolocation sorting"""
-    shops = Shop.objects.filter(is_approved=True, is_suspended=False)
-    search_query = request.GET.get('search', '')
-    user_lat = request.GET.get('lat')
-    user_lon = request.GET.get('lon')
-    max_distance = request.GET.get('distance', '')  # max distance filter in km
-    
-    # Text search
-    if search_query:
-        shops = shops.filter(name__icontains=search_query) | shops.filter(location__icontains=search_query)
-    
-    # Distance filtering and sorting
-    shop_data = []
-    for shop in shops:
-        distance = None
-        if user_lat and user_lon and shop.latitude and shop.longitude:
-            distance = shop.distance_from(float(user_lat), float(user_lon))
-        
-        # Filter by max distance if provided
-        if max_distance and distance is not None:
-            if distance > float(max_distance):
-                continue
-        
-        shop_data.append({
-            'shop': shop,
-            'distance': distance
-        })
-    
-    # Sort by distance (shops with distance first, then shops without)
-    if user_lat and user_lon:
-        shop_data.sort(key=lambda x: (x['distance'] is None, x['distance'] or 0))
-    
-    return render(request, 'shops/list.html', {
+def _shop_listing(params, with_facets=False):
+    """
+    One page of the shop list, shared by shop_list (HTML) and shop_list_page (JSON)
+
+    Pages are keyset-paginated: ?cursor= carries the sort key of the last
+    shop served, so a page costs the same however deep the scroll goes. It
+    also carries the minute of the week the first page was built at; every
+    later page filters opening hours and scores against that same minute.
+    """
+    search_query = params.get('search', '')
+    user_lat = params.get('lat')
+    user_lon = params.get('lon')
+    max_distance = params.get('distance', '')  # max distance filter in km
+    open_filter = params.get('open', '')  # "now" or "HH:MM" (open until at least)
+    sort = params.get('sort', 'best')  # best (composite score) or distance
+    cursor = decode_cursor(params.get('cursor'))
+    at = minute_of_week()
+    if cursor and isinstance(cursor[-1], int) and 0 <= cursor[-1] < MINUTES_PER_WEEK:
+        *cursor, at = cursor  # Keys themselves always end in a shop id
+
+    # Facets, opening hours and search; the map markers apply the same filters
+    shops, selected_facets, window = filter_shops(params, at)
+    origin, radius = parse_location(params)
+    facet_counts = None
+    if with_facets:
+        # Counted over the shops the list draws from: the catalog-wide facet
+        # cube when nothing narrows it, else one GROUP BY over those shops
+        scope, _ = scope_shops(params, at)
+        narrowed = bool(window or search_query)
+        if origin:
+            reach = radius if radius is not None else nearby_radius(shops.order_by(), origin)
+            scope, narrowed = within_radius(scope, origin, reach), True
+        facet_counts = facets.facet_counts(selected_facets, scope if narrowed else None)
+        # Open-now depends on the clock, so it is the one facet counted live (indexed EXISTS)
+        facet_counts['open_now'] = filter_open(scope.filter(facets.facet_q(selected_facets)), at).count()
+
+    if origin:
+        # Radius prefilter in SQL (geohash cells + bounding box), then exact
+        # distance and composite score for the candidates in one vectorized pass
+        def rank():
+            # Without a distance, rank the nearest ring that fills a page
+            reach = radius if radius is not None else nearby_radius(shops.order_by(), origin)
+            candidates = shops.filter(radius_prefilter(origin[0], origin[1], reach))
+            ranked = rank_nearby(candidates, origin[0], origin[1], reach, at=at)
+            keys = sorted(
+                [0, distance if sort == 'distance' else -score, str(shop_id)]
+                for shop_id, distance, score in ranked
+            )
+            # Shops without coordinates are still listed after the ones with a distance
+            keys += [[1, 0, str(shop_id)] for shop_id in shops.filter(geohash='').order_by('id').values_list('id', flat=True)]
+            return keys, {str(shop_id): distance for shop_id, distance, _ in ranked}
+
+        keys, distances = cached_ranking(params, at, rank)
+        page, next_key = page_sorted(keys, cursor)
+        shops_by_id = shops.in_bulk([key[-1] for key in page])
+        shop_data = [
+            {'shop': shops_by_id[uuid.UUID(key[-1])], 'distance': distances.get(key[-1])}
+            for key in page if uuid.UUID(key[-1]) in shops_by_id  # Gone since it was ranked
+        ]
+    elif search_query:
+        # Relevance order comes from the search index; keyset on rank position
+        keys = cached_ranking(params, at, lambda: [
+            [position, str(shop_id)] for position, shop_id in enumerate(shops.values_list('id', flat=True))
+        ])
+        page, next_key = page_sorted(keys, cursor)
+        shops_by_id = shops.in_bulk([key[-1] for key in page])
+        shop_data = [
+            {'shop': shops_by_id[uuid.UUID(key[-1])], 'distance': None}
+            for key in page if uuid.UUID(key[-1]) in shops_by_id
+        ]
+    else:
+        # Newest first, or closing latest first when filtering by opening hours
+        page, next_key = page_queryset(shops, 'open_for' if window else 'created_at', cursor)
+        shop_data = [{'shop': shop, 'distance': None} for shop in page]
+
+    return {
         'shop_data': shop_data,
-        'shops': shops,
+        'next_cursor': encode_cursor([*next_key, at]) if next_key else '',
         'search_query': search_query,
         'user_lat': user_lat or '',
         'user_lon': user_lon or '',
-        'max_distance': max_distance
+        'max_distance': max_distance,
+        'open_filter': open_filter,
+        'sort': sort,
+        'selected_facets': selected_facets,
+        'facet_counts': facet_counts
+    }
+
+
+def shop_list(request):
+    """List all verified shops with optional geolocation sorting (first page)"""
+    context = _shop_listing(request.GET, with_facets=True)
+    query = request.GET.copy()
+    query.pop('cursor', None)
+    context['page_query'] = query.urlencode()
+    return render(request, 'shops/list.html', context)
+
+
+def shop_list_page(request):
+    """Next page of the shop list as compact JSON, for infinite scroll"""
+    listing = _shop_listing(request.GET)
+    return JsonResponse({
+        'shops': [{
+            'id': str(item['shop'].id),
+            'name': item['shop'].name,
+            'location': item['shop'].location,
+            'image': item['shop'].get_primary_image(),
+            'price': str(item['shop'].a4_bw_price),
+            'rating': str(item['shop'].rating),
+            'open': item['shop'].is_open,
+            'queue': item['shop'].queue_orders,
+            'eta': item['shop'].queue_eta_minutes,
+            'distance': item['distance'],
+        } for item in listing['shop_data']],
+        'next': listing['next_cursor'],
     })
 
 
@@ -147,6 +235,7 @@ def shop_dashboard(request):
             candidate_shops = Shop.objects.filter(fallback_query)
             if candidate_shops.exists():
                 candidate_shops.update(owner=request.user)
+                reindex_owner(request.user)  # update() skips the search index signal
                 shops = request.user.shops.all()
 
     if not shops.exists():
@@ -176,7 +265,7 @@ def shop_dashboard(request):
                     messages.error(request, f"{field}: {error}")
     
     # Get all orders for selected shop
-    orders = selected_shop.orders.all().order_by('-created_at')
+    orders = selected_shop.orders.prefetch_related('files__blob').order_by('-created_at')
     
     # Filter by status
     status_filter = request.GET.get('status', 'all')
@@ -349,6 +438,40 @@ def complete_order(request, order_id):
     return redirect('shops:dashboard')
 
 
+@login_required
+def download_order_files(request, order_id):
+    """Download every file of an order as one ZIP, streamed as it is built"""
+    order = get_object_or_404(Order, id=order_id)
+
+    if order.shop.owner != request.user:
+        messages.error(request, 'Unauthorized action!')
+        return redirect('shops:dashboard')
+
+    files = order.files.filter(status=OrderFile.READY).select_related('blob').order_by('id')
+    members, purged = [], []
+    # Numbered in upload order, which also keeps repeated names apart
+    for index, order_file in enumerate(files, start=1):
+        name = f"{index:02d}-{order_file.file_name}"
+        if order_file.blob_id and order_file.blob.tier == FileBlob.PURGED:
+            purged.append(name)  # Bytes deleted by the storage lifecycle
+            continue
+        if order_file.blob_id:
+            order_file.blob.ensure_hot()  # Rehydrates a cold-tier file
+        members.append((
+            name, order_file.file.size,
+            timezone.localtime(order_file.created_at).timetuple()[:6], partial(order_file.file.open, 'rb')
+        ))
+    if purged:
+        manifest = ('These files were deleted after the order was settled:\n\n' + '\n'.join(purged) + '\n').encode()
+        members.append((
+            'MISSING-FILES.txt', len(manifest), timezone.localtime().timetuple()[:6], partial(io.BytesIO, manifest)
+        ))
+
+    response = StreamingHttpResponse(stream_zip(members), content_type='application/zip')
+    response['Content-Disposition'] = f'attachment; filename="Order_{order.id}_files.zip"'
+    return response
+
+
 # ==========================================
 # QR CODE & SHOP PROFILE VIEWS
 # ==========================================
@@ -91,6 +91,10 @@ DATABASES = {
     }
 }
 
+# Trigram lookups for shop search (shops/search.py) on PostgreSQL
+if DATABASES['default']['ENGINE'] == 'django.db.backends.postgresql':
+    INSTALLED_APPS.append('django.contrib.postgres')
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -134,6 +138,11 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 # Media files (Uploaded content)
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
+# Who sends media bytes once core.media has authorized a request:
+# 'nginx' (X-Accel-Redirect), 'apache' (X-Sendfile) or '' for Django itself.
+# The proxy must not serve MEDIA_ROOT publicly, only via the internal prefix.
+MEDIA_SENDFILE = ''
+MEDIA_ACCEL_PREFIX = '/protected-media/'
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
@@ -1,8 +1,8 @@
 from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
-from django.conf.urls.static import static
 from django.views.generic import RedirectView
+from core.views import protected_media
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -11,8 +11,6 @@ urlpatterns = [
     path('order/', include('orders.urls')),
     path('portal/', include('admin_portal.urls')),  # Custom Admin Portal
     path('portal/', RedirectView.as_view(url='/portal/dashboard/', permanent=False)),
+    # Media is authorized by Django and sent by the front proxy (MEDIA_SENDFILE)
+    path(settings.MEDIA_URL.lstrip('/') + '<path:name>', protected_media, name='media'),
 ]
-
-# Serve media files in development
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)